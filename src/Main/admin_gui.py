@@ -9,9 +9,14 @@ sys.path.insert(0, SRC_ROOT)
 
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QMessageBox, QInputDialog
 from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QObject, pyqtSlot, QUrl
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QUrl
 from PyQt5.QtWebChannel import QWebChannel
-from utils.map_handler import load_graph_from_db, get_map_center, set_edge_status, get_all_edges
+from utils.map_handler import get_map_center, set_edge_status, add_status_zone
+from utils.live_graph import LiveGraph
+from utils.spatial_index import EdgeIndex
+from utils.map_overlay import OVERLAY_JS, feature_collection, edge_features, overlay_message, style_message
+from utils.map_lod import LODRenderer
+from utils import geometry
 
 MAP_HTML = os.path.join(tempfile.gettempdir(), "admin_map.html")
 
@@ -22,8 +27,16 @@ STATUS_COLOR = {
     "block": "red"
 }
 
+# polyline gộp từ các edge normal liên tiếp (không có tooltip / id riêng)
+NORMAL_STYLE = {"color": STATUS_COLOR["normal"], "weight": 3, "opacity": 0.7}
+# vẽ thêm lề quanh viewport để pan nhỏ không phải gửi lại overlay
+VIEWPORT_MARGIN = 0.5
+
 # ---------------- JS Bridge ----------------
 class JsBridge(QObject):
+    # Python -> JS: {"name", "data"} (xem utils/map_overlay.py)
+    overlayChanged = pyqtSignal(str)
+
     def __init__(self, gui):
         super().__init__()
         self.gui = gui
@@ -32,6 +45,14 @@ class JsBridge(QObject):
     def onMapClick(self, lat, lon):
         self.gui.map_click(lat, lon)
 
+    @pyqtSlot(float, float, float, float, float)
+    def onViewportChanged(self, south, west, north, east, zoom):
+        self.gui.viewport_changed(south, west, north, east, zoom)
+
+    @pyqtSlot(str)
+    def overlayDrawn(self, name):
+        pass
+
 # ---------------- AdminGUI ----------------
 class AdminGUI(QWidget):
     def __init__(self):
@@ -39,9 +60,18 @@ class AdminGUI(QWidget):
         self.setWindowTitle("Admin Map Viewer")
         self.resize(1000, 700)
 
-        # Load nodes & edges
-        self.graph, self.nodes = load_graph_from_db()
-        self.edges = get_all_edges()
+        # Load nodes & edges (LiveGraph cap nhat trong so tai cho khi doi status)
+        # admin tự ghi status, không đọc log -> không đăng ký reader (để log vẫn được cắt)
+        self.graph = LiveGraph.from_db(register=False)
+        self.nodes = self.graph.nodes
+        self.edges = self.graph.edges
+        self.edge_index = EdgeIndex(self.edges, self.nodes)
+        # toạ độ 2 đầu mọi edge dạng mảng -> chọn edge theo polygon theo lô
+        self.edge_geometry = geometry.EdgeGeometry(self.edges, self.nodes, self.edge_index)
+        # vẽ theo zoom + viewport (gộp edge normal, đơn giản hoá theo zoom)
+        self.renderer = LODRenderer(self.edges, self.nodes, self.edge_style, NORMAL_STYLE, self.edge_index)
+        self._viewport = None   # (south, west, north, east, zoom) JS báo lần cuối
+        self._rendered = None   # bbox (đã thêm lề) + zoom của overlay đang hiển thị
 
         # Layout
         layout = QVBoxLayout(self)
@@ -70,6 +100,7 @@ class AdminGUI(QWidget):
         # Polygon state
         self.polygon_active = False
         self.polygon_points = []
+        self.selected_polygon = []      # polygon đã đóng ứng với poly_edges
 
         # JS bridge
         self.channel = QWebChannel()
@@ -85,41 +116,64 @@ class AdminGUI(QWidget):
 
     # ---------------- Map ----------------
     def create_map(self, lat, lon):
+        #HTML chỉ có tile + qwebchannel.js; nodes / edges gửi theo viewport (canvas renderer)
         import folium
-        m = folium.Map(location=(lat, lon), zoom_start=17)
-
-        # Nodes
-        for nid, (nlat, nlon) in self.nodes.items():
-            folium.CircleMarker(
-                location=(nlat, nlon),
-                radius=3,
-                color="blue",
-                fill=True,
-                fill_opacity=0.7,
-                tooltip=f"Node {nid}"
-            ).add_to(m)
-
-        # Edges
-        for e in self.edges:
-            u, v = e["u"], e["v"]
-            if u in self.nodes and v in self.nodes:
-                lat1, lon1 = self.nodes[u]
-                lat2, lon2 = self.nodes[v]
-                color = STATUS_COLOR.get(e.get("status", "normal"), "gray")
-                folium.PolyLine(
-                    [(lat1, lon1), (lat2, lon2)],
-                    color=color,
-                    weight=3,
-                    opacity=0.7,
-                    tooltip=f"Edge {u}-{v} | {e.get('status','normal')}"
-                ).add_to(m)
-
-        # JS
+        m = folium.Map(location=(lat, lon), zoom_start=17, prefer_canvas=True)
         m.get_root().header.add_child(folium.Element("""
             <script src="qrc:///qtwebchannel/qwebchannel.js"></script>
         """))
         m.save(MAP_HTML)
 
+    def push_overlay(self, name, data):
+        self.js_bridge.overlayChanged.emit(overlay_message(name, data))
+
+    def edge_style(self, e):
+        status = e.get("status", "normal")
+        return {"color": STATUS_COLOR.get(status, "gray"), "weight": 3, "opacity": 0.7,
+                "tooltip": f"Edge {e['u']}-{e['v']} | {status}"}
+
+    # ---------------- Viewport ----------------
+    def viewport_changed(self, south, west, north, east, zoom):
+        self._viewport = (south, west, north, east, int(round(zoom)))
+        self.render_viewport()
+
+    def render_viewport(self, force=False):
+        #chỉ gửi lại overlay khi zoom đổi hoặc viewport ra khỏi vùng đã vẽ (có lề)
+        if self._viewport is None:
+            return
+        south, west, north, east, zoom = self._viewport
+        if not force and self._rendered is not None:
+            r_south, r_west, r_north, r_east, r_zoom = self._rendered
+            if zoom == r_zoom and r_south <= south and r_west <= west and north <= r_north and east <= r_east:
+                return
+        dlat = (north - south) * VIEWPORT_MARGIN
+        dlon = (east - west) * VIEWPORT_MARGIN
+        bbox = (south - dlat, west - dlon, north + dlat, east + dlon)
+        self._rendered = bbox + (zoom,)
+        self.push_overlay("nodes", self.renderer.viewport_nodes(*bbox, zoom, color="blue", radius=3,
+                                                                fillOpacity=0.7))
+        self.push_overlay("edges", self.renderer.viewport(*bbox, zoom))
+        # overlay mới nằm trên -> vẽ lại highlight cho nằm trên cùng
+        if self.highlight_edges_list:
+            self.show_selection()
+
+    def show_selection(self):
+        #các edge đang chọn bằng polygon (màu xanh lá), None = xoá
+        data = None
+        if self.highlight_edges_list:
+            data = feature_collection(edge_features(
+                self.highlight_edges_list, self.nodes, lambda e: {"color": "green", "weight": 4}
+            ))
+        self.push_overlay("selection", data)
+
+    def statuses_changed(self, edges, old_statuses):
+        #edge normal được gộp vào polyline dài, không có layer riêng -> vẽ lại viewport;
+        # chỉ đổi giữa các status khác normal thì đổi màu theo edge_id
+        if any(old == "normal" or edge["status"] == "normal" for edge, old in zip(edges, old_statuses)):
+            self.render_viewport(force=True)
+        else:
+            self.recolor_edges((edge, edge["status"]) for edge in edges)
+
     # ---------------- Inject JS ----------------
     def inject_js(self):
         js = r"""
@@ -151,6 +205,7 @@ class AdminGUI(QWidget):
                                 pyHandler.onMapClick(e.latlng.lat, e.latlng.lng);
                             });
                             console.log("Python click handler attached");
+                            pyOverlayInit(mapObj, pyHandler).watchViewport();
                         });
                     }
 
@@ -159,7 +214,7 @@ class AdminGUI(QWidget):
             });
         })();
         """
-        self.web.page().runJavaScript(js)
+        self.web.page().runJavaScript(OVERLAY_JS + js)
 
 
     # ---------------- Mode ----------------
@@ -167,6 +222,7 @@ class AdminGUI(QWidget):
         self.mode = mode
         self.poly_edges.clear()
         self.highlight_edges_list.clear()
+        self.show_selection()
         QMessageBox.information(self, "Mode Changed", f"Current mode: {mode}")
 
     # ---------------- Map click ----------------
@@ -186,49 +242,30 @@ class AdminGUI(QWidget):
         statuses = ["normal", "traffic", "flood", "block"]
         status, ok = QInputDialog.getItem(self, f"Edge {edge['u']}-{edge['v']}", "Set status:", statuses, 0, False)
         if ok:
-            edge["status"] = status
+            old = edge["status"]
+            self.graph.apply_status(edge["edge_id"], status)
             set_edge_status(edge["edge_id"], status)
-            self.update_edge_color(edge, status)
+            self.statuses_changed([edge], [old])
 
     # ---------------- Polygon Mode ----------------
     def point_in_polygon(self, point, polygon):
-        x, y = point
-        inside = False
-        n = len(polygon)
-        for i in range(n):
-            x1, y1 = polygon[i]
-            x2, y2 = polygon[(i+1) % n]
-            
-            if( (y1 > y ) != (y2 > y) ):
-                xinters = (y - y1)*(x2 - x1) / (y2 - y1 + 1e-9 ) + x1
-                if x < xinters:
-                    inside = not inside
-        return inside
-    
+        return geometry.point_in_polygon(point, polygon)
+
     def edge_in_polygon(self, edge, polygon):
-        u, v = edge["u"], edge["v"]
-        
-        p1 = self.nodes[u]
-        p2 = self.nodes[v]
-        
-        return (
-            self.point_in_polygon(p1, polygon)
-            and
-            self.point_in_polygon(p2, polygon)
-        )
-        
+        #cả 2 đầu mút của edge nằm trong polygon (geometry.WITHIN, như bản đầu)
+        return geometry.segment_in_polygon(self.nodes[edge["u"]], self.nodes[edge["v"]], polygon, geometry.WITHIN)
+
     def select_edges_in_polygon(self, polygon_points):
-        self.poly_edges.clear()
-        self.highlight_edges_list.clear()
-        
-        for edge in self.edges:
-            if self.edge_in_polygon(edge, polygon_points):
-                self.poly_edges.append(edge)
-                self.highlight_edges_list.append(edge)
-                self.update_edge_color(edge, "green")
-            else:
-                self.update_edge_color(edge, edge["status"])
-                
+        # lọc bbox + kiểm tra polygon trên toàn bộ edge trong 1 lần (numpy nếu có)
+        # WITHIN: chỉ chọn edge có 2 đầu mút trong vùng (như bản đầu); vùng được áp lại khi import
+        # map (MapRepository.apply_status_zones) cũng dùng WITHIN nên kết quả giống lúc admin chọn
+        selected = self.edge_geometry.select(polygon_points, geometry.WITHIN)
+        self.poly_edges[:] = selected
+        self.highlight_edges_list[:] = selected
+
+        # highlight là 1 overlay riêng (thay cho lần chọn trước)
+        self.show_selection()
+
     def polygon_click(self, lat, lon):
         print("[POLYGON CLICK]", lat, lon)
         if not self.polygon_active:
@@ -252,7 +289,8 @@ class AdminGUI(QWidget):
         if len(self.polygon_points) < 3:
             return
         self.draw_polygon_final()
-        self.select_edges_in_polygon(self.polygon_points)
+        self.selected_polygon = list(self.polygon_points)
+        self.select_edges_in_polygon(self.selected_polygon)
     
     # def toggle_polygon_edge(self, lat, lon):
     #     edge = self.nearest_edge(lat, lon)
@@ -341,10 +379,11 @@ class AdminGUI(QWidget):
         if not ok:
             return
 
-        # Cập nhật status edges
-        for edge in self.poly_edges:
-            edge["status"] = status
-            set_edge_status(edge["edge_id"], status)
+        # Cập nhật status edges + lưu polygon (áp dụng lại sau khi import map) trong 1 transaction
+        changed = self.poly_edges[:]
+        old = [edge["status"] for edge in changed]
+        self.graph.apply_statuses((edge["edge_id"], status) for edge in changed)
+        add_status_zone(status, self.selected_polygon, [edge["edge_id"] for edge in changed])
 
         # Reset polygon state
         self.highlight_edges_list.clear()
@@ -370,60 +409,23 @@ class AdminGUI(QWidget):
         """
         self.web.page().runJavaScript(js_clear_polygon)
 
-        # JS: cập nhật màu tất cả edges theo status mới
-        for edge in self.edges:
-            self.update_edge_color(edge, edge.get("status", "normal"))
+        # JS: bỏ highlight, cập nhật các edge vừa đổi status
+        self.show_selection()
+        self.statuses_changed(changed, old)
 
     # ---------------- Update edge color ----------------
     def update_edge_color(self, edge, status):
-        u, v = edge["u"], edge["v"]
-        lat1, lon1 = self.nodes[u]
-        lat2, lon2 = self.nodes[v]
-        if edge in self.highlight_edges_list:
-            color = "green"
-        else:
-            color = STATUS_COLOR.get(status, "gray")
+        self.recolor_edges([(edge, status)])
 
-        js = f"""
-        (function(){{
-            let keys = Object.keys(window).filter(k => k.startsWith("map_"));
-            if(keys.length>0){{
-                let mapObj = window[keys[0]];
-                mapObj.eachLayer(function(layer){{
-                    if(layer instanceof L.Polyline){{
-                        let latlngs = layer.getLatLngs();
-                        if(latlngs.length==2 &&
-                            latlngs[0].lat=={lat1} && latlngs[0].lng=={lon1} &&
-                            latlngs[1].lat=={lat2} && latlngs[1].lng=={lon2}){{
-                                layer.setStyle({{color:"{color}"}});
-                        }}
-                    }}
-                }});
-            }}
-        }})();
-        """
-        self.web.page().runJavaScript(js)
+    def recolor_edges(self, updates):
+        #updates: [(edge, status)] -> JS tìm layer theo edge_id (index tạo khi vẽ overlay "edges")
+        colors = [(edge["edge_id"], STATUS_COLOR.get(status, "gray")) for edge, status in updates]
+        if colors:
+            self.js_bridge.overlayChanged.emit(style_message("edges", colors))
 
     # ---------------- Nearest edge ----------------
     def nearest_edge(self, lat, lon):
-        best_edge = None
-        best_dist = 1e18
-        for e in self.edges:
-            u, v = e["u"], e["v"]
-            lat1, lon1 = self.nodes[u]
-            lat2, lon2 = self.nodes[v]
-            dx, dy = lat2 - lat1, lon2 - lon1
-            if dx == dy == 0:
-                dist = (lat - lat1)**2 + (lon - lon1)**2
-            else:
-                t = max(0, min(1, ((lat - lat1)*dx + (lon - lon1)*dy)/(dx*dx + dy*dy)))
-                proj_lat = lat1 + t*dx
-                proj_lon = lon1 + t*dy
-                dist = (lat - proj_lat)**2 + (lon - proj_lon)**2
-            if dist < best_dist:
-                best_dist = dist
-                best_edge = e
-        return best_edge
+        return self.edge_index.nearest(lat, lon)
 
 # ---------------- Main ----------------
 def main():
@@ -0,0 +1,157 @@
+# src/Main/batch.py
+# Chay nhieu truy van (start, goal) song song bang multiprocessing, ghi ket qua ra file JSONL
+#   python Main/batch.py queries.csv results.jsonl --algorithm dijkstra --workers 8
+# File vao: CSV (co header) hoac JSONL, moi dong co
+#   start, goal                                   (node id)
+#   hoac start_lat, start_lon, goal_lat, goal_lon (toa do, duoc snap ve node gan nhat)
+import sys
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))   # src/Main
+SRC_ROOT = os.path.dirname(CURRENT_DIR)                    # src
+sys.path.insert(0, SRC_ROOT)
+
+from utils.map_handler import DB_PATH, load_csr_graph_from_db
+from utils.spatial_index import NodeIndex
+from algorithms.registry import ALGORITHMS
+from algorithms.stats import SearchStats
+
+# graph dung chung cho cac worker: voi fork, worker ke thua bien nay (copy-on-write),
+# khong pickle graph theo tung task. CSRGraph la vai mang array (it object Python) nen doc
+# chung ma hau nhu khong bi copy; dijkstra / astar chay truc tiep tren cac mang do.
+_GRAPH = None
+_ALGORITHM = None
+_WITH_STATS = False
+
+
+def read_queries(path):
+    #doc file CSV / JSONL, tra ve list dict
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl") or path.endswith(".json"):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def resolve_queries(rows, graph):
+    #doi moi dong thanh (id, start, goal); dong co toa do duoc snap bang NodeIndex (1 lan cho ca batch)
+    queries = []
+    coord_rows = []
+    for i, row in enumerate(rows):
+        qid = row.get("id", i)
+        if row.get("start") not in (None, "") and row.get("goal") not in (None, ""):
+            queries.append((qid, int(row["start"]), int(row["goal"])))
+        else:
+            coord_rows.append(len(queries))
+            queries.append((qid, row))
+
+    if coord_rows:
+        index = NodeIndex(graph.nodes)
+        points = []
+        for k in coord_rows:
+            row = queries[k][1]
+            points.append((float(row["start_lat"]), float(row["start_lon"])))
+            points.append((float(row["goal_lat"]), float(row["goal_lon"])))
+        snapped = index.nearest_many(points)
+        for n, k in enumerate(coord_rows):
+            queries[k] = (queries[k][0], snapped[2 * n][0], snapped[2 * n + 1][0])
+    return queries
+
+
+def _init_worker(db_path, algorithm, with_stats=False):
+    #chi can khi khong dung fork (vd Windows): moi worker load graph 1 lan, khong phai moi task
+    global _GRAPH, _ALGORITHM, _WITH_STATS
+    if _GRAPH is None:
+        _GRAPH = load_csr_graph_from_db(db_path)
+        _warm_up(_GRAPH, algorithm)
+    _ALGORITHM = algorithm
+    _WITH_STATS = with_stats
+
+
+def _warm_up(graph, algorithm):
+    #chay thu 1 truy van de cac cache (GeoTable, CH, landmark, graph nguoc...) duoc tao truoc khi fork
+    # GeoTable la array -> dung chung that su. CH / landmark / graph nguoc la dict + list object:
+    # worker doc toi la tang refcount -> trang nho bi copy dan sang tung worker (khong con
+    # dung chung), nhung van tranh moi worker tu build / load lai tu dau
+    if len(graph):
+        node = graph.ids[0]
+        ALGORITHMS[algorithm]["func"](graph, graph.nodes, node, node)
+
+
+def _run_query(query):
+    qid, start, goal = query
+    entry = ALGORITHMS[_ALGORITHM]
+    stats = SearchStats() if _WITH_STATS else None
+    t0 = time.perf_counter()
+    if start not in _GRAPH or goal not in _GRAPH:
+        path, dist = None, float("inf")
+    else:
+        path, dist = entry["func"](_GRAPH, _GRAPH.nodes, start, goal, stats=stats)
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    result = {
+        "id": qid,
+        "start": start,
+        "goal": goal,
+        "path": path,
+        "distance": dist if path is not None else None,
+        "time_ms": round(elapsed_ms, 3),
+    }
+    if stats is not None:
+        result["stats"] = stats.as_dict()
+    return result
+
+
+def run_batch(input_path, output_path, algorithm="dijkstra", workers=None,
+              db_path=DB_PATH, chunksize=16, with_stats=False):
+    global _GRAPH, _ALGORITHM, _WITH_STATS
+    print("Loading graph from database...")
+    _GRAPH = load_csr_graph_from_db(db_path)
+    _ALGORITHM = algorithm
+    _WITH_STATS = with_stats
+    _warm_up(_GRAPH, algorithm)
+
+    queries = resolve_queries(read_queries(input_path), _GRAPH)
+    workers = workers or os.cpu_count() or 1
+    print(f"{len(queries)} queries, {workers} workers, algorithm = {algorithm}")
+
+    # fork: worker dung chung graph da load; neu khong co fork thi _init_worker load 1 lan / worker
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+
+    t0 = time.perf_counter()
+    done = 0
+    totals = SearchStats()
+    with open(output_path, "w", encoding="utf-8") as out, \
+            ctx.Pool(workers, initializer=_init_worker, initargs=(db_path, algorithm, with_stats)) as pool:
+        # imap: ket qua duoc ghi ngay khi xong (theo thu tu input), khong giu het trong RAM
+        for result in pool.imap(_run_query, queries, chunksize=chunksize):
+            out.write(json.dumps(result) + "\n")
+            done += 1
+            for name, value in result.get("stats", {}).items():
+                setattr(totals, name, getattr(totals, name) + value)
+    elapsed = time.perf_counter() - t0
+    print(f"Done {done} queries in {elapsed:.2f}s ({done / elapsed if elapsed else 0:.1f} q/s)")
+    if with_stats:
+        print("Search totals:", totals.as_dict())
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch shortest-path routing")
+    parser.add_argument("input", help="CSV or JSONL file of queries")
+    parser.add_argument("output", help="JSONL file for results")
+    parser.add_argument("--algorithm", default="dijkstra", choices=sorted(ALGORITHMS))
+    parser.add_argument("--workers", type=int, default=None, help="default: all cores")
+    parser.add_argument("--db", default=DB_PATH, help="map database")
+    parser.add_argument("--chunksize", type=int, default=16)
+    parser.add_argument("--stats", action="store_true",
+                        help="record settled / stale / pushed / relaxed / improved counts per query")
+    args = parser.parse_args(argv)
+    run_batch(args.input, args.output, args.algorithm, args.workers, args.db, args.chunksize, args.stats)
+
+
+if __name__ == "__main__":
+    main()
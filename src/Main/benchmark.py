@@ -0,0 +1,233 @@
+# src/Main/benchmark.py
+# Do hieu nang cac thuat toan trong registry.ALGORITHMS tren graph luoi tong hop va map_data.db
+#   python Main/benchmark.py --sizes 30 60 100 --queries 200 --output bench.json
+# Ket qua JSON (so sanh duoc giua cac commit): p50/p95/p99 latency, so node settle, so heap push,
+# peak memory, va kiem tra moi thuat toan tra ve cung chi phi voi dijkstra.
+import sys
+import os
+import gc
+import json
+import math
+import time
+import random
+import inspect
+import argparse
+import tempfile
+import tracemalloc
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))   # src/Main
+SRC_ROOT = os.path.dirname(CURRENT_DIR)                    # src
+sys.path.insert(0, SRC_ROOT)
+
+from utils.map_handler import DB_PATH, load_graph_from_db
+from algorithms.heuristic import haversine
+from algorithms.registry import ALGORITHMS
+from algorithms.stats import SearchStats
+from algorithms.ch import get_ch, ch_path
+from algorithms.landmarks import get_landmarks, alt_path
+
+INF = float("inf")
+# sai so cho phep khi so sanh chi phi (cong float theo thu tu khac nhau)
+COST_TOLERANCE = 1e-6
+
+
+# ---------------- Graph tong hop ----------------
+def make_grid_graph(rows, cols, seed=0, spacing=0.001, origin=(21.0, 105.8)):
+    """
+    Luoi rows x cols giong mang duong pho: toa do bi lech nhe, bo ngau nhien ~10% canh,
+    ~15% canh 1 chieu, trong so = haversine * he so >= 1 (heuristic van hop le),
+    mot so canh bi nhan x2 / x3 nhu traffic / flood.
+    """
+    rng = random.Random(seed)
+    nodes = {}
+    for r in range(rows):
+        for c in range(cols):
+            nid = r * cols + c
+            nodes[nid] = (
+                origin[0] + r * spacing + rng.uniform(-0.2, 0.2) * spacing,
+                origin[1] + c * spacing + rng.uniform(-0.2, 0.2) * spacing,
+            )
+    graph = {nid: [] for nid in nodes}
+    for r in range(rows):
+        for c in range(cols):
+            u = r * cols + c
+            for dr, dc in ((0, 1), (1, 0)):
+                rr, cc = r + dr, c + dc
+                if rr >= rows or cc >= cols or rng.random() < 0.10:
+                    continue
+                v = rr * cols + cc
+                base = haversine(nodes, u, v) * rng.uniform(1.0, 1.3)
+                mult = rng.choices((1, 2, 3), weights=(85, 10, 5))[0]
+                w = base * mult
+                oneway = rng.random() < 0.15
+                if oneway and rng.random() < 0.5:
+                    graph[v].append((u, w))
+                else:
+                    graph[u].append((v, w))
+                    if not oneway:
+                        graph[v].append((u, w))
+    return graph, nodes
+
+
+def make_queries(nodes, count, seed=0):
+    rng = random.Random(seed)
+    ids = sorted(nodes)
+    return [(rng.choice(ids), rng.choice(ids)) for _ in range(count)]
+
+
+# ---------------- Do ----------------
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = math.floor(k), math.ceil(k)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def supports_stats(func):
+    #so node settle / push chi dem duoc ben trong vong lap search (algorithms.stats.SearchStats);
+    # thuat toan khong nhan stats= van duoc do latency / memory, cot dem de trong
+    try:
+        return "stats" in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def run_algorithm(key, graph, nodes, queries, reference):
+    func = ALGORITHMS[key]["func"]
+    with_stats = supports_stats(func)
+
+    latencies = []
+    settled = []
+    stale = []
+    pushes = []
+    relaxed = []
+    improved = []
+    mismatches = []
+    for (start, goal), ref_cost in zip(queries, reference):
+        stats = SearchStats() if with_stats else None
+        t0 = time.perf_counter()
+        if with_stats:
+            path, cost = func(graph, nodes, start, goal, stats=stats)
+        else:
+            path, cost = func(graph, nodes, start, goal)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        if path is None:
+            cost = INF
+        if not (cost == ref_cost or abs(cost - ref_cost) <= COST_TOLERANCE * max(1.0, ref_cost)):
+            mismatches.append({
+                "start": start, "goal": goal,
+                "cost": None if cost == INF else cost,
+                "expected": None if ref_cost == INF else ref_cost,
+            })
+        if stats is not None:
+            settled.append(stats.settled)
+            stale.append(stats.stale)
+            pushes.append(stats.pushes)
+            relaxed.append(stats.relaxed)
+            improved.append(stats.improved)
+
+    # peak memory do rieng (tracemalloc lam cham query nen khong tinh vao latency)
+    gc.collect()
+    tracemalloc.start()
+    for start, goal in queries[: max(1, len(queries) // 10)]:
+        func(graph, nodes, start, goal)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "queries": len(queries),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "mean_settled": sum(settled) / len(settled) if settled else None,
+        "mean_stale": sum(stale) / len(stale) if stale else None,
+        "mean_heap_pushes": sum(pushes) / len(pushes) if pushes else None,
+        "mean_relaxed": sum(relaxed) / len(relaxed) if relaxed else None,
+        "mean_improved": sum(improved) / len(improved) if improved else None,
+        "peak_memory_bytes": peak,
+        "cost_mismatches": len(mismatches),
+        "mismatch_samples": mismatches[:5],
+    }
+
+
+def prepare(graph, storage_dir, db_path=None):
+    #tien xu ly CH / landmark truoc (khong tinh vao latency); graph tong hop luu vao thu muc tam
+    # de khong ghi de file .ch.db / .alt.db canh map_data.db
+    # storage_dir None: dung file da tien xu ly canh db_path (graph dict khong mang db_path)
+    timings = {}
+    t0 = time.perf_counter()
+    get_ch(graph, os.path.join(storage_dir, "graph.ch.db") if storage_dir else ch_path(db_path),
+           background=False)
+    timings["ch_s"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    get_landmarks(graph, os.path.join(storage_dir, "graph.alt.db") if storage_dir else alt_path(db_path),
+                  background=False)
+    timings["alt_s"] = time.perf_counter() - t0
+    return timings
+
+
+def bench_graph(name, graph, nodes, num_queries, seed, algorithms, storage_dir, db_path=None):
+    print(f"[{name}] {len(graph)} nodes, {sum(len(v) for v in graph.values())} arcs")
+    queries = make_queries(nodes, num_queries, seed)
+    reference = [ALGORITHMS["dijkstra"]["func"](graph, nodes, s, t)[1] for s, t in queries]
+    result = {
+        "nodes": len(graph),
+        "arcs": sum(len(v) for v in graph.values()),
+        "preprocessing": prepare(graph, storage_dir, db_path),
+        "algorithms": {},
+    }
+    for key in algorithms:
+        res = run_algorithm(key, graph, nodes, queries, reference)
+        result["algorithms"][key] = res
+        flag = "" if res["cost_mismatches"] == 0 else f"  !! {res['cost_mismatches']} cost mismatches"
+        print(f"  {key:12s} p50={res['p50_ms']:.3f}ms p95={res['p95_ms']:.3f}ms p99={res['p99_ms']:.3f}ms{flag}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark routing algorithms")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[30, 60, 100],
+                        help="synthetic grid side lengths")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--algorithms", nargs="*", default=list(ALGORITHMS), choices=list(ALGORITHMS))
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--no-real", action="store_true", help="skip map_data.db")
+    parser.add_argument("--output", default=None, help="write JSON report here")
+    args = parser.parse_args(argv)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "graphs": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            graph, nodes = make_grid_graph(size, size, seed=args.seed)
+            report["graphs"][f"grid_{size}x{size}"] = bench_graph(
+                f"grid {size}x{size}", graph, nodes, args.queries, args.seed, args.algorithms, tmp)
+        if not args.no_real and os.path.exists(args.db):
+            graph, nodes = load_graph_from_db(args.db)
+            storage = None if os.path.abspath(args.db) == os.path.abspath(DB_PATH) else tmp
+            report["graphs"]["map_data"] = bench_graph(
+                "map_data.db", graph, nodes, args.queries, args.seed, args.algorithms, storage, args.db)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Report saved: {args.output}")
+    else:
+        print(text)
+
+    mismatched = sum(a["cost_mismatches"] for g in report["graphs"].values() for a in g["algorithms"].values())
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,8 +16,9 @@ def main():
     start = 1
     goal = 10
     print("\n=== A* SEARCH ===")
-    path = astar(graph, nodes, start, goal)
+    path, dist = astar(graph, nodes, start, goal)
     print("A* Path:", path)
+    print("Distance:", dist)
 
     # --- TEST 2: Dijkstra ---
     print("\n=== DIJKSTRA ===")
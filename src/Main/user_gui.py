@@ -5,6 +5,7 @@ os.environ["QT_DISABLE_FONT_HBASE"] = "1"
 os.environ["QTWEBENGINE_DISABLE_SANDBOX"] = "1"
 os.environ["QT_QPA_PLATFORM"] = "windows:fontengine=freetype"
 
+import time
 import tempfile
 import folium
 import json
@@ -18,31 +19,28 @@ from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QMessageBox, QComboBox, QPushButton, QLabel, QHBoxLayout
 )
 from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QObject, pyqtSlot, QUrl
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot, QUrl
 from PyQt5.QtWebChannel import QWebChannel
 
-from utils.map_handler import load_graph_from_db
 from utils.map_handler import get_map_center
-from utils.map_handler import get_blocked_edges
-from algorithms.astar import astar
-from algorithms.dijkstra import dijkstra
+from utils.map_overlay import (
+    OVERLAY_JS, feature_collection, line_feature, point_feature, edge_features, overlay_message
+)
+from utils.live_graph import LiveGraph, GraphReplaced
+from utils.spatial_index import NodeIndex
+from algorithms.registry import ALGORITHMS
+from algorithms.cancel import SearchCancelled
+from algorithms.route_cache import RouteCache
+from algorithms.stats import SearchStats
 
 MAP_HTML = os.path.join(tempfile.gettempdir(), "map_gui_click.html")
 
 
 # ----------------------
-# Helper: tìm node gần nhất
+# Helper: tìm node gần nhất (KD-tree, xếp hạng theo khoảng cách haversine)
 # ----------------------
-def find_nearest_node(lat, lon, nodes):
-    best_id = None
-    best_dist = 1e18
-
-    for nid, (nlat, nlon) in nodes.items():
-        d = (lat - nlat)**2 + (lon - nlon)**2  # đủ nhanh, không cần Haversine
-        if d < best_dist:
-            best_dist = d
-            best_id = nid
-
+def find_nearest_node(lat, lon, node_index):
+    best_id, _ = node_index.nearest(lat, lon)
     return best_id
 
 
@@ -62,43 +60,115 @@ def save_map(m):
     m.save(MAP_HTML)
 
 
-def draw_path_on_map(m, nodes, path):
+# ----------------------
+# Overlay GeoJSON (gửi qua QWebChannel, không tạo lại HTML)
+# ----------------------
+BLOCKED_STYLE = {
+    "flood": {"color": "cyan", "tooltip": "FLOOD (Ngập lụt)"},
+    "block": {"color": "red", "tooltip": "BLOCKED (Cấm đường)"},
+    "traffic": {"color": "orange", "tooltip": "TRAFFIC (Tắc)"},
+}
+
+
+def route_overlay(nodes, path, routes=None):
+    #routes[0] la tuyen chinh (trung voi path), cac tuyen con lai ve net dut mau xam
     if not path:
-        return
-    
-    coords = [nodes[n] for n in path]
+        return None
+    features = []
+    for i, (alt, cost) in enumerate((routes or [])[1:], start=1):
+        features.append(line_feature([nodes[n] for n in alt], color="gray", weight=5, opacity=0.8,
+                                     dash="8", tooltip=f"Alternative {i}: {cost:.0f} m"))
+    features.append(line_feature([nodes[n] for n in path], color="blue", weight=6))
+    features.append(point_feature(nodes[path[0]], color="green", radius=8, tooltip="START"))
+    features.append(point_feature(nodes[path[-1]], color="red", radius=8, tooltip="GOAL"))
+    return feature_collection(features)
 
-    folium.Marker(nodes[path[0]], tooltip="START", icon=folium.Icon(color="green")).add_to(m)
-    folium.Marker(nodes[path[-1]], tooltip="GOAL", icon=folium.Icon(color="red")).add_to(m)
 
-    folium.PolyLine(coords, color="blue", weight=6).add_to(m)
+def blocked_overlay(nodes, edges):
+    #cac edge khac normal, lay tu LiveGraph (da sync) thay vi query DB
+    return feature_collection(edge_features(edges, nodes, lambda e: BLOCKED_STYLE.get(e.get("status"))))
 
-def draw_bloked_path(m,nodes):
-    blocked_list = get_blocked_edges()
 
-    if not blocked_list:
-        return
+# -------------------------------
+# Worker tìm đường (chạy trong QThreadPool, trả kết quả qua signal)
+# -------------------------------
+class RouteSignals(QObject):
+    # (request_id, result dict)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    # file DB bị thay (import lại map): GUI phải load lại graph
+    replaced = pyqtSignal(int)
+
 
-    for u, v, status in blocked_list:
-        if u in nodes and v in nodes:
-            coords = [nodes[u], nodes[v]]
-            if status == 'flood':
-                color = "cyan"      
-                tooltip = "FLOOD (Ngập lụt)"
-            elif status == 'block':
-                color = "red"      
-                tooltip = "BLOCKED (Cấm đường)"
-            elif status =='traffic':
-                color = "orange"
-                tooltip = "TRAFFIC (Tắc)"
+class RouteTask(QRunnable):
+    """
+    1 lần tìm đường + tạo overlay GeoJSON. Pool chỉ có 1 thread nên graph / route cache chỉ bị
+    1 task dùng tại 1 thời điểm. is_current(request_id) = False nghĩa là đã có click mới hơn:
+    thuật toán nhận should_stop = not is_current(...) và tự kiểm tra sau mỗi STOP_CHECK_EVERY lần
+    pop, nên task cũ dừng ngay (SearchCancelled, không cache gì) thay vì bắt query mới chờ.
+    status_version: version của graph lúc overlay status được gửi lần cuối; nếu graph đã đổi
+    (sync nhận thay đổi từ admin) thì task tạo lại overlay status.
+    Nếu file DB đã bị thay cả file (GraphReplaced) thì task báo replaced để GUI load lại graph.
+    """
 
-            folium.PolyLine(locations=coords,color=color,tooltip=tooltip).add_to(m)
+    def __init__(self, request_id, key, start, goal, graph, route_cache, is_current, status_version):
+        super().__init__()
+        self.request_id = request_id
+        self.key = key
+        self.start = start
+        self.goal = goal
+        self.graph = graph
+        self.route_cache = route_cache
+        self.is_current = is_current
+        self.status_version = status_version
+        self.signals = RouteSignals()
+
+    def run(self):
+        if not self.is_current(self.request_id):
+            return
+        try:
+            t0 = time.perf_counter()
+            self.graph.sync()
+            stats = SearchStats()
+            # thuat toan co tuyen thay the: 1 lan search tra ve ca tuyen chinh, cache ca danh sach
+            path, dist, routes = self.route_cache.query_routes(
+                self.key, self.start, self.goal, stats,
+                should_stop=lambda: not self.is_current(self.request_id))
+            t1 = time.perf_counter()
+            if not self.is_current(self.request_id):
+                return
+            result = {
+                "key": self.key,
+                "path": path,
+                "dist": dist,
+                "routes": routes,
+                "stats": stats.as_dict(),
+                "route": overlay_message("route", route_overlay(self.graph.nodes, path, routes)),
+                "status": None,
+                "version": self.graph.version,
+                "search_ms": (t1 - t0) * 1000,
+            }
+            if self.graph.version != self.status_version:
+                result["status"] = overlay_message("status", blocked_overlay(self.graph.nodes, self.graph.edges))
+            result["build_ms"] = (time.perf_counter() - t1) * 1000
+            if self.is_current(self.request_id):
+                self.signals.finished.emit(self.request_id, result)
+        except GraphReplaced:
+            self.signals.replaced.emit(self.request_id)
+        except SearchCancelled:
+            # đã có click mới hơn: bỏ, task mới đang chờ trong pool
+            return
+        except Exception as exc:
+            self.signals.failed.emit(self.request_id, str(exc))
 
 
 # -------------------------------
 # Object nhận sự kiện từ JavaScript
 # -------------------------------
 class JsBridge(QObject):
+    # Python -> JS: {"name", "data"} (xem utils/map_overlay.py)
+    overlayChanged = pyqtSignal(str)
+
     def __init__(self, gui):
         super().__init__()
         self.gui = gui
@@ -108,6 +178,14 @@ class JsBridge(QObject):
         print("PY received click:", lat, lon)
         self.gui.map_clicked(lat, lon)
 
+    @pyqtSlot()
+    def onMapReady(self):
+        self.gui.map_ready()
+
+    @pyqtSlot(str)
+    def overlayDrawn(self, name):
+        self.gui.overlay_drawn(name)
+
 
 # -------------------------------
 # GUI chính
@@ -118,37 +196,47 @@ class MapGUI(QWidget):
         self.setWindowTitle("Shortest Path Project")
         self.resize(1000, 700)
 
-        # load DB
-        self.graph, self.nodes = load_graph_from_db()
+        # load DB (LiveGraph: nhan thay doi status tu admin ma khong load lai graph)
+        self.load_graph()
 
         self.start_node = None
         self.goal_node = None
 
+        # 1 worker thread: query mới huỷ query cũ (tăng _route_seq), không xếp hàng sau nó
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self._route_seq = 0
+        # overlay status đã gửi ứng với version nào của graph (None = chưa gửi)
+        self._status_version = None
+        self._draw_started = None
+
         # layout
         layout = QVBoxLayout(self)
 
         # control bar
         bar = QHBoxLayout()
         self.alg = QComboBox() #dropbox
-        self.alg.addItems(["A*", "Dijkstra"])
+        for key, entry in ALGORITHMS.items():
+            self.alg.addItem(entry["label"], key)
         self.clear_btn = QPushButton("Clear")
         self.clear_btn.clicked.connect(self.reset_selection)
         bar.addWidget(QLabel("Algorithm:"))
         bar.addWidget(self.alg)
         bar.addWidget(self.clear_btn)
         bar.addStretch()
+        self.status = QLabel("")
+        bar.addWidget(self.status)
         layout.addLayout(bar)
 
         # Web view
         self.web = QWebEngineView()
         layout.addWidget(self.web)
 
-        # Create map
+        # Create map: chỉ tạo HTML 1 lần, route / status là overlay GeoJSON
         lat_avg, lon_avg = get_map_center()
         m = create_map_with_js((lat_avg, lon_avg))
-        draw_bloked_path(m,self.nodes)
         save_map(m)
-        
+
         # Setup JS bridge
         self.channel = QWebChannel() #js goi python
         self.js_bridge = JsBridge(self)
@@ -161,6 +249,13 @@ class MapGUI(QWidget):
         # Inject JS to connect click handler
         self.web.loadFinished.connect(self.inject_js)
 
+    def load_graph(self):
+        #load (lại) graph + index + cache từ DB; gọi lại khi file DB bị thay cả file
+        self.graph = LiveGraph.from_db()
+        self.nodes = self.graph.nodes
+        self.node_index = NodeIndex(self.nodes)
+        self.route_cache = RouteCache(self.graph, self.nodes)
+
     def inject_js(self):
         init_js = r"""
             (function() {
@@ -190,6 +285,8 @@ class MapGUI(QWidget):
                                 mapObj.on('click', function(e) {
                                     pyHandler.onMapClick(e.latlng.lat, e.latlng.lng);
                                 });
+                                pyOverlayInit(mapObj, pyHandler);
+                                pyHandler.onMapReady();
                             }
                         }
 
@@ -198,20 +295,28 @@ class MapGUI(QWidget):
                 });
             })();
         """
-        self.web.page().runJavaScript(init_js)
+        self.web.page().runJavaScript(OVERLAY_JS + init_js)
+
+    def map_ready(self):
+        #JS đã nối overlayChanged -> gửi overlay status ban đầu
+        self._status_version = self.graph.version
+        self.push_overlay(overlay_message("status", blocked_overlay(self.nodes, self.graph.edges)))
+
+    def push_overlay(self, message):
+        self.js_bridge.overlayChanged.emit(message)
 
     # ---------------------------
     # Khi click lên map
     # ---------------------------
     def map_clicked(self, lat, lon):
         if self.start_node is None:
-            self.start_node = find_nearest_node(lat, lon, self.nodes)
+            self.start_node = find_nearest_node(lat, lon, self.node_index)
             QMessageBox.information(self, "Start Selected",
                                     f"Start node = {self.start_node}")
             return
 
         if self.goal_node is None:
-            self.goal_node = find_nearest_node(lat, lon, self.nodes)
+            self.goal_node = find_nearest_node(lat, lon, self.node_index)
             QMessageBox.information(self, "Goal Selected",
                                     f"Goal node = {self.goal_node}")
 
@@ -220,41 +325,91 @@ class MapGUI(QWidget):
             return
 
     # ---------------------------
-    # Chạy thuật toán
+    # Chạy thuật toán (trong worker)
     # ---------------------------
     def run_algorithm(self):
-        algo = self.alg.currentText()
-
-        if algo == "A*":
-            path = astar(self.graph, self.nodes, self.start_node, self.goal_node)
-            if path is None:
-                QMessageBox.warning(self, "Error", "No path found by A*")
-                return
-        else:
-            path, dist = dijkstra(self.graph, self.nodes, self.start_node, self.goal_node)
-            if path is None:
-                QMessageBox.warning(self, "Error", "No path found by Dijkstra")
-                return
-
-        # tạo map mới
-        m = create_map_with_js(self.nodes[self.start_node])
-        draw_path_on_map(m, self.nodes, path)
-        draw_bloked_path(m,self.nodes)
-        save_map(m)
-
-        self.web.reload()
+        self._route_seq += 1
+        # bỏ task chưa chạy; task đang chạy thấy is_current = False và tự dừng (should_stop)
+        self.pool.clear()
+        task = RouteTask(self._route_seq, self.alg.currentData(), self.start_node, self.goal_node,
+                         self.graph, self.route_cache, self.is_current_route, self._status_version)
+        task.signals.finished.connect(self.on_route_finished)
+        task.signals.failed.connect(self.on_route_failed)
+        task.signals.replaced.connect(self.on_graph_replaced)
+        self.status.setText("Searching...")
+        self.pool.start(task)
+
+    def is_current_route(self, request_id):
+        return request_id == self._route_seq
+
+    def on_route_finished(self, request_id, result):
+        if not self.is_current_route(request_id):
+            return
+        entry = ALGORITHMS[result["key"]]
+        cache = self.route_cache.stats()
+        # cache hit: thuat toan khong chay, moi bo dem = 0
+        search = (", ".join(f"{name} {value}" for name, value in result["stats"].items())
+                  if any(result["stats"].values()) else "cached")
+        lines = [
+            f"Route cache: {cache['hit_rate']:.0%} hit ({cache['hits']} hit, {cache['tree_hits']} tree, "
+            f"{cache['misses']} miss, {cache['entries']} entries)",
+            f"{entry['label']} search: {search}",
+        ]
+        if result["routes"]:
+            lines.append(f"{len(result['routes'])} routes: "
+                         + ", ".join(f"{cost:.0f} m" for _, cost in result["routes"]))
+        self.status.setToolTip("\n".join(lines))
+        if result["status"] is not None:
+            self._status_version = result["version"]
+            self.push_overlay(result["status"])
+        if result["path"] is None:
+            self.status.setText("")
+            self.push_overlay(overlay_message("route", None))
+            QMessageBox.warning(self, "Error", f"No path found by {entry['label']}")
+            return
+        self._timings = (result["search_ms"], result["build_ms"])
+        self._draw_started = time.perf_counter()
+        self.push_overlay(result["route"])
+
+    def on_route_failed(self, request_id, message):
+        if self.is_current_route(request_id):
+            self.status.setText("")
+            QMessageBox.warning(self, "Error", f"Routing failed: {message}")
+
+    def on_graph_replaced(self, request_id):
+        # task cũ hơn cũng có thể báo replaced sau khi graph đã được load lại -> chỉ load 1 lần
+        if self.graph.replaced():
+            self.load_graph()
+            self._status_version = self.graph.version
+            self.push_overlay(overlay_message("status", blocked_overlay(self.nodes, self.graph.edges)))
+        if self.is_current_route(request_id):
+            # node id của map cũ có thể không còn: chọn lại start / goal
+            self.reset_selection()
+            QMessageBox.information(self, "Map reloaded",
+                                    "Map data changed on disk and was reloaded. Please select start and goal again.")
+
+    def overlay_drawn(self, name):
+        #JS báo đã vẽ xong overlay route: in thời gian search / tạo GeoJSON / vẽ
+        if name != "route" or self._draw_started is None:
+            return
+        draw_ms = (time.perf_counter() - self._draw_started) * 1000
+        self._draw_started = None
+        search_ms, build_ms = self._timings
+        text = f"search {search_ms:.0f} ms | geojson {build_ms:.0f} ms | draw {draw_ms:.0f} ms"
+        self.status.setText(text)
 
     # ---------------------------
     # Reset chọn start/goal
     # ---------------------------
     def reset_selection(self):
+        # huỷ tuyến đang tìm (nếu có)
+        self._route_seq += 1
+        self.pool.clear()
+        self.status.setText("")
+        self._draw_started = None
         self.start_node = None
         self.goal_node = None
-
-        lat_avg, lon_avg = get_map_center()  # dùng center trung bình
-        m = create_map_with_js((lat_avg, lon_avg))
-        save_map(m)
-        self.web.reload()
+        self.push_overlay(overlay_message("route", None))
 
 
 
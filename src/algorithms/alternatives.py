@@ -0,0 +1,181 @@
+import heapq
+import time
+from typing import Dict, List, Tuple, Any
+
+from utils.map_handler import get_adjacency_views
+from .cancel import STOP_MASK, SearchCancelled
+
+INF = float("inf")
+
+# gioi han mac dinh cho tuyen thay the
+MAX_ALTERNATIVES = 3
+MAX_OVERLAP = 0.6       # ti le do dai dung chung toi da voi moi tuyen da chon
+MAX_STRETCH = 1.4       # chi phi toi da so voi tuyen ngan nhat
+MIN_PLATEAU = 0.2       # plateau phai dai >= MIN_PLATEAU * chi phi tuyen (tuyen "hop ly" tai cho)
+TIME_BUDGET = 0.5       # giay
+
+
+def _bounded_tree(adj, source, target, stretch, counter, should_stop=None):
+    #Dijkstra tu source, dung khi key vuot stretch * d(source, target) (hoac het graph neu khong toi target)
+    # counter = [pops, stale, pushes, so lan search, so canh duyet] cong don cho stats
+    dist = {source: 0.0}
+    parent = {source: None}
+    pq = [(0.0, source)]
+    limit = INF
+    pops = 0
+    while pq:
+        d, u = heapq.heappop(pq)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
+        if d > dist[u]:
+            counter[1] += 1
+            continue
+        if d > limit:
+            break
+        if u == target:
+            limit = d * stretch
+        arcs = adj[u]
+        counter[4] += len(arcs)
+        for v, w in arcs:
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                parent[v] = u
+                heapq.heappush(pq, (nd, v))
+    counter[0] += pops
+    counter[2] += pops + len(pq)
+    counter[3] += 1
+    return dist, parent
+
+
+def alternative_routes(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    k: int = MAX_ALTERNATIVES,
+    max_overlap: float = MAX_OVERLAP,
+    max_stretch: float = MAX_STRETCH,
+    time_budget: float = TIME_BUDGET,
+    stats=None,
+    should_stop=None
+) -> List[Tuple[List[Any], float]]:
+    """
+    Tuyen thay the theo phuong phap plateau:
+    - 1 cay Dijkstra xuoi tu start va 1 cay nguoc tu goal (ca 2 dung o max_stretch * chi phi ngan nhat)
+    - plateau = doan canh nam tren ca 2 cay; moi plateau cho 1 tuyen start -> plateau -> goal
+      voi chi phi df[v] + db[v] cua bat ky node v tren plateau
+    - chon plateau dai truoc, bo tuyen dung chung > max_overlap do dai voi tuyen da chon
+    Tra ve toi da k tuyen [(path, cost)], tuyen dau la tuyen ngan nhat. Chi phi ~ 2 lan search, khong phu thuoc k.
+    should_stop: callable (tuy chon), True trong luc 2 cay dang chay -> raise SearchCancelled
+    """
+    t0 = time.perf_counter()
+    forward, reverse = get_adjacency_views(graph)
+    if start not in forward or goal not in forward:
+        return []
+    if start == goal:
+        return [([start], 0.0)]
+
+    counter = [0, 0, 0, 0, 0]   # pops, stale, pushes, so lan search, so canh duyet
+    df, pf = _bounded_tree(forward, start, goal, max_stretch, counter, should_stop)
+    if goal not in df:
+        _record(stats, counter)
+        return []
+    db, pb = _bounded_tree(reverse, goal, start, max_stretch, counter, should_stop)
+    _record(stats, counter)
+    best = df[goal]
+    limit = best * max_stretch
+
+    # plateau_start[v]: node dau cua plateau chua v (duyet theo df tang dan de cha duoc tinh truoc)
+    on_both = sorted((v for v in df if v in db and df[v] + db[v] <= limit), key=df.__getitem__)
+    plateau_start: Dict[Any, Any] = {}
+    plateau_end: Dict[Any, Any] = {}
+    for v in on_both:
+        u = pf[v]
+        if u is not None and u in plateau_start and pb.get(u) == v:
+            s = plateau_start[u]
+        else:
+            s = v
+        plateau_start[v] = s
+        plateau_end[s] = v
+
+    candidates = []
+    for s, e in plateau_end.items():
+        length = df[e] - df[s]
+        cost = df[s] + db[s]
+        if length >= MIN_PLATEAU * cost:
+            candidates.append((-length, cost, s))
+    candidates.sort()
+
+    shortest = _via_path(pf, pb, goal)
+    routes: List[Tuple[List[Any], float]] = [(shortest, best)]
+    chosen: List[Dict[Tuple[Any, Any], float]] = [_path_arcs(shortest, df, db, goal)]
+    for _, cost, s in candidates:
+        if len(routes) >= k or time.perf_counter() - t0 > time_budget:
+            break
+        path = _via_path(pf, pb, s)
+        if path == shortest or len(set(path)) != len(path):
+            # 2 nua di qua cung 1 node -> co vong, khong phai tuyen don
+            continue
+        arcs = _path_arcs(path, df, db, s)
+        if any(_shared(arcs, other) > max_overlap * cost for other in chosen):
+            continue
+        routes.append((path, cost))
+        chosen.append(arcs)
+    routes[1:] = sorted(routes[1:], key=lambda r: r[1])
+    return routes
+
+
+def _via_path(pf, pb, via) -> List[Any]:
+    path = []
+    node = via
+    while node is not None:
+        path.append(node)
+        node = pf[node]
+    path.reverse()
+    node = pb[via]
+    while node is not None:
+        path.append(node)
+        node = pb[node]
+    return path
+
+
+def _path_arcs(path, df, db, via) -> Dict[Tuple[Any, Any], float]:
+    #trong so tung canh cua tuyen, lay tu nhan khoang cach cua 2 cay
+    arcs = {}
+    i = path.index(via)
+    for a, b in zip(path[:i], path[1:i + 1]):
+        arcs[(a, b)] = df[b] - df[a]
+    for a, b in zip(path[i:], path[i + 1:]):
+        arcs[(a, b)] = db[a] - db[b]
+    return arcs
+
+
+def _shared(arcs, other) -> float:
+    return sum(w for arc, w in arcs.items() if arc in other)
+
+
+def _record(stats, counter) -> None:
+    if stats is not None:
+        pops, stale, pushes, searches, scanned = counter
+        stats.settled += pops - stale
+        stats.stale += stale
+        stats.pushes += pushes
+        stats.relaxed += scanned
+        stats.improved += pushes - searches
+
+
+def alternatives_query(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    stats=None,
+    should_stop=None
+):
+    #dang registry: tra ve tuyen ngan nhat (path, cost); cac tuyen thay the lay qua alternative_routes
+    routes = alternative_routes(graph, nodes, start, goal, stats=stats, should_stop=should_stop)
+    if not routes:
+        return None, INF
+    return routes[0]
@@ -1,39 +1,148 @@
 import heapq
-from .heuristic import haversine
+import math
+from array import array
+from .heuristic import R_EARTH, get_geo_table
 from typing import Dict, List, Tuple, Any
+
+from utils.csr_graph import CSRGraph
+from .cancel import STOP_MASK, SearchCancelled
+from .stats import record_search
 INF = float("inf")
 
 def astar(
     graph: Dict[Any, List[Tuple[Any, float]]],
     nodes: Dict[Any, Tuple[float, float]],
     start: Any,
-    goal: Any
+    goal: Any,
+    heuristic=None,
+    stats=None,
+    should_stop=None
 ):
-    g = {n : INF for n in graph}
-    g[start] = 0
-    pq = []
-    heapq.heappush(pq, (0, start))
-    
+    #heuristic(node, goal) -> chan duoi cua chi phi con lai, mac dinh la haversine
+    # (tinh tu GeoTable da tinh san cho nodes, khong goi heuristic.haversine moi lan relax)
+    #stats: SearchStats (tuy chon)
+    #should_stop: callable (tuy chon), True -> raise SearchCancelled
+    #tra ve (path, cost) giong dijkstra; (None, INF) neu khong co duong
+    # hang doi: (f, h, g, node) -> cung f thi uu tien node gan goal hon (h nho),
+    # phan tu co g lon hon g hien tai cua node la phan tu cu va bi bo qua
+    if isinstance(graph, CSRGraph):
+        return _astar_csr(graph, start, goal, heuristic, stats, should_stop)
+    if start not in graph or goal not in graph:
+        return None, INF
+    if heuristic is None:
+        h_of = get_geo_table(nodes).to_goal_id(goal)
+    else:
+        h_of = _bind_goal(heuristic, goal)
+    g = {start: 0.0}
+    h_cache = {start: h_of(start)}
+    pq = [(h_cache[start], h_cache[start], 0.0, start)]
     came_from = {}
-    
+    pops = stale = scanned = 0
+
     while pq:
-        f_curr, current = heapq.heappop(pq)
-        
+        _, _, g_curr, current = heapq.heappop(pq)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
+        if g_curr > g[current]:
+            stale += 1
+            continue
+
         if current == goal:
+            if stats is not None:
+                record_search(stats, pops, stale, len(pq), scanned)
             path = [current]
             while current in came_from:
                 current = came_from[current]
                 path.append(current)
-            return path[::-1]
-        for neighbor, weight in graph[current]:
-            tentative_g = g[current] + weight
+            return path[::-1], g_curr
+        adj = graph[current]
+        scanned += len(adj)
+        for neighbor, weight in adj:
+            tentative_g = g_curr + weight
+            if tentative_g < g.get(neighbor, INF):
+                came_from[neighbor] = current
+                g[neighbor] = tentative_g
+
+                #heuristic tu neigh -> goal (moi node chi tinh 1 lan)
+                h = h_cache.get(neighbor)
+                if h is None:
+                    h = h_cache[neighbor] = h_of(neighbor)
+                heapq.heappush(pq, (tentative_g + h, h, tentative_g, neighbor))
+    if stats is not None:
+        record_search(stats, pops, stale, 0, scanned)
+    return None, INF
+
+
+def _bind_goal(heuristic, goal):
+    #heuristic co to_goal_id (GeoTable, LandmarkTable): du lieu cua goal tinh 1 lan cho query nay
+    to_goal_id = getattr(heuristic, "to_goal_id", None)
+    if to_goal_id is not None:
+        return to_goal_id(goal)
+    return lambda node: heuristic(node, goal)
+
+
+def _astar_csr(graph: CSRGraph, start: Any, goal: Any, heuristic=None, stats=None, should_stop=None):
+    #A* tren CSRGraph; heuristic mac dinh tinh inline giong GeoTable.to_goal (theo index)
+    if start not in graph or goal not in graph:
+        return None, INF
+    s = graph.index[start]
+    t = graph.index[goal]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    ids = graph.ids
+    geo = get_geo_table(graph)
+    xs, ys, zs = geo.x, geo.y, geo.z
+    gx, gy, gz = xs[t], ys[t], zs[t]
+    sqrt = math.sqrt
+    n = len(graph)
+    g = array("d", [INF]) * n
+    # h < 0: chua tinh
+    h_cache = array("d", [-1.0]) * n
+    came_from = array("i", [-1]) * n
+    g[s] = 0.0
+    h_goal = None if heuristic is None else _bind_goal(heuristic, goal)
+    h_s = geo.to_goal(t)(s) if heuristic is None else h_goal(start)
+    h_cache[s] = h_s
+    pq = [(h_s, h_s, 0.0, s)]
+    pops = stale = scanned = 0
+
+    while pq:
+        _, _, g_curr, current = heapq.heappop(pq)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
+        if g_curr > g[current]:
+            stale += 1
+            continue
+
+        if current == t:
+            if stats is not None:
+                record_search(stats, pops, stale, len(pq), scanned)
+            path = [current]
+            while came_from[current] != -1:
+                current = came_from[current]
+                path.append(current)
+            return graph.path_ids(path[::-1]), g_curr
+        lo, hi = offsets[current], offsets[current + 1]
+        scanned += hi - lo
+        for k in range(lo, hi):
+            neighbor = targets[k]
+            tentative_g = g_curr + weights[k]
             if tentative_g < g[neighbor]:
                 came_from[neighbor] = current
                 g[neighbor] = tentative_g
-                
-                #heuristic tu neigh -> goal
-                h = haversine(nodes, neighbor, goal)
-                f = tentative_g + h
-                
-                heapq.heappush(pq, (f, neighbor))
-    return None
+
+                h = h_cache[neighbor]
+                if h < 0.0:
+                    if heuristic is None:
+                        dx = xs[neighbor] - gx
+                        dy = ys[neighbor] - gy
+                        dz = zs[neighbor] - gz
+                        h = R_EARTH * sqrt(dx * dx + dy * dy + dz * dz)
+                    else:
+                        h = h_goal(ids[neighbor])
+                    h_cache[neighbor] = h
+                heapq.heappush(pq, (tentative_g + h, h, tentative_g, neighbor))
+    if stats is not None:
+        record_search(stats, pops, stale, 0, scanned)
+    return None, INF
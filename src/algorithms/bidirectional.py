@@ -0,0 +1,129 @@
+import heapq
+from typing import Dict, List, Tuple, Any, Optional
+
+from utils.map_handler import get_adjacency_views
+from .heuristic import get_geo_table
+from .cancel import STOP_MASK, SearchCancelled
+
+INF = float("inf")
+
+
+def _bidirectional(graph, reverse, start, goal, potential=None, stats=None, should_stop=None):
+#loi chung: 2 huong Dijkstra (xuoi tu start tren graph, nguoc tu goal tren reverse)
+# potential(v): the nang p_f cua huong xuoi, huong nguoc dung -p_f (average potential)
+# dist chi luu node da cham toi (khong khoi tao dist cho ca graph)
+# stats: SearchStats (tuy chon), cong don cho ca 2 huong
+# should_stop: callable (tuy chon), True -> raise SearchCancelled
+    if start not in graph or goal not in graph:
+        return None, INF
+    if start == goal:
+        return [start], 0.0
+
+    dist = ({start: 0.0}, {goal: 0.0})
+    parent = ({start: None}, {goal: None})
+    settled = (set(), set())
+    adj = (graph, reverse)
+    sign = (1.0, -1.0)
+    if potential is None:
+        pq = ([(0.0, start)], [(0.0, goal)])
+    else:
+        pq = ([(potential(start), start)], [(-potential(goal), goal)])
+    best = INF
+    meet = None
+    pops = stale = scanned = 0
+
+    while pq[0] and pq[1]:
+        # dung khi min key 2 huong cong lai khong nho hon duong di tot nhat da biet
+        if pq[0][0][0] + pq[1][0][0] >= best:
+            break
+        # mo rong huong co hang doi nho hon
+        side = 0 if len(pq[0]) <= len(pq[1]) else 1
+        heap = pq[side]
+        _, u = heapq.heappop(heap)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
+        if u in settled[side]:
+            stale += 1
+            continue
+        settled[side].add(u)
+
+        my_dist, other = dist[side], dist[side ^ 1]
+        my_parent = parent[side]
+        d = my_dist[u]
+        arcs = adj[side][u]
+        scanned += len(arcs)
+        for v, w in arcs:
+            nd = d + w
+            if nd < my_dist.get(v, INF):
+                my_dist[v] = nd
+                my_parent[v] = u
+                key = nd if potential is None else nd + sign[side] * potential(v)
+                heapq.heappush(heap, (key, v))
+            if v in other and nd + other[v] < best:
+                best = nd + other[v]
+                meet = v
+
+    if stats is not None:
+        remaining = len(pq[0]) + len(pq[1])
+        stats.settled += pops - stale
+        stats.stale += stale
+        stats.pushes += pops + remaining
+        stats.relaxed += scanned
+        stats.improved += pops + remaining - 2
+    if meet is None:
+        return None, INF
+
+    path = []
+    node = meet
+    while node is not None:
+        path.append(node)
+        node = parent[0][node]
+    path.reverse()
+    node = parent[1][meet]
+    while node is not None:
+        path.append(node)
+        node = parent[1][node]
+    return path, best
+
+
+def bidirectional_dijkstra(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    reverse: Optional[Dict[Any, List[Tuple[Any, float]]]] = None,
+    stats=None,
+    should_stop=None
+):
+    #reverse: graph nguoc (mac dinh lay tu map_handler.get_adjacency_views, co cache)
+    if reverse is None:
+        graph, reverse = get_adjacency_views(graph)
+    return _bidirectional(graph, reverse, start, goal, stats=stats, should_stop=should_stop)
+
+
+def bidirectional_astar(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    reverse: Optional[Dict[Any, List[Tuple[Any, float]]]] = None,
+    stats=None,
+    should_stop=None
+):
+    #A* 2 chieu voi the nang trung binh p_f(v) = (h(v, goal) - h(start, v)) / 2 (haversine, tu GeoTable)
+    if nodes is None:
+        nodes = graph.nodes
+    if reverse is None:
+        graph, reverse = get_adjacency_views(graph)
+    if start not in graph or goal not in graph:
+        return None, INF
+
+    geo = get_geo_table(nodes)
+    to_goal = geo.to_goal_id(goal)
+    from_start = geo.to_goal_id(start)
+
+    def potential(v):
+        return 0.5 * (to_goal(v) - from_start(v))
+
+    return _bidirectional(graph, reverse, start, goal, potential, stats, should_stop)
@@ -0,0 +1,9 @@
+class SearchCancelled(Exception):
+    #should_stop() tra ve True giua chung search: thuat toan dung ngay, khong co ket qua (khong cache)
+    pass
+
+
+# vong lap search goi should_stop() 1 lan moi STOP_CHECK_EVERY lan pop (luy thua cua 2):
+# kiem tra bang pops & STOP_MASK, khi should_stop=None chi ton 1 phep so sanh / pop
+STOP_CHECK_EVERY = 1024
+STOP_MASK = STOP_CHECK_EVERY - 1
@@ -0,0 +1,414 @@
+import heapq
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from typing import Dict, List, Tuple, Any, Optional
+
+from utils.csr_graph import CSRGraph
+from utils.graph_cache import GraphCache
+from .cancel import STOP_MASK, SearchCancelled
+
+INF = float("inf")
+
+# so node toi da duoc settle trong 1 lan witness search (gioi han de tien xu ly nhanh)
+WITNESS_SETTLE_LIMIT = 60
+
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchies:
+    - rank[u]: thu tu contract cua node u (node contract sau co rank cao hon)
+    - up[u]   = [(v, w), ...] canh u -> v voi rank[v] > rank[u]
+    - down[u] = [(x, w), ...] canh x -> u voi rank[x] > rank[u] (dung cho search nguoc tu goal)
+    - mid[(a, b)] = node bi contract khi tao shortcut a -> b (None neu la canh goc)
+    """
+
+    def __init__(self, rank, up, down, mid, fingerprint=""):
+        self.rank: Dict[Any, int] = rank
+        self.up: Dict[Any, List[Tuple[Any, float]]] = up
+        self.down: Dict[Any, List[Tuple[Any, float]]] = down
+        self.mid: Dict[Tuple[Any, Any], Any] = mid
+        self.fingerprint = fingerprint
+
+    @property
+    def num_shortcuts(self) -> int:
+        return sum(1 for m in self.mid.values() if m is not None)
+
+    # ---------------- Query ----------------
+    def query(self, start: Any, goal: Any, stats=None, should_stop=None):
+        #bidirectional Dijkstra chi di len (rank tang dan), tra ve (path theo OSM id, cost)
+        #stats: SearchStats (tuy chon); phan tu bi cat bo khi d >= best khong tinh la settled
+        #should_stop: callable (tuy chon), True -> raise SearchCancelled
+        if start not in self.rank or goal not in self.rank:
+            return None, INF
+        if start == goal:
+            return [start], 0.0
+
+        dist = ({start: 0.0}, {goal: 0.0})
+        parent = ({start: None}, {goal: None})
+        pq = ([(0.0, start)], [(0.0, goal)])
+        adj = (self.up, self.down)
+        best = INF
+        meet = None
+        side = 0
+        pops = stale = pruned = dropped = scanned = 0
+
+        while pq[0] or pq[1]:
+            # xen ke 2 chieu, chieu nao het hang doi thi chay chieu con lai
+            if not pq[side]:
+                side ^= 1
+            heap = pq[side]
+            d, u = heapq.heappop(heap)
+            pops += 1
+            if should_stop is not None and not pops & STOP_MASK and should_stop():
+                raise SearchCancelled()
+            if d >= best:
+                # chieu nay khong the cai thien ket qua nua
+                pruned += 1
+                dropped += len(heap)
+                heap.clear()
+                side ^= 1
+                continue
+            my_dist = dist[side]
+            if d > my_dist[u]:
+                stale += 1
+                side ^= 1
+                continue
+
+            other = dist[side ^ 1]
+            if u in other and d + other[u] < best:
+                best = d + other[u]
+                meet = u
+
+            my_parent = parent[side]
+            arcs = adj[side].get(u, ())
+            scanned += len(arcs)
+            for v, w in arcs:
+                nd = d + w
+                if nd < my_dist.get(v, INF):
+                    my_dist[v] = nd
+                    my_parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+            side ^= 1
+
+        if stats is not None:
+            stats.settled += pops - stale - pruned
+            stats.stale += stale
+            stats.pushes += pops + dropped
+            stats.relaxed += scanned
+            stats.improved += pops + dropped - 2
+        if meet is None:
+            return None, INF
+
+        # ghep 2 nua path theo canh cua hierarchy
+        up_path = []
+        node = meet
+        while node is not None:
+            up_path.append(node)
+            node = parent[0][node]
+        up_path.reverse()
+        node = parent[1][meet]
+        while node is not None:
+            up_path.append(node)
+            node = parent[1][node]
+        return self.unpack(up_path), best
+
+    def unpack(self, ch_path: List[Any]) -> List[Any]:
+        #mo shortcut thanh path goc (toan bo la node id OSM)
+        if not ch_path:
+            return []
+        path = [ch_path[0]]
+        mid = self.mid
+        for a, b in zip(ch_path, ch_path[1:]):
+            stack = [(a, b)]
+            while stack:
+                x, y = stack.pop()
+                m = mid.get((x, y))
+                if m is None:
+                    path.append(y)
+                else:
+                    # xu ly (x, m) truoc (m, y)
+                    stack.append((m, y))
+                    stack.append((x, m))
+        return path
+
+    # ---------------- Luu / doc ----------------
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with sqlite3.connect(tmp_path) as conn:
+            c = conn.cursor()
+            c.execute("CREATE TABLE ch_meta (key TEXT PRIMARY KEY, value TEXT)")
+            c.execute("CREATE TABLE ch_rank (node_id INTEGER PRIMARY KEY, rank INTEGER)")
+            c.execute('''
+                CREATE TABLE ch_edges(
+                    from_node INTEGER,
+                    to_node INTEGER,
+                    weight REAL,
+                    mid INTEGER
+                )
+            ''')
+            c.execute("INSERT INTO ch_meta VALUES ('fingerprint', ?)", (self.fingerprint,))
+            c.executemany("INSERT INTO ch_rank VALUES (?, ?)", self.rank.items())
+            c.executemany(
+                "INSERT INTO ch_edges VALUES (?, ?, ?, ?)",
+                ((u, v, w, self.mid.get((u, v))) for u, lst in self.up.items() for v, w in lst)
+            )
+            c.executemany(
+                "INSERT INTO ch_edges VALUES (?, ?, ?, ?)",
+                ((x, u, w, self.mid.get((x, u))) for u, lst in self.down.items() for x, w in lst)
+            )
+            conn.commit()
+        conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ContractionHierarchy"]:
+        if not os.path.exists(path):
+            return None
+        with sqlite3.connect(path) as conn:
+            c = conn.cursor()
+            row = c.execute("SELECT value FROM ch_meta WHERE key = 'fingerprint'").fetchone()
+            rank = dict(c.execute("SELECT node_id, rank FROM ch_rank").fetchall())
+            rows = c.execute("SELECT from_node, to_node, weight, mid FROM ch_edges").fetchall()
+        conn.close()
+
+        up: Dict[Any, List[Tuple[Any, float]]] = {u: [] for u in rank}
+        down: Dict[Any, List[Tuple[Any, float]]] = {u: [] for u in rank}
+        mid: Dict[Tuple[Any, Any], Any] = {}
+        for u, v, w, m in rows:
+            if rank[v] > rank[u]:
+                up[u].append((v, w))
+            else:
+                down[v].append((u, w))
+            mid[(u, v)] = m
+        return cls(rank, up, down, mid, row[0] if row else "")
+
+
+# ---------------- Tien xu ly ----------------
+def graph_fingerprint(graph: Dict[Any, List[Tuple[Any, float]]]) -> str:
+#hash cua toan bo canh + trong so, dung de biet file CH con khop voi graph hien tai khong
+    h = hashlib.sha1()
+    for u in sorted(graph):
+        h.update(repr((u, sorted(graph[u]))).encode())
+    return h.hexdigest()
+
+
+def _witness_search(out_adj, source, skip, targets, max_cost):
+#Dijkstra cuc bo tu source (bo qua node skip), dung khi da settle het targets hoac vuot max_cost
+    dist = {source: 0.0}
+    pq = [(0.0, source)]
+    remaining = len(targets)
+    settled = 0
+    while pq and remaining and settled < WITNESS_SETTLE_LIMIT:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        if d > max_cost:
+            break
+        settled += 1
+        if u in targets:
+            remaining -= 1
+        for v, w in out_adj[u].items():
+            if v == skip:
+                continue
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return dist
+
+
+def _shortcuts_for(u, out_adj, in_adj):
+#tim cac shortcut can them neu contract node u: [(x, y, w)]
+    shortcuts = []
+    outs = out_adj[u]
+    if not outs:
+        return shortcuts
+    max_out = max(outs.values())
+    for x, w_xu in in_adj[u].items():
+        if x == u:
+            continue
+        targets = {y for y in outs if y != x}
+        if not targets:
+            continue
+        dist = _witness_search(out_adj, x, u, targets, w_xu + max_out)
+        for y in targets:
+            via = w_xu + outs[y]
+            if dist.get(y, INF) > via:
+                shortcuts.append((x, y, via))
+    return shortcuts
+
+
+def _priority(u, out_adj, in_adj, deleted):
+    shortcuts = _shortcuts_for(u, out_adj, in_adj)
+    edge_diff = len(shortcuts) - len(out_adj[u]) - len(in_adj[u])
+    return edge_diff + deleted[u], shortcuts
+
+
+def build_ch(graph: Dict[Any, List[Tuple[Any, float]]]) -> ContractionHierarchy:
+#contract lan luot cac node theo do uu tien (edge difference + so hang xom da bi contract)
+    out_adj: Dict[Any, Dict[Any, float]] = {u: {} for u in graph}
+    in_adj: Dict[Any, Dict[Any, float]] = {u: {} for u in graph}
+    mid: Dict[Tuple[Any, Any], Any] = {}
+    for u, lst in graph.items():
+        for v, w in lst:
+            if u == v or v not in out_adj:
+                continue
+            # canh song song: chi giu canh ngan nhat
+            if w < out_adj[u].get(v, INF):
+                out_adj[u][v] = w
+                in_adj[v][u] = w
+                mid[(u, v)] = None
+
+    deleted = {u: 0 for u in graph}
+    pq = []
+    for u in graph:
+        prio, _ = _priority(u, out_adj, in_adj, deleted)
+        pq.append((prio, u))
+    heapq.heapify(pq)
+
+    rank: Dict[Any, int] = {}
+    up: Dict[Any, List[Tuple[Any, float]]] = {u: [] for u in graph}
+    down: Dict[Any, List[Tuple[Any, float]]] = {u: [] for u in graph}
+    order = 0
+    while pq:
+        _, u = heapq.heappop(pq)
+        if u in rank:
+            continue
+        # lazy update: tinh lai priority, neu khong con nho nhat thi day lai vao heap
+        prio, shortcuts = _priority(u, out_adj, in_adj, deleted)
+        if pq and prio > pq[0][0]:
+            heapq.heappush(pq, (prio, u))
+            continue
+
+        rank[u] = order
+        order += 1
+
+        # canh con lai cua u deu noi toi node co rank cao hon
+        for v, w in out_adj[u].items():
+            up[u].append((v, w))
+            del in_adj[v][u]
+            deleted[v] += 1
+        for x, w in in_adj[u].items():
+            down[u].append((x, w))
+            del out_adj[x][u]
+            deleted[x] += 1
+        out_adj[u] = {}
+        in_adj[u] = {}
+
+        for x, y, w in shortcuts:
+            if w < out_adj[x].get(y, INF):
+                out_adj[x][y] = w
+                in_adj[y][x] = w
+                mid[(x, y)] = u
+
+    # chi giu mid cua cac canh con nam trong hierarchy
+    kept = {}
+    for u, lst in up.items():
+        for v, _ in lst:
+            kept[(u, v)] = mid[(u, v)]
+    for u, lst in down.items():
+        for x, _ in lst:
+            kept[(x, u)] = mid[(x, u)]
+    return ContractionHierarchy(rank, up, down, kept, graph_fingerprint(graph))
+
+
+# ---------------- Dung trong registry ----------------
+def ch_path(db_path: str) -> str:
+    #file CH dat canh DB: map_data.db -> map_data.ch.db
+    return os.path.splitext(db_path)[0] + ".ch.db"
+
+
+def _default_ch_path(graph) -> Optional[str]:
+    #file CH cua DB ma graph duoc load tu do (LiveGraph / CSRGraph co db_path);
+    # graph khong gan voi DB nao (dict tu build_graph, graph tong hop) -> None: chi build trong RAM,
+    # khong ghi de file CH cua DB khac
+    db_path = getattr(graph, "db_path", None)
+    return ch_path(db_path) if db_path else None
+
+
+# graph -> (version, ch); LiveGraph tang version khi trong so thay doi
+_CH_CACHE = GraphCache()
+# graph -> version dang duoc build lai o thread nen
+_CH_BUILDING = GraphCache()
+_CH_LOCK = threading.Lock()
+
+
+def get_ch(graph: Dict[Any, List[Tuple[Any, float]]], path: Optional[str] = None,
+           background: bool = True) -> Optional[ContractionHierarchy]:
+#lay CH cho graph: uu tien file da tien xu ly, neu khong khop thi build lai va luu
+# da co CH cho version cu (LiveGraph vua doi status): build lai o thread nen tren ban sao graph,
+# tra ve None cho toi khi xong (nguoi goi tu fallback sang Dijkstra) -> query khong bi chan
+# background=False: luon build dong bo (benchmark / tien xu ly)
+# path: file CH, mac dinh lay theo graph.db_path (xem _default_ch_path)
+    version = getattr(graph, "version", 0)
+    cached = _CH_CACHE.get(graph)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if cached is not None and background:
+        _rebuild_async(graph, version)
+        return None
+    path = path or _default_ch_path(graph)
+    adjacency = graph.to_adjacency() if isinstance(graph, CSRGraph) else graph
+    fingerprint = graph_fingerprint(adjacency)
+    ch = ContractionHierarchy.load(path) if path else None
+    if ch is None or ch.fingerprint != fingerprint:
+        ch = build_ch(adjacency)
+        if path:
+            ch.save(path)
+    _CH_CACHE.set(graph, (version, ch))
+    return ch
+
+
+def _rebuild_async(graph, version: int) -> None:
+    #CH cho trong so hien tai chi giu trong RAM (file .ch.db la cua trang thai luc tien xu ly)
+    with _CH_LOCK:
+        if _CH_BUILDING.get(graph) == version:
+            return
+        _CH_BUILDING.set(graph, version)
+    # chup adjacency o thread goi: LiveGraph sua list canh tai cho khi doi status
+    snapshot = {u: list(adj) for u, adj in graph.items()}
+
+    def run():
+        ch = build_ch(snapshot)
+        with _CH_LOCK:
+            cached = _CH_CACHE.get(graph)
+            if cached is None or cached[0] < version:
+                _CH_CACHE.set(graph, (version, ch))
+
+    threading.Thread(target=run, name="ch-rebuild", daemon=True).start()
+
+
+def ch_query(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    stats=None,
+    should_stop=None
+):
+    ch = get_ch(graph)
+    if ch is None:
+        # CH dang build lai sau khi doi status: Dijkstra cho ket qua dung trong luc cho
+        from .dijkstra import dijkstra
+        return dijkstra(graph, nodes, start, goal, stats=stats, should_stop=should_stop)
+    return ch.query(start, goal, stats, should_stop)
+
+
+def preprocess(db_path: Optional[str] = None) -> ContractionHierarchy:
+#buoc offline: load graph tu DB, contract va luu shortcut canh map_data.db
+    from utils.map_handler import DB_PATH, load_graph_from_db
+    db_path = db_path or DB_PATH
+    graph, _ = load_graph_from_db(db_path)
+    ch = build_ch(graph)
+    ch.save(ch_path(db_path))
+    return ch
+
+
+if __name__ == "__main__":
+    ch = preprocess(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Contracted {len(ch.rank)} nodes, {ch.num_shortcuts} shortcuts")
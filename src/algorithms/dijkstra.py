@@ -1,30 +1,51 @@
 import math
+from array import array
 from typing import Dict, Tuple, List, Any
 import heapq
+
+from utils.csr_graph import CSRGraph
+from .cancel import STOP_MASK, SearchCancelled
+from .stats import record_search
+
 def dijkstra(
     graph: Dict[Any, List[Tuple[Any, float]]],
     nodes: Dict[Any, Tuple[float, float]],
     start: Any,
-    goal: Any
+    goal: Any,
+    stats=None,
+    should_stop=None
 ):
+    #stats: SearchStats (tuy chon), duoc dien so node settle / stale / push / relax sau khi search xong
+    #should_stop: callable (tuy chon), tra ve True -> raise SearchCancelled (xem algorithms/cancel.py)
+    if isinstance(graph, CSRGraph):
+        return _dijkstra_csr(graph, start, goal, stats, should_stop)
     pq = []
     heapq.heappush(pq, (0, start))
     dist = {n : float("inf") for n in graph}
     dist[start] = 0
     parent = {start: None}
+    pops = stale = scanned = 0
     while pq:
         cur_cost, u = heapq.heappop(pq)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
         if u == goal:
             break
         if cur_cost > dist[u]:
+            stale += 1
             continue
-        
-        for v, length in graph[u]:
+
+        adj = graph[u]
+        scanned += len(adj)
+        for v, length in adj:
             new_cost = cur_cost + length
             if new_cost < dist[v]:
                 dist[v] = new_cost
                 parent[v] = u
                 heapq.heappush(pq, (new_cost, v))
+    if stats is not None:
+        record_search(stats, pops, stale, len(pq), scanned)
     if goal not in parent:
         return None, float("inf")
     path = []
@@ -34,3 +55,47 @@ def dijkstra(
         node = parent[node]
     path.reverse()
     return path, dist[goal]
+
+
+def _dijkstra_csr(graph: CSRGraph, start: Any, goal: Any, stats=None, should_stop=None):
+    #chay tren CSRGraph: dist/parent la mang theo index, path tra ve theo OSM id
+    s = graph.index[start]
+    t = graph.index[goal]
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    n = len(graph)
+    dist = array("d", [float("inf")]) * n
+    parent = array("i", [-1]) * n
+    dist[s] = 0.0
+    pq = [(0.0, s)]
+    pops = stale = scanned = 0
+    while pq:
+        cur_cost, u = heapq.heappop(pq)
+        pops += 1
+        if should_stop is not None and not pops & STOP_MASK and should_stop():
+            raise SearchCancelled()
+        if u == t:
+            break
+        if cur_cost > dist[u]:
+            stale += 1
+            continue
+
+        lo, hi = offsets[u], offsets[u + 1]
+        scanned += hi - lo
+        for k in range(lo, hi):
+            v = targets[k]
+            new_cost = cur_cost + weights[k]
+            if new_cost < dist[v]:
+                dist[v] = new_cost
+                parent[v] = u
+                heapq.heappush(pq, (new_cost, v))
+    if stats is not None:
+        record_search(stats, pops, stale, len(pq), scanned)
+    if dist[t] == float("inf"):
+        return None, float("inf")
+    path = []
+    node = t
+    while node != -1:
+        path.append(node)
+        node = parent[node]
+    path.reverse()
+    return graph.path_ids(path), dist[t]
@@ -1,5 +1,9 @@
 import math
-from typing import Dict, List, Tuple, Any
+from array import array
+from typing import Dict, List, Tuple, Any, Sequence
+
+from utils.csr_graph import CSRGraph
+from utils.graph_cache import GraphCache
 R_EARTH = 6371000.0
 def haversine(nodes, a, b):
     lat1, lon1 = nodes[a]
@@ -12,3 +16,102 @@ def haversine(nodes, a, b):
     a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlamb / 2) ** 2
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R_EARTH * c
+
+
+try:
+    import numpy as np
+except ImportError:  # numpy la tuy chon, chi dung cho heuristic_many
+    np = None
+
+
+class GeoTable:
+    """
+    Toa do da tinh san theo index (0..N-1) cho heuristic haversine:
+    - phi, lamb: lat / lon doi sang radian
+    - cos_phi:   cos(lat)
+    - x, y, z:   diem tren mat cau don vi
+    Tinh 1 lan khi load graph. distance() la haversine chinh xac; to_goal() dung
+    R * (do dai day cung): luon <= haversine (sai khac < 1 cm voi 20 km) va la metric,
+    nen van la heuristic hop le + nhat quan cho A*, ma moi lan goi chi con 1 sqrt.
+    """
+    __slots__ = ("ids", "index", "phi", "lamb", "cos_phi", "x", "y", "z")
+
+    def __init__(self, ids, lat, lon, index: Dict[Any, int] = None):
+        self.ids = ids
+        self.index: Dict[Any, int] = index if index is not None else {nid: i for i, nid in enumerate(ids)}
+        self.phi = array("d", map(math.radians, lat))
+        self.lamb = array("d", map(math.radians, lon))
+        self.cos_phi = array("d", map(math.cos, self.phi))
+        self.x = array("d", (c * math.cos(l) for c, l in zip(self.cos_phi, self.lamb)))
+        self.y = array("d", (c * math.sin(l) for c, l in zip(self.cos_phi, self.lamb)))
+        self.z = array("d", map(math.sin, self.phi))
+
+    @classmethod
+    def from_nodes(cls, nodes: Dict[Any, Tuple[float, float]]) -> "GeoTable":
+        ids = list(nodes)
+        return cls(ids, [nodes[n][0] for n in ids], [nodes[n][1] for n in ids])
+
+    def __len__(self) -> int:
+        return len(self.phi)
+
+    def distance(self, i: int, j: int) -> float:
+        #haversine giua 2 index (met)
+        phi, lamb, cos_phi = self.phi, self.lamb, self.cos_phi
+        a = (math.sin((phi[j] - phi[i]) * 0.5) ** 2
+             + cos_phi[i] * cos_phi[j] * math.sin((lamb[j] - lamb[i]) * 0.5) ** 2)
+        return 2.0 * R_EARTH * math.asin(math.sqrt(min(1.0, a)))
+
+    def to_goal(self, goal: int):
+        #ham h(i) -> chan duoi cua haversine(i, goal) theo index, toa do goal duoc giu trong closure
+        xs, ys, zs = self.x, self.y, self.z
+        gx, gy, gz = xs[goal], ys[goal], zs[goal]
+        sqrt = math.sqrt
+
+        def h(i: int) -> float:
+            dx = xs[i] - gx
+            dy = ys[i] - gy
+            dz = zs[i] - gz
+            return R_EARTH * sqrt(dx * dx + dy * dy + dz * dz)
+        return h
+
+    def to_goal_id(self, goal: Any):
+        #giong to_goal nhung nhan OSM id (dung cho graph dang dict)
+        h = self.to_goal(self.index[goal])
+        index = self.index
+        return lambda node: h(index[node])
+
+    def __call__(self, node: Any, goal: Any) -> float:
+        #dung duoc nhu heuristic(node, goal) cua astar (theo OSM id)
+        return self.distance(self.index[node], self.index[goal])
+
+    def heuristic_many(self, target: int, ids: Sequence[int]):
+        #to_goal(target) cho ca lo index ids 1 lan: numpy.ndarray neu co numpy, nguoc lai array('d')
+        # (cung gia tri voi h(i) tung node: R * do dai day cung)
+        xs, ys, zs = self.x, self.y, self.z
+        gx, gy, gz = xs[target], ys[target], zs[target]
+        if np is not None:
+            idx = np.asarray(ids, dtype=np.intp)
+            dx = np.frombuffer(xs, dtype=np.float64)[idx] - gx
+            dy = np.frombuffer(ys, dtype=np.float64)[idx] - gy
+            dz = np.frombuffer(zs, dtype=np.float64)[idx] - gz
+            return R_EARTH * np.sqrt(dx * dx + dy * dy + dz * dz)
+        h = self.to_goal(target)
+        return array("d", map(h, ids))
+
+
+# nodes -> (so node, table)
+_GEO_CACHE = GraphCache()
+
+
+def get_geo_table(nodes) -> GeoTable:
+    #GeoTable cho 1 dict nodes hoac 1 CSRGraph (cung index voi graph), cache theo object
+    # toa do node khong doi khi status canh doi nen chi can so sanh so node
+    cached = _GEO_CACHE.get(nodes)
+    if cached is not None and cached[0] == len(nodes):
+        return cached[1]
+    if isinstance(nodes, CSRGraph):
+        table = GeoTable(nodes.ids, nodes.lat, nodes.lon, nodes.index)
+    else:
+        table = GeoTable.from_nodes(nodes)
+    _GEO_CACHE.set(nodes, (len(nodes), table))
+    return table
@@ -0,0 +1,330 @@
+import heapq
+import os
+import random
+import sqlite3
+import sys
+import threading
+from array import array
+from typing import Dict, List, Tuple, Any, Optional
+
+from utils.csr_graph import CSRGraph
+from utils.map_handler import reverse_graph
+from utils.graph_cache import GraphCache
+from .ch import graph_fingerprint
+
+INF = float("inf")
+
+# so landmark mac dinh
+NUM_LANDMARKS = 16
+
+
+def _one_to_all(graph: Dict[Any, List[Tuple[Any, float]]], source: Any) -> Dict[Any, float]:
+#Dijkstra tu source toi tat ca node, tra ve {node: dist} (chi node den duoc)
+    dist = {source: 0.0}
+    pq = [(0.0, source)]
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        for v, w in graph[u]:
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return dist
+
+
+class LandmarkTable:
+    """
+    Bang khoang cach cho heuristic ALT (A*, Landmarks, Triangle inequality):
+    - forward[i][k]  = d(landmark i -> node k)
+    - backward[i][k] = d(node k -> landmark i)
+    Chan duoi cua d(v, t): max_i max(forward[i][t] - forward[i][v], backward[i][v] - backward[i][t])
+    """
+
+    def __init__(self, ids: List[Any], landmarks: List[Any],
+                 forward: List[array], backward: List[array], fingerprint: str = ""):
+        self.ids = ids
+        self.index: Dict[Any, int] = {nid: k for k, nid in enumerate(ids)}
+        self.landmarks = landmarks
+        self.forward = forward
+        self.backward = backward
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, graph: Dict[Any, List[Tuple[Any, float]]], landmarks: List[Any]) -> "LandmarkTable":
+        ids = list(graph)
+        rev = reverse_graph(graph)
+        forward, backward = [], []
+        for lm in landmarks:
+            forward.append(_dist_array(ids, _one_to_all(graph, lm)))
+            backward.append(_dist_array(ids, _one_to_all(rev, lm)))
+        return cls(ids, list(landmarks), forward, backward, graph_fingerprint(graph))
+
+    def to_goal_id(self, goal: Any):
+        #h(node) = chan duoi cua d(node, goal); gia tri cua goal tinh 1 lan va chi song trong closure
+        # -> 1 bang dung chung duoc giua cac query / thread
+        t = self.index[goal]
+        terms = [(f, f[t], b, b[t]) for f, b in zip(self.forward, self.backward)]
+        index = self.index
+
+        def h(node: Any) -> float:
+            k = index[node]
+            best = 0.0
+            for f, f_t, b, b_t in terms:
+                f_v = f[k]
+                if f_v != INF:
+                    d = f_t - f_v
+                    if d > best:
+                        best = d
+                b_v = b[k]
+                if b_t != INF:
+                    d = b_v - b_t
+                    if d > best:
+                        best = d
+            return best
+
+        return h
+
+    def heuristic(self, node: Any, goal: Any) -> float:
+        return self.to_goal_id(goal)(node)
+
+    __call__ = heuristic
+
+    # ---------------- Luu / doc ----------------
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with sqlite3.connect(tmp_path) as conn:
+            c = conn.cursor()
+            c.execute("CREATE TABLE alt_meta (key TEXT PRIMARY KEY, value TEXT)")
+            c.execute("CREATE TABLE alt_nodes (pos INTEGER PRIMARY KEY, node_id INTEGER)")
+            c.execute('''
+                CREATE TABLE alt_landmarks(
+                    pos INTEGER PRIMARY KEY,
+                    node_id INTEGER,
+                    forward BLOB,
+                    backward BLOB
+                )
+            ''')
+            c.execute("INSERT INTO alt_meta VALUES ('fingerprint', ?)", (self.fingerprint,))
+            c.executemany("INSERT INTO alt_nodes VALUES (?, ?)", enumerate(self.ids))
+            c.executemany(
+                "INSERT INTO alt_landmarks VALUES (?, ?, ?, ?)",
+                ((i, lm, self.forward[i].tobytes(), self.backward[i].tobytes())
+                 for i, lm in enumerate(self.landmarks))
+            )
+            conn.commit()
+        conn.close()
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LandmarkTable"]:
+        if not os.path.exists(path):
+            return None
+        with sqlite3.connect(path) as conn:
+            c = conn.cursor()
+            row = c.execute("SELECT value FROM alt_meta WHERE key = 'fingerprint'").fetchone()
+            ids = [r[0] for r in c.execute("SELECT node_id FROM alt_nodes ORDER BY pos")]
+            rows = c.execute("SELECT node_id, forward, backward FROM alt_landmarks ORDER BY pos").fetchall()
+        conn.close()
+        landmarks, forward, backward = [], [], []
+        for lm, f, b in rows:
+            landmarks.append(lm)
+            forward.append(array("d", f))
+            backward.append(array("d", b))
+        return cls(ids, landmarks, forward, backward, row[0] if row else "")
+
+
+def _dist_array(ids: List[Any], dist: Dict[Any, float]) -> array:
+    return array("d", (dist.get(nid, INF) for nid in ids))
+
+
+# ---------------- Chon landmark ----------------
+def select_farthest(graph: Dict[Any, List[Tuple[Any, float]]], k: int = NUM_LANDMARKS,
+                    seed: int = 0) -> List[Any]:
+#farthest: landmark tiep theo la node xa nhat (theo min khoang cach) toi cac landmark da chon
+    if not graph:
+        return []
+    rng = random.Random(seed)
+    nodes = list(graph)
+    start = rng.choice(nodes)
+    # node xa nhat tu 1 node ngau nhien lam landmark dau tien
+    dist = _one_to_all(graph, start)
+    landmarks = [max(dist, key=dist.get)]
+    min_dist = dict(_one_to_all(graph, landmarks[0]))
+    while len(landmarks) < min(k, len(nodes)):
+        candidate = max((n for n in min_dist if n not in landmarks), key=min_dist.get, default=None)
+        if candidate is None:
+            break
+        landmarks.append(candidate)
+        for n, d in _one_to_all(graph, candidate).items():
+            if d < min_dist.get(n, INF):
+                min_dist[n] = d
+    return landmarks
+
+
+def select_avoid(graph: Dict[Any, List[Tuple[Any, float]]], k: int = NUM_LANDMARKS,
+                 seed: int = 0) -> List[Any]:
+#avoid (Goldberg & Harrelson): uu tien vung ma cac landmark hien tai cho chan duoi kem
+    if not graph:
+        return []
+    rng = random.Random(seed)
+    nodes = list(graph)
+    rev = reverse_graph(graph)
+    landmarks = select_farthest(graph, 1, seed)
+    tables = [(_one_to_all(graph, landmarks[0]), _one_to_all(rev, landmarks[0]))]
+
+    while len(landmarks) < min(k, len(nodes)):
+        root = rng.choice(nodes)
+        # cay duong di ngan nhat tu root
+        dist = {root: 0.0}
+        parent = {root: None}
+        order = []
+        pq = [(0.0, root)]
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            order.append(u)
+            for v, w in graph[u]:
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(pq, (nd, v))
+
+        # weight(v) = d(root, v) - chan duoi hien tai; size = tong weight cua cay con (0 neu chua landmark)
+        size = {}
+        for v in order:
+            lb = 0.0
+            for fwd, bwd in tables:
+                if v in fwd and root in fwd:
+                    lb = max(lb, fwd[v] - fwd[root])
+                if root in bwd and v in bwd:
+                    lb = max(lb, bwd[root] - bwd[v])
+            size[v] = dist[v] - lb
+        has_landmark = set()
+        for v in reversed(order):
+            p = parent[v]
+            if v in landmarks or v in has_landmark:
+                size[v] = 0.0
+                if p is not None:
+                    has_landmark.add(p)
+            if p is not None:
+                size[p] += size[v]
+
+        # di tu node co size lon nhat xuong la theo con co size lon nhat
+        children: Dict[Any, List[Any]] = {}
+        for v in order:
+            if parent[v] is not None:
+                children.setdefault(parent[v], []).append(v)
+        node = max(order, key=size.get)
+        if size[node] <= 0:
+            break
+        while children.get(node):
+            node = max(children[node], key=size.get)
+        if node in landmarks:
+            break
+        landmarks.append(node)
+        tables.append((_one_to_all(graph, node), _one_to_all(rev, node)))
+    return landmarks
+
+
+SELECTORS = {
+    "farthest": select_farthest,
+    "avoid": select_avoid,
+}
+
+
+# ---------------- Dung trong registry ----------------
+def alt_path(db_path: str) -> str:
+    #file landmark dat canh DB: map_data.db -> map_data.alt.db
+    return os.path.splitext(db_path)[0] + ".alt.db"
+
+
+def _default_alt_path(graph) -> Optional[str]:
+    #giong ch._default_ch_path: theo graph.db_path, None (chi tinh trong RAM) neu graph khong tu DB
+    db_path = getattr(graph, "db_path", None)
+    return alt_path(db_path) if db_path else None
+
+
+# graph -> (version, table)
+_ALT_CACHE = GraphCache()
+# graph -> version dang tinh lai bang khoang cach o thread nen
+_ALT_BUILDING = GraphCache()
+_ALT_LOCK = threading.Lock()
+
+
+def get_landmarks(graph: Dict[Any, List[Tuple[Any, float]]], path: Optional[str] = None,
+                  strategy: str = "avoid", k: int = NUM_LANDMARKS,
+                  background: bool = True) -> Optional[LandmarkTable]:
+#lay bang landmark cho graph: uu tien file da tinh san, neu khong khop thi tinh lai va luu
+# graph doi version (LiveGraph doi status): giu nguyen cac landmark da chon, chi tinh lai bang
+# khoang cach o thread nen; tra ve None cho toi khi xong (bang cu co the khong con la chan duoi
+# neu co canh re di, nguoi goi dung heuristic haversine)
+    version = getattr(graph, "version", 0)
+    cached = _ALT_CACHE.get(graph)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if cached is not None and background:
+        _refresh_async(graph, version, cached[1].landmarks)
+        return None
+    path = path or _default_alt_path(graph)
+    adjacency = graph.to_adjacency() if isinstance(graph, CSRGraph) else graph
+    table = LandmarkTable.load(path) if path else None
+    if table is None or table.fingerprint != graph_fingerprint(adjacency):
+        table = LandmarkTable.build(adjacency, SELECTORS[strategy](adjacency, k))
+        if path:
+            table.save(path)
+    _ALT_CACHE.set(graph, (version, table))
+    return table
+
+
+def _refresh_async(graph, version: int, landmarks: List[Any]) -> None:
+    with _ALT_LOCK:
+        if _ALT_BUILDING.get(graph) == version:
+            return
+        _ALT_BUILDING.set(graph, version)
+    # chup adjacency o thread goi: LiveGraph sua list canh tai cho khi doi status
+    snapshot = {u: list(adj) for u, adj in graph.items()}
+
+    def run():
+        table = LandmarkTable.build(snapshot, [lm for lm in landmarks if lm in snapshot])
+        with _ALT_LOCK:
+            cached = _ALT_CACHE.get(graph)
+            if cached is None or cached[0] < version:
+                _ALT_CACHE.set(graph, (version, table))
+
+    threading.Thread(target=run, name="alt-refresh", daemon=True).start()
+
+
+def alt_astar(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    nodes: Dict[Any, Tuple[float, float]],
+    start: Any,
+    goal: Any,
+    stats=None,
+    should_stop=None
+):
+    from .astar import astar
+    # None: bang dang tinh lai -> A* voi heuristic haversine mac dinh
+    return astar(graph, nodes, start, goal, heuristic=get_landmarks(graph), stats=stats,
+                 should_stop=should_stop)
+
+
+def preprocess(db_path: Optional[str] = None, strategy: str = "avoid",
+               k: int = NUM_LANDMARKS) -> LandmarkTable:
+#buoc offline: chon landmark, tinh bang khoang cach 2 chieu va luu canh map_data.db
+    from utils.map_handler import DB_PATH, load_graph_from_db
+    db_path = db_path or DB_PATH
+    graph, _ = load_graph_from_db(db_path)
+    table = LandmarkTable.build(graph, SELECTORS[strategy](graph, k))
+    table.save(alt_path(db_path))
+    return table
+
+
+if __name__ == "__main__":
+    table = preprocess(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Landmarks: {table.landmarks}")
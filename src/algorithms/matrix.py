@@ -0,0 +1,104 @@
+import heapq
+from array import array
+from typing import Dict, List, Tuple, Any, Sequence
+
+from utils.map_handler import get_adjacency_views
+from .ch import get_ch
+
+INF = float("inf")
+
+
+def one_to_many(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    source: Any,
+    targets: Sequence[Any]
+) -> array:
+#1 lan Dijkstra tu source, dung khi da settle het targets; tra ve array('d') theo thu tu targets
+    forward, _ = get_adjacency_views(graph)
+    result = array("d", [INF]) * len(targets)
+    if source not in forward:
+        return result
+
+    # 1 node co the xuat hien nhieu lan trong targets
+    wanted: Dict[Any, List[int]] = {}
+    for j, t in enumerate(targets):
+        if t in forward:
+            wanted.setdefault(t, []).append(j)
+    remaining = len(wanted)
+
+    dist = {source: 0.0}
+    pq = [(0.0, source)]
+    while pq and remaining:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        cols = wanted.get(u)
+        if cols is not None:
+            for j in cols:
+                result[j] = d
+            remaining -= 1
+        for v, w in forward[u]:
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return result
+
+
+def _upward_search(adj: Dict[Any, List[Tuple[Any, float]]], source: Any) -> Dict[Any, float]:
+#Dijkstra day du tren do thi "di len" cua CH (khong gian tim kiem nho)
+    dist = {source: 0.0}
+    pq = [(0.0, source)]
+    while pq:
+        d, u = heapq.heappop(pq)
+        if d > dist[u]:
+            continue
+        for v, w in adj.get(u, ()):
+            nd = d + w
+            if nd < dist.get(v, INF):
+                dist[v] = nd
+                heapq.heappush(pq, (nd, v))
+    return dist
+
+
+def _bucket_many_to_many(graph, sources, targets) -> List[array]:
+#bucket many-to-many tren Contraction Hierarchies:
+# - search nguoc (di len) tu moi target, ghi (j, d) vao bucket cua moi node cham toi
+# - search xuoi (di len) tu moi source, quet bucket de cap nhat hang i cua ma tran
+    ch = get_ch(graph)
+    if ch is None:
+        # CH dang build lai (graph vua doi): tinh bang Dijkstra
+        return [one_to_many(graph, s, targets) for s in sources]
+    buckets: Dict[Any, List[Tuple[int, float]]] = {}
+    for j, t in enumerate(targets):
+        if t not in ch.rank:
+            continue
+        for v, d in _upward_search(ch.down, t).items():
+            buckets.setdefault(v, []).append((j, d))
+
+    rows = []
+    for s in sources:
+        row = array("d", [INF]) * len(targets)
+        if s in ch.rank:
+            for v, d in _upward_search(ch.up, s).items():
+                for j, d_t in buckets.get(v, ()):
+                    if d + d_t < row[j]:
+                        row[j] = d + d_t
+        rows.append(row)
+    return rows
+
+
+def many_to_many(
+    graph: Dict[Any, List[Tuple[Any, float]]],
+    sources: Sequence[Any],
+    targets: Sequence[Any],
+    mode: str = "dijkstra"
+) -> List[array]:
+#ma tran khoang cach |sources| x |targets|: matrix[i][j] = d(sources[i], targets[j]) (INF neu khong toi duoc)
+# mode="dijkstra": 1 lan one_to_many cho moi source
+# mode="buckets": bucket many-to-many tren CH (can tien xu ly CH, nhanh hon nhieu voi ma tran lon)
+    if mode == "buckets":
+        return _bucket_many_to_many(graph, sources, targets)
+    if mode != "dijkstra":
+        raise ValueError(f"Unknown matrix mode: {mode}")
+    return [one_to_many(graph, s, targets) for s in sources]
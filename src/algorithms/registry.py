@@ -1,13 +1,43 @@
 from algorithms.astar import astar
 from algorithms.dijkstra import dijkstra
+from algorithms.ch import ch_query
+from algorithms.landmarks import alt_astar
+from algorithms.bidirectional import bidirectional_dijkstra, bidirectional_astar
+from algorithms.alternatives import alternatives_query, alternative_routes
 
+# moi func co dang func(graph, nodes, start, goal, stats=None, should_stop=None) -> (path, dist)
+# ((None, inf) neu khong co duong), stats la algorithms.stats.SearchStats,
+# should_stop() -> True thi func raise algorithms.cancel.SearchCancelled
+# "alternatives" (tuy chon): func(graph, nodes, start, goal, stats=None, should_stop=None) -> [(path, cost), ...]
+# de ve them tuyen thay the
 ALGORITHMS = {
     "astar": {
-        "func": astar,
-        "returns_distance": False
+        "label": "A*",
+        "func": astar
     },
     "dijkstra": {
-        "func": dijkstra,
-        "returns_distance": True
+        "label": "Dijkstra",
+        "func": dijkstra
+    },
+    "bidijkstra": {
+        "label": "Bidirectional Dijkstra",
+        "func": bidirectional_dijkstra
+    },
+    "biastar": {
+        "label": "Bidirectional A*",
+        "func": bidirectional_astar
+    },
+    "alt": {
+        "label": "A* (ALT landmarks)",
+        "func": alt_astar
+    },
+    "ch": {
+        "label": "Contraction Hierarchies",
+        "func": ch_query
+    },
+    "alternatives": {
+        "label": "Alternative routes",
+        "func": alternatives_query,
+        "alternatives": alternative_routes
     }
 }
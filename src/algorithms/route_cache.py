@@ -0,0 +1,195 @@
+import heapq
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Optional, Set
+
+from algorithms.cancel import STOP_MASK, SearchCancelled
+from algorithms.registry import ALGORITHMS
+from utils.map_handler import get_adjacency_views
+
+INF = float("inf")
+
+
+def _path_pairs(path: Optional[List[Any]]) -> Set[Tuple[Any, Any]]:
+    #cac cap node (u <= v) ma path di qua, de so voi cac cap bi doi status
+    if not path:
+        return set()
+    return {(u, v) if u <= v else (v, u) for u, v in zip(path, path[1:])}
+
+
+class RouteCache:
+    """
+    Cache LRU dat truoc cac thuat toan trong registry.
+    - key: (algorithm, start, goal, graph version)
+    - khi 1 start duoc hoi voi >= tree_after goal khac nhau: tinh 1 cay duong di ngan nhat
+      tu start va tra loi cac goal sau tu cay do
+    - thuat toan co "alternatives" (registry): 1 lan goi tra ve ca tuyen chinh va tuyen thay the,
+      cache ca danh sach tuyen (khong dung cay)
+    - khi graph (LiveGraph) doi: chi xoa entry co path di qua cap node bi doi,
+      cac entry con lai duoc chuyen sang version moi (neu co cung re hon truoc thi xoa het)
+    - should_stop (tuy chon) duoc truyen xuong thuat toan / cay; search bi huy (SearchCancelled)
+      thi khong co gi duoc cache
+    """
+
+    def __init__(self, graph, nodes, max_entries: int = 1024, max_trees: int = 16, tree_after: int = 2):
+        self.graph = graph
+        self.nodes = nodes
+        self.max_entries = max_entries
+        self.max_trees = max_trees
+        self.tree_after = tree_after
+        self.version = getattr(graph, "version", 0)
+
+        # key -> (path, dist, pairs, routes)
+        self._entries: "OrderedDict[Tuple[str, Any, Any, int], Tuple[Any, float, Set, Any]]" = OrderedDict()
+        # start -> (dist, parent, pairs cua cay)
+        self._trees: "OrderedDict[Any, Tuple[Dict, Dict, Set]]" = OrderedDict()
+        # start -> cac goal da hoi (LRU, toi da max_entries start)
+        self._goals_per_start: "OrderedDict[Any, Set[Any]]" = OrderedDict()
+
+        self.hits = 0
+        self.tree_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+        if hasattr(graph, "subscribe"):
+            graph.subscribe(self.on_graph_change)
+
+    # ---------------- Query ----------------
+    def query(self, algorithm: str, start: Any, goal: Any, stats=None,
+              should_stop=None) -> Tuple[Optional[List[Any]], float]:
+        #tra ve (path, dist) giong dijkstra
+        #stats: SearchStats, chi duoc dien khi thuat toan that su chay (cache hit thi giu nguyen)
+        path, dist, _ = self.query_routes(algorithm, start, goal, stats, should_stop)
+        return path, dist
+
+    def query_routes(self, algorithm: str, start: Any, goal: Any, stats=None, should_stop=None):
+        #giong query, them routes = [(path, cost), ...] (routes[0] la tuyen chinh) cho thuat toan
+        # co "alternatives" trong registry, None voi thuat toan khac
+        key = (algorithm, start, goal, self.version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1], entry[3]
+
+        alternatives = ALGORITHMS[algorithm].get("alternatives")
+        if alternatives is not None:
+            self.misses += 1
+            routes = alternatives(self.graph, self.nodes, start, goal, stats=stats, should_stop=should_stop)
+            path, dist = routes[0] if routes else (None, INF)
+            self._store(key, path, dist, routes)
+            return path, dist, routes
+
+        tree = self._trees.get(start)
+        if tree is not None:
+            self._trees.move_to_end(start)
+            self.tree_hits += 1
+            path, dist = self._path_from_tree(tree, start, goal)
+            self._store(key, path, dist)
+            return path, dist, None
+
+        self.misses += 1
+        goals = self._goals_per_start.get(start)
+        if goals is None:
+            goals = self._goals_per_start[start] = set()
+            if len(self._goals_per_start) > self.max_entries:
+                self._goals_per_start.popitem(last=False)
+        else:
+            self._goals_per_start.move_to_end(start)
+        goals.add(goal)
+        if len(goals) >= self.tree_after:
+            # start nay dang duoc hoi nhieu goal -> tinh ca cay 1 lan
+            tree = self._build_tree(start, should_stop)
+            self._trees[start] = tree
+            if len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+            path, dist = self._path_from_tree(tree, start, goal)
+        else:
+            path, dist = ALGORITHMS[algorithm]["func"](self.graph, self.nodes, start, goal,
+                                                       stats=stats, should_stop=should_stop)
+        self._store(key, path, dist)
+        return path, dist, None
+
+    def _store(self, key, path, dist, routes=None) -> None:
+        #pairs cua moi tuyen: doi status tren tuyen thay the cung lam entry het han
+        pairs = _path_pairs(path)
+        for alt, _ in routes or ():
+            pairs |= _path_pairs(alt)
+        self._entries[key] = (path, dist, pairs, routes)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _build_tree(self, start: Any, should_stop=None) -> Tuple[Dict, Dict, Set]:
+        #Dijkstra day du tu start: cay duong di ngan nhat
+        dist = {start: 0.0}
+        parent = {start: None}
+        pq = [(0.0, start)]
+        graph, _ = get_adjacency_views(self.graph)
+        pops = 0
+        while pq:
+            d, u = heapq.heappop(pq)
+            pops += 1
+            if should_stop is not None and not pops & STOP_MASK and should_stop():
+                raise SearchCancelled()
+            if d > dist[u]:
+                continue
+            for v, w in graph[u]:
+                nd = d + w
+                if nd < dist.get(v, INF):
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(pq, (nd, v))
+        pairs = {(p, v) if p <= v else (v, p) for v, p in parent.items() if p is not None}
+        return dist, parent, pairs
+
+    @staticmethod
+    def _path_from_tree(tree, start, goal):
+        dist, parent, _ = tree
+        if goal not in dist:
+            return None, INF
+        path = []
+        node = goal
+        while node is not None:
+            path.append(node)
+            node = parent[node]
+        path.reverse()
+        return path, dist[goal]
+
+    # ---------------- Invalidation ----------------
+    def on_graph_change(self, changed_pairs, decreased: bool, version: int) -> None:
+        #goi tu LiveGraph.subscribe sau moi lan doi status
+        if decreased:
+            # co cung re hon: duong di cu nao cung co the khong con ngan nhat
+            self.invalidated += len(self._entries)
+            self._entries.clear()
+            self._trees.clear()
+        else:
+            changed = set(changed_pairs)
+            kept = OrderedDict()
+            for (algo, start, goal, _), value in self._entries.items():
+                if value[2] & changed:
+                    self.invalidated += 1
+                else:
+                    kept[(algo, start, goal, version)] = value
+            self._entries = kept
+            for start in [s for s, tree in self._trees.items() if tree[2] & changed]:
+                del self._trees[start]
+        self._goals_per_start.clear()
+        self.version = version
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._trees.clear()
+        self._goals_per_start.clear()
+
+    # ---------------- Metrics ----------------
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.tree_hits + self.misses
+        return {
+            "hits": self.hits,
+            "tree_hits": self.tree_hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "entries": len(self._entries),
+            "trees": len(self._trees),
+            "hit_rate": (self.hits + self.tree_hits) / total if total else 0.0,
+        }
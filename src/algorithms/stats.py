@@ -0,0 +1,40 @@
+from typing import Dict
+
+
+class SearchStats:
+    """
+    Bo dem cho 1 lan search, truyen vao thuat toan qua tham so stats=...
+    - settled: so node duoc lay ra khoi hang doi va mo rong
+    - stale:   so phan tu cu (da co duong tot hon) bi bo qua khi pop
+    - pushes:  so lan heappush
+    - relaxed: so canh duoc duyet (moi canh ra cua node duoc mo rong, ke ca canh khong cai thien)
+    - improved: so canh lam giam khoang cach tam thoi cua node dich
+    Thuat toan chi cap nhat bo dem 1 lan khi search xong (dem bang bien cuc bo trong vong lap),
+    nen khi stats=None thi gan nhu khong ton chi phi. Goi nhieu lan voi cung 1 object se cong don.
+    """
+    __slots__ = ("settled", "stale", "pushes", "relaxed", "improved")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.settled = 0
+        self.stale = 0
+        self.pushes = 0
+        self.relaxed = 0
+        self.improved = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def record_search(stats, pops: int, stale: int, remaining: int, scanned: int) -> None:
+    #cong bo dem cua 1 search 1 chieu (dijkstra, astar) vao stats
+    # moi lan push deu da bi pop hoac con nam trong hang doi -> pushes = pops + remaining
+    # moi canh cai thien push 1 lan, tru lan push start ban dau
+    # scanned cong theo bac cua node duoc mo rong (1 phep cong / node, khong phai / canh)
+    stats.settled += pops - stale
+    stats.stale += stale
+    stats.pushes += pops + remaining
+    stats.relaxed += scanned
+    stats.improved += pops + remaining - 1
@@ -0,0 +1,164 @@
+import heapq
+import math
+from typing import Dict, List, Tuple, Any, Optional, Sequence
+
+from utils.map_handler import DB_PATH, get_all_nodes, get_all_edges, get_repository, iter_weighted_edges
+from .heuristic import get_geo_table
+
+INF = float("inf")
+DAY = 24 * 3600.0
+# so khung gio trong 1 ngay (15 phut / khung)
+NUM_BUCKETS = 96
+BUCKET_SECONDS = DAY / NUM_BUCKETS
+# toc do luu thong tu do (m/s): thoi gian co ban cua canh = trong so (met) / toc do
+DEFAULT_SPEED = 30 / 3.6
+
+
+class TimeDependentGraph:
+    """
+    Graph voi thoi gian di chuyen phu thuoc gio xuat phat:
+    - adj[u] = [(v, base_time, profile), ...], base_time = trong so tinh (da nhan traffic / flood) / speed
+    - profile = -1: thoi gian co dinh; nguoc lai travel_time = base_time * f(t), f noi suy tuyen tinh
+      giua cac gia tri dau khung gio (NUM_BUCKETS gia tri, quay vong qua 0h)
+    - cac profile duoc dung chung giua cac canh -> moi canh chi ton 1 so nguyen
+    Profile can thay doi cham (do doc cua base_time * f nho hon 1) de giu tinh FIFO:
+    xuat phat muon hon khong bao gio toi som hon.
+    """
+
+    def __init__(self,
+                 nodes: Dict[int, Tuple[float, float]],
+                 edges: List[Dict[str, Any]],
+                 profiles: Dict[int, Sequence[float]],
+                 edge_profile: Dict[int, int],
+                 speed: float = DEFAULT_SPEED):
+        self.nodes = nodes
+        self.speed = speed
+
+        # profile id trong DB -> index trong values / slopes
+        slot: Dict[int, int] = {}
+        self.values: List[List[float]] = []
+        self.slopes: List[List[float]] = []
+        for pid, factors in profiles.items():
+            if len(factors) != NUM_BUCKETS:
+                raise ValueError(f"Profile {pid} has {len(factors)} buckets, expected {NUM_BUCKETS}")
+            vals = [float(f) for f in factors]
+            vals.append(vals[0])
+            slot[pid] = len(self.values)
+            self.values.append(vals)
+            self.slopes.append([vals[b + 1] - vals[b] for b in range(NUM_BUCKETS)] + [0.0])
+
+        self.adj: Dict[int, List[Tuple[int, float, int]]] = {node_id: [] for node_id in nodes}
+        for e, u, v, w in iter_weighted_edges(edges):
+            if u in self.adj and v in self.adj:
+                pid = edge_profile.get(e["edge_id"])
+                self.adj[u].append((v, w / speed, slot.get(pid, -1)))
+
+        # he so nho nhat -> heuristic A* van la chan duoi khi co khung gio nhanh hon binh thuong
+        self.min_factor = min([1.0] + [min(vals) for vals in self.values])
+
+    @classmethod
+    def from_db(cls, db_path: str = DB_PATH, speed: float = DEFAULT_SPEED) -> "TimeDependentGraph":
+        repo = get_repository(db_path)
+        profiles = {pid: factors for pid, (_, factors) in repo.speed_profiles().items()}
+        return cls(get_all_nodes(db_path), get_all_edges(db_path), profiles, repo.edge_profiles(), speed)
+
+    def __contains__(self, node_id: Any) -> bool:
+        return node_id in self.adj
+
+    def travel_time(self, base_time: float, profile: int, t: float) -> float:
+        #thoi gian di het canh neu vao canh luc t (giay tinh tu 0h)
+        if profile < 0:
+            return base_time
+        x = (t % DAY) / BUCKET_SECONDS
+        b = int(x)
+        return base_time * (self.values[profile][b] + self.slopes[profile][b] * (x - b))
+
+
+def rush_hour_factors(peak: float = 2.0, morning: float = 8.0, evening: float = 17.5,
+                      width: float = 1.5) -> List[float]:
+    #profile mau: cham nhat (x peak) quanh 2 gio cao diem, 1.0 luc vang xe
+    factors = []
+    for b in range(NUM_BUCKETS):
+        hour = b * BUCKET_SECONDS / 3600.0
+        bump = max(math.exp(-((hour - morning) / width) ** 2), math.exp(-((hour - evening) / width) ** 2))
+        factors.append(1.0 + (peak - 1.0) * bump)
+    return factors
+
+
+def seconds_of_day(when) -> float:
+    #nhan datetime / time hoac so giay, tra ve so giay tinh tu 0h
+    if isinstance(when, (int, float)):
+        return float(when)
+    return when.hour * 3600.0 + when.minute * 60.0 + when.second + when.microsecond / 1e6
+
+
+def td_dijkstra(graph: TimeDependentGraph, start: Any, goal: Any, depart, stats=None):
+    #tra ve (path, thoi gian di chuyen tinh bang giay) khi xuat phat luc depart
+    return _td_search(graph, start, goal, seconds_of_day(depart), None, stats)
+
+
+def td_astar(graph: TimeDependentGraph, start: Any, goal: Any, depart, stats=None):
+    #A* phu thuoc thoi gian: h = haversine * min_factor / speed (khong bao gio vuot thoi gian that)
+    if goal not in graph:
+        return None, INF
+    to_goal = get_geo_table(graph.nodes).to_goal_id(goal)
+    scale = graph.min_factor / graph.speed
+    return _td_search(graph, start, goal, seconds_of_day(depart), lambda v: to_goal(v) * scale, stats)
+
+
+def _td_search(graph: TimeDependentGraph, start, goal, depart: float, h_of=None, stats=None):
+    #nhan cua node = thoi diem toi som nhat; khung gio chi tinh 1 lan cho moi node duoc settle
+    adj = graph.adj
+    if start not in adj or goal not in adj:
+        return None, INF
+    values, slopes = graph.values, graph.slopes
+    arrival = {start: depart}
+    parent = {start: None}
+    h_cache = {}
+    pq = [(0.0, depart, start)]
+    pops = stale = scanned = 0
+    while pq:
+        _, t, u = heapq.heappop(pq)
+        pops += 1
+        if t > arrival[u]:
+            stale += 1
+            continue
+        if u == goal:
+            break
+
+        x = (t % DAY) / BUCKET_SECONDS
+        b = int(x)
+        frac = x - b
+        arcs = adj[u]
+        scanned += len(arcs)
+        for v, base, p in arcs:
+            if p < 0:
+                nt = t + base
+            else:
+                nt = t + base * (values[p][b] + slopes[p][b] * frac)
+            if nt < arrival.get(v, INF):
+                arrival[v] = nt
+                parent[v] = u
+                if h_of is None:
+                    key = nt
+                else:
+                    h = h_cache.get(v)
+                    if h is None:
+                        h = h_cache[v] = h_of(v)
+                    key = nt + h
+                heapq.heappush(pq, (key, nt, v))
+    if stats is not None:
+        stats.settled += pops - stale
+        stats.stale += stale
+        stats.pushes += pops + len(pq)
+        stats.relaxed += scanned
+        stats.improved += pops + len(pq) - 1
+    if goal not in parent:
+        return None, INF
+    path = []
+    node = goal
+    while node is not None:
+        path.append(node)
+        node = parent[node]
+    path.reverse()
+    return path, arrival[goal] - depart
@@ -0,0 +1,164 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Tuple, Any
+
+
+class CoordView:
+    # cho phep dung coords[i] -> (lat, lon) giong dict nodes, de tai su dung heuristic.haversine
+    __slots__ = ("lat", "lon")
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+    def __getitem__(self, i: int) -> Tuple[float, float]:
+        return self.lat[i], self.lon[i]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+
+class IdCoordView:
+    # nodes[OSM id] -> (lat, lon), dung thay cho dict nodes khi chi co CSRGraph
+    __slots__ = ("_graph",)
+
+    def __init__(self, graph: "CSRGraph"):
+        self._graph = graph
+
+    def __getitem__(self, node_id: Any) -> Tuple[float, float]:
+        return self._graph.node_coords(node_id)
+
+    def __contains__(self, node_id: Any) -> bool:
+        return node_id in self._graph.index
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._graph.ids)
+
+    def __len__(self) -> int:
+        return len(self._graph.ids)
+
+
+class SortedIdIndex:
+    # index[OSM id] -> i bang bisect tren mang ids da sap xep (vd memoryview cua snapshot mmap):
+    # khong tao dict N phan tu khi load, moi lan tra O(log N)
+    __slots__ = ("ids",)
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def get(self, node_id: Any, default: Any = None) -> Any:
+        ids = self.ids
+        i = bisect_left(ids, node_id)
+        if i < len(ids) and ids[i] == node_id:
+            return i
+        return default
+
+    def __getitem__(self, node_id: Any) -> int:
+        i = self.get(node_id)
+        if i is None:
+            raise KeyError(node_id)
+        return i
+
+    def __contains__(self, node_id: Any) -> bool:
+        return self.get(node_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class CSRGraph:
+    """
+    Do thi dang CSR (compressed sparse row):
+    - node id OSM duoc danh lai thanh chi so 0..N-1 theo thu tu tang dan
+      (ids[i] = OSM id, index[OSM id] = i tra bang bisect, xem SortedIdIndex)
+    - canh ra cua node i nam trong targets/weights[offsets[i] : offsets[i+1]]
+    - toa do luu trong 2 mang lat, lon (coords[index], nodes[OSM id] -> (lat, lon))
+    """
+
+    def __init__(self, ids, offsets, targets, weights, lat, lon):
+        self.ids = ids            # array('q'): index -> OSM id
+        self.offsets = offsets    # array('q'): do dai N + 1
+        self.targets = targets    # array('i'): index node dich
+        self.weights = weights    # array('d'): trong so canh
+        self.lat = lat            # array('d')
+        self.lon = lon            # array('d')
+        self.index = SortedIdIndex(ids)
+        self.coords = CoordView(lat, lon)
+        self.nodes = IdCoordView(self)
+        # DB ma graph duoc load tu do (load_csr_graph_from_db), None neu build tu du lieu khac
+        self.db_path = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, node_id: Any) -> bool:
+        return node_id in self.index
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.targets)
+
+    def neighbors(self, i: int) -> Iterator[Tuple[int, float]]:
+        #tra ve (index hang xom, trong so) cua node index i
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return zip(self.targets[a:b], self.weights[a:b])
+
+    def node_coords(self, node_id: Any) -> Tuple[float, float]:
+        i = self.index[node_id]
+        return self.lat[i], self.lon[i]
+
+    def path_ids(self, path: List[int]) -> List[Any]:
+        #doi path theo index ve path theo OSM id
+        ids = self.ids
+        return [ids[i] for i in path]
+
+    def to_adjacency(self) -> Dict[Any, List[Tuple[Any, float]]]:
+        #doi nguoc ve dang dict-of-lists (dung cho cac thuat toan chua ho tro CSR)
+        ids, targets, weights, offsets = self.ids, self.targets, self.weights, self.offsets
+        return {
+            ids[i]: [(ids[targets[k]], weights[k]) for k in range(offsets[i], offsets[i + 1])]
+            for i in range(len(ids))
+        }
+
+    @classmethod
+    def from_arcs(cls,
+                  nodes: Dict[int, Tuple[float, float]],
+                  arcs: Iterable[Tuple[int, int, float]]) -> "CSRGraph":
+        #nodes: {id: (lat, lon)}, arcs: (u, v, w) theo OSM id -> xay CSR
+        ids = array("q", sorted(nodes))
+        n = len(ids)
+        index = {nid: i for i, nid in enumerate(ids)}
+        lat = array("d", (nodes[nid][0] for nid in ids))
+        lon = array("d", (nodes[nid][1] for nid in ids))
+
+        # giu thu tu canh ra giong build_graph (theo thu tu xuat hien)
+        src = array("i")
+        dst = array("i")
+        wts = array("d")
+        for u, v, w in arcs:
+            iu = index.get(u)
+            iv = index.get(v)
+            if iu is None or iv is None:
+                continue
+            src.append(iu)
+            dst.append(iv)
+            wts.append(w)
+
+        offsets = array("q", [0]) * (n + 1)
+        for iu in src:
+            offsets[iu + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+
+        m = len(src)
+        targets = array("i", [0]) * m
+        weights = array("d", [0.0]) * m
+        fill = array("q", offsets[:n])
+        for k in range(m):
+            iu = src[k]
+            pos = fill[iu]
+            targets[pos] = dst[k]
+            weights[pos] = wts[k]
+            fill[iu] = pos + 1
+
+        return cls(ids, offsets, targets, weights, lat, lon)
@@ -0,0 +1,231 @@
+import math
+import random
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from utils.spatial_index import EdgeIndex
+
+try:
+    import numpy as np
+except ImportError:  # numpy la tuy chon, khong co thi dung vong lap thuan Python
+    np = None
+
+# Hinh hoc cho cap nhat status theo polygon (admin_gui, map_loader):
+#   - polygon: [(lat, lon), ...] khong can lap lai diem dau; toa do phang (do), du cho vung vai km
+#   - vector hoa tren diem / doan (numpy), vong lap chi tren canh polygon (it canh);
+#     khong co numpy thi loc ung vien bang luoi EdgeIndex roi kiem tra tung doan
+#   - WITHIN (mac dinh, giong admin_gui ban dau): 2 dau mut deu nam trong polygon
+#     INTERSECTS: doan co diem chung voi polygon (1 dau trong, hoac cat bien) - chon ca edge
+#     cat ngang bien vung; phai truyen mode=INTERSECTS
+#   - nhieu polygon: zone_of() tra ve index polygon cuoi cung chua doan (ap dung theo thu tu)
+#   - python -m utils.geometry (tu thu muc src): so duong numpy voi ham 1 doan / 1 diem
+
+Point = Tuple[float, float]
+Polygon = Sequence[Point]
+
+INTERSECTS = "intersects"
+WITHIN = "within"
+
+
+def polygon_bbox(polygon: Polygon) -> Tuple[float, float, float, float]:
+    lats = [lat for lat, _ in polygon]
+    lons = [lon for _, lon in polygon]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def _polygon_edges(polygon: Polygon):
+    n = len(polygon)
+    for i in range(n):
+        yield polygon[i], polygon[(i + 1) % n]
+
+
+# ---------------- 1 diem / 1 doan ----------------
+def point_in_polygon(point: Point, polygon: Polygon) -> bool:
+    #ray casting; chi chia khi y1 != y2 nen khong can cong epsilon vao mau
+    x, y = point
+    inside = False
+    for (x1, y1), (x2, y2) in _polygon_edges(polygon):
+        if (y1 > y) != (y2 > y):
+            if x < (y - y1) * (x2 - x1) / (y2 - y1) + x1:
+                inside = not inside
+    return inside
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+
+def segment_crosses(a: Point, b: Point, c: Point, d: Point) -> bool:
+    #doan ab va cd co diem chung (ke ca cham / trung nhau)
+    d1 = _orient(c[0], c[1], d[0], d[1], a[0], a[1])
+    d2 = _orient(c[0], c[1], d[0], d[1], b[0], b[1])
+    d3 = _orient(a[0], a[1], b[0], b[1], c[0], c[1])
+    d4 = _orient(a[0], a[1], b[0], b[1], d[0], d[1])
+    if d1 * d2 > 0 or d3 * d4 > 0:
+        return False
+    # 4 gia tri = 0 (thang hang): can 2 hinh chieu giao nhau
+    return (min(a[0], b[0]) <= max(c[0], d[0]) and min(c[0], d[0]) <= max(a[0], b[0])
+            and min(a[1], b[1]) <= max(c[1], d[1]) and min(c[1], d[1]) <= max(a[1], b[1]))
+
+
+def segment_in_polygon(a: Point, b: Point, polygon: Polygon, mode: str = WITHIN) -> bool:
+    if mode == WITHIN:
+        return point_in_polygon(a, polygon) and point_in_polygon(b, polygon)
+    return point_in_polygon(a, polygon) or any(segment_crosses(a, b, c, d) for c, d in _polygon_edges(polygon))
+
+
+def polygon_contains(outer: Polygon, inner: Polygon) -> bool:
+    #inner nam tron trong outer: moi dinh o trong va khong canh nao cat / cham bien
+    # -> doan nao cat (hoac nam trong) inner cung cat (nam trong) outer, voi ca 2 mode
+    if [tuple(p) for p in inner] == [tuple(p) for p in outer]:
+        return True
+    if not all(point_in_polygon(p, outer) for p in inner):
+        return False
+    return not any(segment_crosses(a, b, c, d)
+                   for a, b in _polygon_edges(inner) for c, d in _polygon_edges(outer))
+
+
+# ---------------- Theo lo (numpy) ----------------
+def _np_points_in_polygon(x, y, polygon: Polygon):
+    inside = np.zeros(len(x), dtype=bool)
+    for (x1, y1), (x2, y2) in _polygon_edges(polygon):
+        if y1 == y2:
+            continue
+        inside ^= ((y1 > y) != (y2 > y)) & (x < (y - y1) * ((x2 - x1) / (y2 - y1)) + x1)
+    return inside
+
+
+def _np_segments_cross(ax, ay, bx, by, polygon: Polygon):
+    hit = np.zeros(len(ax), dtype=bool)
+    min_x, max_x = np.minimum(ax, bx), np.maximum(ax, bx)
+    min_y, max_y = np.minimum(ay, by), np.maximum(ay, by)
+    for (cx, cy), (dx, dy) in _polygon_edges(polygon):
+        d1 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+        d2 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+        d3 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        d4 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+        hit |= ((d1 * d2 <= 0) & (d3 * d4 <= 0)
+                & (min_x <= max(cx, dx)) & (min(cx, dx) <= max_x)
+                & (min_y <= max(cy, dy)) & (min(cy, dy) <= max_y))
+    return hit
+
+
+def _np_segments_in_polygon(ax, ay, bx, by, polygon: Polygon, mode: str):
+    if mode == WITHIN:
+        return _np_points_in_polygon(ax, ay, polygon) & _np_points_in_polygon(bx, by, polygon)
+    return _np_segments_cross(ax, ay, bx, by, polygon) | _np_points_in_polygon(ax, ay, polygon)
+
+
+def points_in_polygon(lats: Sequence[float], lons: Sequence[float], polygon: Polygon):
+    #mask cho N diem: numpy.ndarray(bool) neu co numpy, nguoc lai list bool
+    if np is not None:
+        return _np_points_in_polygon(np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64), polygon)
+    return [point_in_polygon(p, polygon) for p in zip(lats, lons)]
+
+
+class EdgeGeometry:
+    """
+    Toa do 2 dau cua cac edge xep thanh 4 mang (lat1, lon1, lat2, lon2) theo thu tu self.edges,
+    tao 1 lan roi dung cho moi polygon. Moi polygon truoc het loc theo bbox (vector hoa),
+    chi cac doan co bbox cham bbox polygon moi kiem tra chinh xac.
+    Khong co numpy: ung vien lay tu luoi EdgeIndex (edge_index truyen vao phai tao tu cung
+    edges / nodes, vd AdminGUI.edge_index; neu khong thi tao khi can).
+    """
+
+    def __init__(self, edges: List[Dict[str, Any]], nodes: Dict[Any, Point],
+                 edge_index: Optional[EdgeIndex] = None):
+        self.edges = [e for e in edges if e["u"] in nodes and e["v"] in nodes]
+        self.nodes = nodes
+        self._edge_index = edge_index if edge_index is not None and len(edge_index.edges) == len(self.edges) else None
+        self.lat1, self.lon1 = array("d"), array("d")
+        self.lat2, self.lon2 = array("d"), array("d")
+        for e in self.edges:
+            lat1, lon1 = nodes[e["u"]]
+            lat2, lon2 = nodes[e["v"]]
+            self.lat1.append(lat1)
+            self.lon1.append(lon1)
+            self.lat2.append(lat2)
+            self.lon2.append(lon2)
+        if np is not None:
+            self._arrays = tuple(np.frombuffer(a, dtype=np.float64) if len(a) else np.zeros(0)
+                                 for a in (self.lat1, self.lon1, self.lat2, self.lon2))
+
+    def __len__(self) -> int:
+        return len(self.edges)
+
+    def indices(self, polygon: Polygon, mode: str = WITHIN) -> List[int]:
+        #index (trong self.edges) cac doan thoa mode voi polygon
+        if len(polygon) < 3 or not self.edges:
+            return []
+        min_lat, min_lon, max_lat, max_lon = polygon_bbox(polygon)
+        if np is not None:
+            ax, ay, bx, by = self._arrays
+            cand = np.flatnonzero((np.minimum(ax, bx) <= max_lat) & (np.maximum(ax, bx) >= min_lat)
+                                  & (np.minimum(ay, by) <= max_lon) & (np.maximum(ay, by) >= min_lon))
+            mask = _np_segments_in_polygon(ax[cand], ay[cand], bx[cand], by[cand], polygon, mode)
+            return cand[mask].tolist()
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self.edges, self.nodes)
+        result = []
+        lat1, lon1, lat2, lon2 = self.lat1, self.lon1, self.lat2, self.lon2
+        for i in sorted(self._edge_index.positions_in_bbox(min_lat, min_lon, max_lat, max_lon)):
+            a_lat, a_lon, b_lat, b_lon = lat1[i], lon1[i], lat2[i], lon2[i]
+            if (min(a_lat, b_lat) > max_lat or max(a_lat, b_lat) < min_lat
+                    or min(a_lon, b_lon) > max_lon or max(a_lon, b_lon) < min_lon):
+                continue
+            if segment_in_polygon((a_lat, a_lon), (b_lat, b_lon), polygon, mode):
+                result.append(i)
+        return result
+
+    def select(self, polygon: Polygon, mode: str = WITHIN) -> List[Dict[str, Any]]:
+        return [self.edges[i] for i in self.indices(polygon, mode)]
+
+    def zone_of(self, polygons: Sequence[Polygon], mode: str = WITHIN) -> array:
+        #array('i'): index polygon cuoi cung chua edge i (polygon sau ghi de polygon truoc), -1 neu khong co
+        zone = array("i", [-1]) * len(self.edges)
+        for k, polygon in enumerate(polygons):
+            for i in self.indices(polygon, mode):
+                zone[i] = k
+        return zone
+
+
+# ---------------- Kiem tra nhanh ----------------
+def check_vectorized(samples: int = 2000, polygons: int = 20, seed: int = 0) -> Optional[int]:
+    #so ket qua cua duong numpy (EdgeGeometry.indices, points_in_polygon) voi ham 1 doan / 1 diem
+    # tren doan va polygon ngau nhien; tra ve so lan lech (0 = khop), None neu khong co numpy
+    # (khong kiem tra duoc gi, khong duoc coi la khop)
+    if np is None:
+        return None
+    rng = random.Random(seed)
+    nodes = {i: (rng.uniform(0.0, 1.0), rng.uniform(0.0, 1.0)) for i in range(samples)}
+    edges = [{"edge_id": i, "u": i, "v": rng.randrange(samples)} for i in range(samples)]
+    geometry = EdgeGeometry(edges, nodes)
+    lats = [lat for lat, _ in nodes.values()]
+    lons = [lon for _, lon in nodes.values()]
+    mismatches = 0
+    for _ in range(polygons):
+        # polygon hinh sao quanh 1 tam ngau nhien (co the lom)
+        clat, clon = rng.uniform(0.2, 0.8), rng.uniform(0.2, 0.8)
+        n = rng.randint(3, 9)
+        polygon = []
+        for k in range(n):
+            r = rng.uniform(0.05, 0.4)
+            angle = 2 * math.pi * k / n
+            polygon.append((clat + r * math.cos(angle), clon + r * math.sin(angle)))
+        for mode in (INTERSECTS, WITHIN):
+            expected = [i for i, e in enumerate(geometry.edges)
+                        if segment_in_polygon(nodes[e["u"]], nodes[e["v"]], polygon, mode)]
+            mismatches += len(set(expected) ^ set(geometry.indices(polygon, mode)))
+        mask = points_in_polygon(lats, lons, polygon)
+        mismatches += sum(bool(m) != point_in_polygon(p, polygon) for m, p in zip(mask, zip(lats, lons)))
+    return mismatches
+
+
+if __name__ == "__main__":
+    mismatches = check_vectorized()
+    if mismatches is None:
+        print("numpy not installed: vectorized check SKIPPED (only the pure Python path is used)")
+    else:
+        print(f"numpy vs scalar mismatches: {mismatches}")
+        sys.exit(1 if mismatches else 0)
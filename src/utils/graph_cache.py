@@ -0,0 +1,54 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Cache du lieu dan xuat tu 1 graph (view nguoc, CH, ALT, GeoTable), key = object graph:
+#   - graph weakref duoc (LiveGraph, CSRGraph): chi giu weakref, entry tu xoa khi graph bi giai phong
+#   - dict thuong khong weakref duoc: giu strong ref nhung chi toi da max_strong graph gan nhat
+# -> load lai graph khong lam graph cu (va du lieu dan xuat) ton tai mai trong process.
+
+
+class GraphCache:
+    def __init__(self, max_strong: int = 1):
+        self.max_strong = max_strong
+        # id(graph) -> (weakref | None, graph | None, value)
+        self._entries: Dict[int, Tuple[Any, Any, Any]] = {}
+        self._strong: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, graph: Any) -> Optional[Any]:
+        entry = self._entries.get(id(graph))
+        if entry is None:
+            return None
+        ref, strong, value = entry
+        owner = ref() if ref is not None else strong
+        return value if owner is graph else None
+
+    def set(self, graph: Any, value: Any) -> None:
+        key = id(graph)
+        with self._lock:
+            try:
+                ref = weakref.ref(graph, lambda _, key=key: self._discard(key))
+                self._entries[key] = (ref, None, value)
+                self._strong.pop(key, None)
+            except TypeError:
+                self._entries[key] = (None, graph, value)
+                self._strong[key] = None
+                self._strong.move_to_end(key)
+                while len(self._strong) > self.max_strong:
+                    old, _ = self._strong.popitem(last=False)
+                    self._entries.pop(old, None)
+
+    def _discard(self, key: int) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0]() is None:
+            del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._strong.clear()
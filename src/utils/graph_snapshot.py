@@ -0,0 +1,144 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+from array import array
+from typing import Optional, Tuple
+
+from utils.csr_graph import CSRGraph
+
+# File snapshot nhi phan cua CSRGraph (dat canh map_data.db, duoi .csr):
+#   header | ids q[n] | offsets q[n+1] | targets i[m] (+ padding) | weights d[m] | lat d[n] | lon d[n]
+# Cac mang duoc ghi theo byte order cua may va can le 8 byte, nen khi load chi can
+# mmap file roi memoryview.cast -> khong copy, nhieu process cung doc 1 ban trong page cache.
+# Header luu kich thuoc, mtime va sha1 cua map_data.db luc tao: DB doi (vd admin doi status)
+# thi snapshot tu het han va duoc build lai.
+
+SNAPSHOT_MAGIC = b"CSRSNAP\0"
+# 2: ids sap xep tang dan (CSRGraph.index tra bang bisect)
+SNAPSHOT_VERSION = 2
+
+# magic, version, little_endian, n, m, db_size, db_mtime_ns, db_sha1
+_HEADER = struct.Struct("<8sII4q20s")
+_HEADER_SIZE = (_HEADER.size + 7) // 8 * 8
+# vi tri (db_size, db_mtime_ns) trong header: sau magic, version, little_endian, n, m
+_SIGNATURE = struct.Struct("<2q")
+_SIGNATURE_OFFSET = struct.calcsize("<8sII2q")
+
+
+def snapshot_path(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + ".csr"
+
+
+def db_signature(db_path: str) -> Tuple[int, int]:
+    #(kich thuoc, mtime_ns) cua file DB: kiem tra nhanh truoc khi phai tinh sha1
+    st = os.stat(db_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def db_checksum(db_path: str) -> bytes:
+    h = hashlib.sha1()
+    with open(db_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.digest()
+
+
+def _pad(nbytes: int) -> int:
+    return (8 - nbytes % 8) % 8
+
+
+def _layout(n: int, m: int):
+    #(typecode, so phan tu) cua tung mang theo thu tu trong file
+    return (("q", n), ("q", n + 1), ("i", m), ("d", m), ("d", n), ("d", n))
+
+
+def _expected_size(n: int, m: int) -> int:
+    size = _HEADER_SIZE
+    for code, count in _layout(n, m):
+        nbytes = struct.calcsize(code) * count
+        size += nbytes + _pad(nbytes)
+    return size
+
+
+def write_snapshot(graph: CSRGraph, path: str, db_path: str,
+                   signature: Optional[Tuple[int, int]] = None) -> None:
+    #ghi ra file tam roi os.replace -> process khac khong bao gio doc phai file ghi do
+    # signature: db_signature lay TRUOC khi doc DB (DB doi trong luc build thi lan sau se build lai)
+    db_size, db_mtime = signature or db_signature(db_path)
+    n, m = len(graph.ids), len(graph.targets)
+    header = _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sys.byteorder == "little",
+                          n, m, db_size, db_mtime, db_checksum(db_path))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header + b"\0" * (_HEADER_SIZE - len(header)))
+        for (code, _), data in zip(_layout(n, m), (graph.ids, graph.offsets, graph.targets,
+                                                   graph.weights, graph.lat, graph.lon)):
+            raw = data.tobytes() if isinstance(data, (array, memoryview)) else array(code, data).tobytes()
+            f.write(raw + b"\0" * _pad(len(raw)))
+    os.replace(tmp_path, path)
+
+
+def _refresh_signature(path: str, signature: Tuple[int, int]) -> None:
+    #ghi de db_size, db_mtime_ns trong header (cung vi tri, cung kich thuoc -> khong doi layout)
+    try:
+        with open(path, "r+b") as f:
+            f.seek(_SIGNATURE_OFFSET)
+            f.write(_SIGNATURE.pack(*signature))
+    except OSError:
+        # khong ghi duoc (vd thu muc chi doc): lan sau van dung duoc, chi ton them 1 lan sha1
+        pass
+
+
+def load_snapshot(path: str, db_path: Optional[str] = None) -> Optional[CSRGraph]:
+    #tra ve CSRGraph tro thang vao vung mmap (chi doc), None neu file khong co / hong / het han
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER_SIZE:
+            return None
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, little, n, m, db_size, db_mtime, db_sha1 = _HEADER.unpack_from(mm, 0)
+    if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION
+            or bool(little) != (sys.byteorder == "little") or size != _expected_size(n, m)):
+        mm.close()
+        return None
+    if db_path is not None:
+        signature = db_signature(db_path)
+        if signature != (db_size, db_mtime):
+            if db_checksum(db_path) != db_sha1:
+                mm.close()
+                return None
+            # noi dung DB khong doi (chi mtime / kich thuoc doi): ghi lai signature vao header
+            # de lan load sau khoi phai tinh lai sha1 ca file
+            _refresh_signature(path, signature)
+
+    buf = memoryview(mm)
+    views = []
+    pos = _HEADER_SIZE
+    for code, count in _layout(n, m):
+        nbytes = struct.calcsize(code) * count
+        views.append(buf[pos:pos + nbytes].cast(code))
+        pos += nbytes + _pad(nbytes)
+    graph = CSRGraph(*views)
+    # giu mmap song cung graph (cac memoryview o tren tro vao no)
+    graph.snapshot = mm
+    return graph
+
+
+def preprocess(db_path: Optional[str] = None) -> CSRGraph:
+#buoc offline: build CSR tu DB va ghi snapshot canh map_data.db
+    from utils.map_handler import DB_PATH, get_all_nodes, get_all_edges, build_csr_graph
+    db_path = db_path or DB_PATH
+    signature = db_signature(db_path)
+    graph = build_csr_graph(get_all_nodes(db_path), get_all_edges(db_path))
+    write_snapshot(graph, snapshot_path(db_path), db_path, signature)
+    return graph
+
+
+if __name__ == "__main__":
+    g = preprocess(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"Snapshot: {len(g)} nodes, {g.num_edges} arcs")
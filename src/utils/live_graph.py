@@ -0,0 +1,161 @@
+import time
+import uuid
+from typing import Dict, Tuple, List, Any, Iterable, Optional
+
+from utils.map_handler import (
+    DB_PATH, db_file_id, get_all_nodes, get_all_edges, iter_weighted_arcs,
+    STATUS_READER_TTL, register_status_reader, ack_status_log, get_status_changes,
+    get_edge_statuses, reverse_graph
+)
+
+INF = float("inf")
+
+
+class GraphReplaced(Exception):
+    #file DB bi thay ca file (os.replace, vd import lai map): edge_id / status_log cua file moi
+    # khong khop voi graph dang giu -> phai load lai (LiveGraph.from_db), khong sync tiep duoc
+    pass
+
+
+class LiveGraph(dict):
+    """
+    Graph dang dict {node_id: [(neighbor, w), ...]} (dung truc tiep cho dijkstra/astar/registry)
+    nhung cap nhat status cua edge tai cho, khong can build_graph lai toan bo.
+    - version tang moi khi trong so thay doi -> router / cache biet graph da doi
+    - luat trong so giong build_graph: block bo ca 2 chieu, traffic x2, flood x3
+    - reverse: graph nguoc (dung cho search 2 chieu), tao khi can va cap nhat cung luc
+    """
+
+    def __init__(self, nodes: Dict[int, Tuple[float, float]], edges: List[Dict[str, Any]]):
+        super().__init__((node_id, []) for node_id in nodes)
+        self.nodes = nodes
+        self.edges = edges
+        self.edge_by_id: Dict[int, Dict[str, Any]] = {e["edge_id"]: e for e in edges}
+        # cac edge cung cap node {u, v} (giu thu tu trong DB vi luat traffic/flood phu thuoc thu tu)
+        self._pair_edges: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        for e in edges:
+            self._pair_edges.setdefault(_pair_key(e["u"], e["v"]), []).append(e)
+
+        for u, v, w in iter_weighted_arcs(edges):
+            if u in self and v in self:
+                self[u].append((v, w))
+
+        self.version = 0
+        self._reverse: Optional[Dict[int, List[Tuple[int, float]]]] = None
+        self._listeners = []
+        self.db_path: Optional[str] = None
+        self.log_seq = 0
+        # ten trong status_log_readers: log chi bi cat toi seq ma moi reader da doc
+        # (None: graph khong doc log, sync() khong lam gi)
+        self.reader_id: Optional[str] = None
+        # (device, inode) cua file DB luc load: khac -> file da bi thay, xem GraphReplaced
+        self.file_id: Optional[Tuple[int, int]] = None
+        self._acked_at = 0.0
+
+    @classmethod
+    def from_db(cls, db_path: str = DB_PATH, register: bool = True) -> "LiveGraph":
+        # dang ky doc log truoc khi doc edges de khong bo sot thay doi xay ra trong luc load
+        # register=False: khong dang ky reader (vd admin_gui tu ghi status, khong sync) -> khong
+        # giu seq cu trong status_log_readers lam log khong cat duoc
+        file_id = db_file_id(db_path)
+        reader_id = uuid.uuid4().hex if register else None
+        log_seq = register_status_reader(reader_id, db_path) if register else 0
+        graph = cls(get_all_nodes(db_path), get_all_edges(db_path))
+        graph.db_path = db_path
+        graph.log_seq = log_seq
+        graph.reader_id = reader_id
+        graph.file_id = file_id
+        graph._acked_at = time.time()
+        return graph
+
+    @property
+    def reverse(self) -> Dict[int, List[Tuple[int, float]]]:
+        if self._reverse is None:
+            self._reverse = reverse_graph(self)
+        return self._reverse
+
+    # ---------------- Cap nhat ----------------
+    def apply_status(self, edge_id: int, status: str) -> List[Tuple[int, int]]:
+        return self.apply_statuses([(edge_id, status)])
+
+    def apply_statuses(self, updates: Iterable[Tuple[int, str]]) -> List[Tuple[int, int]]:
+    #ap dung [(edge_id, status)], chi tinh lai cac cap node bi anh huong
+    #tra ve cac cap (u, v) (u <= v) co trong so thay doi
+        dirty = set()
+        for edge_id, status in updates:
+            e = self.edge_by_id.get(edge_id)
+            if e is None or e.get("status") == status:
+                continue
+            e["status"] = status
+            dirty.add(_pair_key(e["u"], e["v"]))
+
+        changed = []
+        decreased = False
+        for key in dirty:
+            pair_changed, pair_decreased = self._rebuild_pair(key)
+            if pair_changed:
+                changed.append(key)
+                decreased = decreased or pair_decreased
+        if changed:
+            self.version += 1
+            for listener in self._listeners:
+                listener(changed, decreased, self.version)
+        return changed
+
+    def subscribe(self, listener) -> None:
+    #listener(changed_pairs, decreased, version) duoc goi sau moi lan trong so thay doi
+    # decreased = True neu co cung nao re hon truoc (vd bo block) -> moi duong di cu deu co the khong con toi uu
+        self._listeners.append(listener)
+
+    def replaced(self) -> bool:
+        #file DB da bi thay (inode khac luc load)
+        return self.db_path is not None and db_file_id(self.db_path) != self.file_id
+
+    def sync(self) -> List[Tuple[int, int]]:
+    #doc cac thay doi status moi trong DB (vd tu admin_gui) va ap dung
+    # raise GraphReplaced neu file DB da bi thay: log_seq / edge_id cu khong con y nghia
+        if self.db_path is None or self.reader_id is None:
+            return []
+        if self.replaced():
+            raise GraphReplaced(self.db_path)
+        rows = get_status_changes(self.log_seq, self.db_path)
+        if rows:
+            self.log_seq = rows[-1][0]
+        elif time.time() - self._acked_at < STATUS_READER_TTL / 2:
+            return []
+        # bao da doc toi log_seq (cho phep cat log); khi khong co thay doi chi gia han dinh ky
+        if not ack_status_log(self.reader_id, self.log_seq, self.db_path):
+            # reader da qua han va bi xoa: log co the da bi cat -> doc lai status cua moi edge
+            self.log_seq = register_status_reader(self.reader_id, self.db_path)
+            self._acked_at = time.time()
+            return self.apply_statuses(get_edge_statuses(self.db_path))
+        self._acked_at = time.time()
+        return self.apply_statuses((edge_id, status) for _, edge_id, status in rows)
+
+    def _rebuild_pair(self, key: Tuple[int, int]) -> Tuple[bool, bool]:
+    #tinh lai cung giua 2 node cua key, tra ve (co thay doi, co cung re hon truoc)
+        a, b = key
+        if a not in self or b not in self:
+            return False, False
+        arcs = list(iter_weighted_arcs(self._pair_edges[key]))
+        changed = False
+        decreased = False
+        for u, v in ((a, b), (b, a)):
+            adj = self[u]
+            old = [(x, w) for x, w in adj if x == v]
+            new = [(v, w) for x, y, w in arcs if x == u and y == v]
+            if old != new:
+                adj[:] = [(x, w) for x, w in adj if x != v] + new
+                if self._reverse is not None:
+                    radj = self._reverse[v]
+                    radj[:] = [(x, w) for x, w in radj if x != u] + [(u, w) for _, w in new]
+                changed = True
+                if min((w for _, w in new), default=INF) < min((w for _, w in old), default=INF):
+                    decreased = True
+            if a == b:
+                break
+        return changed, decreased
+
+
+def _pair_key(u: int, v: int) -> Tuple[int, int]:
+    return (u, v) if u <= v else (v, u)
@@ -1,6 +1,16 @@
+import os
+import sys
 import folium
 import sqlite3
 
+SRC_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))   # src
+if SRC_ROOT not in sys.path:
+    sys.path.insert(0, SRC_ROOT)
+
+from utils.map_lod import LODRenderer
+
+ZOOM = 15
+
 #load edges, nodes tu DataBase
 
 conn = sqlite3.connect("map_data.db")
@@ -11,13 +21,13 @@ c.execute("SELECT id, lat, lon FROM nodes")
 nodes = {row[0]: (row[1], row[2]) for row in c.fetchall() } #lay toan bo dong va tra ve dang list id : (lat, lon)
 
 #lay Edges
-c.execute("SELECT from_node, to_node, status FROM edges")
-edges = c.fetchall()
+c.execute("SELECT id, from_node, to_node, status FROM edges")
+edges = [{"edge_id": edge_id, "u": u, "v": v, "status": status} for edge_id, u, v, status in c.fetchall()]
 
 conn.close()
 
 
-#Tao map folium
+#Tao map folium (canvas renderer: 1 <canvas> thay vi 1 phan tu SVG / duong)
 
 if nodes:
     avg_lat = sum(lat for lat, lon in nodes.values()) / len(nodes) # lat trung binh
@@ -26,19 +36,17 @@ else:
     avg_lat =  21.0357879
     avg_lon = 105.8276413
     
-m = folium.Map(location = [avg_lat, avg_lon], zoom_start= 15 )
-
-#Ve cac duong
-for from_node, to_node, status in edges:
-    if from_node in nodes and to_node in nodes:
-        if status == "normal": color = "blue"
-        elif status == "block": color = "red"
-        else: color = "orange"
-        folium.PolyLine(
-            [ nodes[from_node], nodes[to_node] ],
-            color = color,
-            weight = 1
-        ).add_to(m)
+m = folium.Map(location = [avg_lat, avg_lon], zoom_start= ZOOM, prefer_canvas=True)
+
+#Ve cac duong: edge normal lien tiep gop thanh 1 polyline, don gian hoa theo zoom ZOOM
+def edge_style(e):
+    return {"color": "red" if e["status"] == "block" else "orange", "weight": 1}
+
+renderer = LODRenderer(edges, nodes, edge_style, {"color": "blue", "weight": 1})
+folium.GeoJson(
+    renderer.full_extent(ZOOM),
+    style_function=lambda f: f["properties"]
+).add_to(m)
         
 m.save("map.html")
-print("Map saved as map.html")
\ No newline at end of file
+print("Map saved as map.html")
@@ -1,74 +1,384 @@
 import sqlite3
 import os
-from typing import Dict, Tuple, List, Any
+import json
+import time
+import threading
+from array import array
+from typing import Dict, Tuple, List, Any, Iterator, Iterable, Optional
+
+from utils.csr_graph import CSRGraph
+from utils.graph_snapshot import snapshot_path, db_signature, load_snapshot, write_snapshot
+from utils.geometry import EdgeGeometry, WITHIN, polygon_contains
+from utils.graph_cache import GraphCache
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, "map_data.db")
+
+# reader (LiveGraph) khong sync qua lau thi bi xoa khoi status_log_readers de log van duoc cat
+STATUS_READER_TTL = 24 * 3600.0
+
+# polygon status (vd vung ngap) admin da ve, theo thu tu; polygon luu dang JSON [[lat, lon], ...]
+STATUS_ZONES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS status_zones(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        status TEXT,
+        polygon TEXT
+    )
+    '''
+
+# log moi lan doi status cua edge (trigger) cho LiveGraph.sync; moi LiveGraph dang doc log ghi lai
+# seq da doc trong status_log_readers, dong log <= seq nho nhat thi xoa duoc
+STATUS_LOG_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS edge_status_log(
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        edge_id INTEGER,
+        status TEXT
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS edge_status_changed
+    AFTER UPDATE OF status ON edges
+    WHEN OLD.status IS NOT NEW.status
+    BEGIN
+        INSERT INTO edge_status_log (edge_id, status) VALUES (NEW.id, NEW.status);
+    END
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS status_log_readers(
+        reader TEXT PRIMARY KEY,
+        seq INTEGER,
+        seen REAL
+    )
+    ''',
+)
+
+# speed_profiles.factors: array('f') cac he so thoi gian di chuyen theo khung gio (BLOB)
+# edge_profiles: edge nao dung profile nao (nhieu edge dung chung 1 profile)
+PROFILE_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS speed_profiles(
+        id INTEGER PRIMARY KEY,
+        name TEXT,
+        factors BLOB
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS edge_profiles(
+        edge_id INTEGER PRIMARY KEY,
+        profile_id INTEGER REFERENCES speed_profiles(id)
+    )
+    ''',
+)
+
+
+def db_file_id(path: str) -> Optional[Tuple[int, int]]:
+    #(device, inode): doi khi file bi thay bang os.replace, khong doi khi chi ghi vao DB
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class MapRepository:
+    """
+    Lop truy cap DB cho 1 file map:
+    - moi thread giu 1 connection rieng (sqlite3 khong cho dung chung connection giua cac thread)
+    - cau lenh SQL co dinh -> sqlite3 cache statement da prepare (cached_statements)
+    - ghi nhieu edge 1 lan trong 1 transaction (set_edge_statuses)
+    - file DB bi thay (map_loader: os.replace) -> connection cu van doc inode cu, nen moi lan lay
+      connection so (device, inode) cua file va mo lai neu khac
+    - cac bang phu (log status, profile, vung status) tao 1 lan cho moi file DB khi mo connection
+      dau tien, khong tao trong cac ham doc / ghi
+    """
+
+    def __init__(self, db_path: str = DB_PATH, timeout: float = 5.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        # file DB da duoc tao bang phu
+        self._schema_file = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        file_id = db_file_id(self.db_path)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.file_id != file_id:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, cached_statements=64)
+            self._local.conn = conn
+            self._local.file_id = file_id
+            if self._schema_file != file_id:
+                self._ensure_schema(conn)
+                self._schema_file = file_id
+        return conn
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        #DB tao boi map_loader da co san cac bang nay; DB cu thi tao them (IF NOT EXISTS)
+        has_edges = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'edges'").fetchone()
+        if has_edges is None:
+            return
+        with conn:
+            for stmt in STATUS_LOG_SCHEMA + PROFILE_SCHEMA + (STATUS_ZONES_SCHEMA,):
+                conn.execute(stmt)
+
+    def close(self) -> None:
+        #dong connection cua thread hien tai
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---------------- Doc ----------------
+    def nodes(self) -> Dict[int, Tuple[float, float]]:
+        rows = self.conn.execute("SELECT id, lat, lon FROM nodes").fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def edges(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT id, from_node, to_node, length, oneway, status FROM edges"
+        ).fetchall()
+        return [
+            {
+                "edge_id": edge_id,
+                "u": from_node,
+                "v": to_node,
+                "length": float(length) if length is not None else 0.0,
+                "oneway": int(oneway) if oneway is not None else 0,
+                "status": status
+            }
+            for edge_id, from_node, to_node, length, oneway, status in rows
+        ]
+
+    def edge_status(self, edge_id: int) -> Any:
+        row = self.conn.execute("SELECT status FROM edges WHERE id = ? LIMIT 1", (edge_id,)).fetchone()
+        return row[0] if row else None
+
+    def blocked_edges(self) -> List[Tuple[int, int, str]]:
+        return self.conn.execute(
+            "SELECT from_node, to_node, status FROM edges WHERE status IN ('block', 'flood', 'traffic')"
+        ).fetchall()
+
+    def map_center(self) -> Optional[Tuple[float, float]]:
+        #trung binh toa do tinh trong SQL, None neu DB chua co node
+        row = self.conn.execute("SELECT AVG(lat), AVG(lon) FROM nodes").fetchone()
+        if row is None or row[0] is None:
+            return None
+        return row[0], row[1]
+
+    # ---------------- Ghi ----------------
+    def set_edge_status(self, edge_id: int, status: str) -> None:
+        self.set_edge_statuses((edge_id,), status)
+
+    def set_edge_statuses(self, edge_ids: Iterable[int], status: str) -> None:
+        #cap nhat nhieu edge, 1 transaction / 1 commit
+        conn = self.conn
+        with conn:
+            conn.executemany("UPDATE edges SET status = ? WHERE id = ?", ((status, e) for e in edge_ids))
+
+    # ---------------- Log status ----------------
+    def ensure_status_log(self) -> int:
+        #tra ve seq moi nhat cua log (bang log + trigger da tao khi mo connection)
+        conn = self.conn
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM edge_status_log").fetchone()[0]
+
+    def register_status_reader(self, reader: str) -> int:
+        #dang ky reader tai seq moi nhat (trong 1 transaction), tra ve seq do
+        conn = self.conn
+        with conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM edge_status_log").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO status_log_readers (reader, seq, seen) VALUES (?, ?, ?)",
+                         (reader, seq, time.time()))
+        return seq
+
+    def ack_status_log(self, reader: str, seq: int) -> bool:
+        #reader da doc toi seq: xoa reader qua han va cac dong log moi reader deu da doc
+        # tra ve False neu reader khong con (da qua han) -> log co the da mat dong, phai doc lai toan bo
+        now = time.time()
+        conn = self.conn
+        with conn:
+            found = conn.execute("UPDATE status_log_readers SET seq = ?, seen = ? WHERE reader = ?",
+                                 (seq, now, reader)).rowcount
+            conn.execute("DELETE FROM status_log_readers WHERE seen < ?", (now - STATUS_READER_TTL,))
+            conn.execute(
+                "DELETE FROM edge_status_log WHERE seq <= (SELECT COALESCE(MIN(seq), 0) FROM status_log_readers)"
+            )
+        return found > 0
+
+    def edge_statuses(self) -> List[Tuple[int, str]]:
+        return self.conn.execute("SELECT id, status FROM edges").fetchall()
+
+    def status_changes(self, since_seq: int) -> List[Tuple[int, int, str]]:
+        #tra ve [(seq, edge_id, status)] cac thay doi sau since_seq
+        return self.conn.execute(
+            "SELECT seq, edge_id, status FROM edge_status_log WHERE seq > ? ORDER BY seq",
+            (since_seq,)
+        ).fetchall()
+
+    # ---------------- Profile thoi gian ----------------
+    def speed_profiles(self) -> Dict[int, Tuple[str, List[float]]]:
+        rows = self.conn.execute("SELECT id, name, factors FROM speed_profiles").fetchall()
+        return {pid: (name, array("f", blob).tolist()) for pid, name, blob in rows}
+
+    def edge_profiles(self) -> Dict[int, int]:
+        return dict(self.conn.execute("SELECT edge_id, profile_id FROM edge_profiles").fetchall())
+
+    def save_speed_profile(self, profile_id: int, name: str, factors: Iterable[float]) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO speed_profiles (id, name, factors) VALUES (?, ?, ?)",
+                (profile_id, name, array("f", factors).tobytes())
+            )
+
+    def assign_profile(self, edge_ids: Iterable[int], profile_id: Optional[int]) -> None:
+        #profile_id = None: bo profile (edge quay ve trong so tinh)
+        with self.conn:
+            if profile_id is None:
+                self.conn.executemany("DELETE FROM edge_profiles WHERE edge_id = ?", ((e,) for e in edge_ids))
+            else:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO edge_profiles (edge_id, profile_id) VALUES (?, ?)",
+                    ((e, profile_id) for e in edge_ids)
+                )
+
+    # ---------------- Vung status (polygon) ----------------
+    def status_zones(self) -> List[Tuple[int, str, List[Tuple[float, float]]]]:
+        #[(id, status, polygon)] theo thu tu da ve
+        rows = self.conn.execute("SELECT id, status, polygon FROM status_zones ORDER BY id").fetchall()
+        return [(zid, status, [tuple(p) for p in json.loads(polygon)]) for zid, status, polygon in rows]
+
+    def save_status_zones(self, zones: Iterable[Tuple[str, List[Tuple[float, float]]]]) -> None:
+        #them cac vung [(status, polygon)] vao cuoi danh sach
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO status_zones (status, polygon) VALUES (?, ?)",
+                ((status, json.dumps([list(p) for p in polygon])) for status, polygon in zones)
+            )
+
+    def add_status_zone(self, status: str, polygon: List[Tuple[float, float]], edge_ids: Iterable[int]) -> int:
+        #admin ap status cho polygon: luu vung + doi status cac edge trong vung trong 1 transaction,
+        # bo cac vung khong con tac dung; tra ve so vung bi bo
+        conn = self.conn
+        with conn:
+            conn.execute("INSERT INTO status_zones (status, polygon) VALUES (?, ?)",
+                         (status, json.dumps([list(p) for p in polygon])))
+            conn.executemany("UPDATE edges SET status = ? WHERE id = ?", ((status, e) for e in edge_ids))
+            removed = self.redundant_zones(self.status_zones())
+            conn.executemany("DELETE FROM status_zones WHERE id = ?", ((zid,) for zid in removed))
+        return len(removed)
+
+    @staticmethod
+    def redundant_zones(zones: List[Tuple[int, str, List[Tuple[float, float]]]]) -> List[int]:
+        #id cac vung bo di ma ap dung lai (apply_status_zones tren DB moi, moi edge normal) van cho cung ket qua:
+        # - vung nam tron trong 1 vung ve sau: moi edge cua no deu bi vung sau ghi de
+        # - vung normal ma truoc no khong con vung khac normal nao: edge cua no van la normal
+        superseded = {zid for k, (zid, _, polygon) in enumerate(zones)
+                      if any(polygon_contains(later, polygon) for _, _, later in zones[k + 1:])}
+        removed = []
+        seen_status = False
+        for zid, status, _ in zones:
+            if zid in superseded or (status == "normal" and not seen_status):
+                removed.append(zid)
+            elif status != "normal":
+                seen_status = True
+        return removed
+
+    def apply_status_zones(self, mode: str = WITHIN) -> int:
+        #ap dung lai tat ca vung len toan bo edges (vd sau khi import map moi):
+        # moi edge lay status cua vung cuoi cung cat no, ghi trong 1 transaction; tra ve so edge
+        zones = self.status_zones()
+        if not zones:
+            return 0
+        geometry = EdgeGeometry(self.edges(), self.nodes())
+        zone_of = geometry.zone_of([polygon for _, _, polygon in zones], mode)
+        updates = [(zones[k][1], geometry.edges[i]["edge_id"]) for i, k in enumerate(zone_of) if k >= 0]
+        with self.conn:
+            self.conn.executemany("UPDATE edges SET status = ? WHERE id = ?", updates)
+        return len(updates)
+
+
+# db_path -> MapRepository (dung chung trong process)
+_REPOSITORIES: Dict[str, MapRepository] = {}
+_REPOSITORIES_LOCK = threading.Lock()
+
+
+def get_repository(db_path: str = DB_PATH) -> MapRepository:
+    repo = _REPOSITORIES.get(db_path)
+    if repo is None:
+        with _REPOSITORIES_LOCK:
+            repo = _REPOSITORIES.setdefault(db_path, MapRepository(db_path))
+    return repo
+
+
 #lay toan bo nodes tu DB va tra ve dict: {id : (lat, lon)}
 def get_all_nodes(db_path: str = DB_PATH) -> Dict[int, Tuple[float, float]]:
     #tra ve dang dict: {node_id : (lat, lon)}
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, lat, lon FROM nodes")
-        rows = c.fetchall()
-    nodes = {row[0] : (row[1], row[2]) for row in rows}
-    conn.close()
-    return nodes
+    return get_repository(db_path).nodes()
 
 #lay toan bo edges tu DB va tra ve list cac dict
 def get_all_edges(db_path: str = DB_PATH) -> List[Dict[str, Any]]:
 # tra ve dang list cac dict co dang { "edge_id", "u", "v", "length", "oneway", "status" }
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute(
-            "SELECT id, from_node, to_node, length, oneway, status FROM edges"
-        )
-        rows = c.fetchall()
-
-    edges: List[Dict[str, Any]] = []
-    for row in rows:
-        edge_id, from_node, to_node, length, oneway, status = row
-        edges.append({
-            "edge_id": edge_id,
-            "u": from_node,
-            "v": to_node,
-            "length": float(length) if length is not None else 0.0,
-            "oneway": int(oneway) if oneway is not None else 0,
-            "status": status
-        })
-    return edges
+    return get_repository(db_path).edges()
 
 
 def get_edge_status(edge_id: int, db_path: str = DB_PATH) -> Any:
 #tra ve status ( None neu khong thay )
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("SELECT status FROM edges WHERE id = ? LIMIT 1", (edge_id,))
-        row = c.fetchone()
-    return row[0] if row else None
+    return get_repository(db_path).edge_status(edge_id)
 
 
 def set_edge_status(edge_id: int, status: str, db_path: str = DB_PATH) -> None:
 #cap nhap status ( dung trong admin )
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("UPDATE edges SET status = ? WHERE id = ?", (status, edge_id))
-        conn.commit()
-
-def get_blocked_edges(db_path:str= DB_PATH):
-    block_edges=[]
-    with sqlite3.connect(db_path) as conn:
-        c = conn.cursor()
-        c.execute("SELECT from_node, to_node, status FROM edges WHERE status IN ('block', 'flood', 'traffic') ")
-        row = c.fetchall()
-    return row
-    
-def build_graph(nodes: Dict[int, Tuple[float, float]],
-                edges: List[Dict[str, Any]]) -> Dict[int, List[Tuple[int, float]]]:
-#tao ds ke graph: graph[node_id] = [(neighbor_id, length), ...]
-    # nodes: {id: (lat, lon)} -> key la node_id
-    graph: Dict[int, List[Tuple[int, float]]] = {node_id: [] for node_id in nodes}
+    get_repository(db_path).set_edge_status(edge_id, status)
+
+
+def set_edge_statuses(edge_ids: Iterable[int], status: str, db_path: str = DB_PATH) -> None:
+#cap nhat status cho nhieu edge trong 1 transaction (polygon trong admin)
+    get_repository(db_path).set_edge_statuses(edge_ids, status)
+
+
+def ensure_status_log(db_path: str = DB_PATH) -> int:
+    return get_repository(db_path).ensure_status_log()
+
+
+def get_status_changes(since_seq: int, db_path: str = DB_PATH) -> List[Tuple[int, int, str]]:
+    return get_repository(db_path).status_changes(since_seq)
+
+
+def register_status_reader(reader: str, db_path: str = DB_PATH) -> int:
+    return get_repository(db_path).register_status_reader(reader)
+
+
+def ack_status_log(reader: str, seq: int, db_path: str = DB_PATH) -> bool:
+    return get_repository(db_path).ack_status_log(reader, seq)
+
+
+def get_edge_statuses(db_path: str = DB_PATH) -> List[Tuple[int, str]]:
+    return get_repository(db_path).edge_statuses()
+
+
+def get_blocked_edges(db_path: str = DB_PATH):
+    return get_repository(db_path).blocked_edges()
+
+
+def add_status_zone(status: str, polygon: List[Tuple[float, float]], edge_ids: Iterable[int],
+                    db_path: str = DB_PATH) -> int:
+#ap status cho cac edge trong polygon + luu polygon (de ap dung lai sau khi import map), 1 transaction
+    return get_repository(db_path).add_status_zone(status, polygon, edge_ids)
+
 
+def iter_weighted_arcs(edges: List[Dict[str, Any]]) -> Iterator[Tuple[int, int, float]]:
+#duyet edges theo thu tu, tra ve (u, v, w) cho moi canh con di duoc
+    for _, u, v, w in iter_weighted_edges(edges):
+        yield u, v, w
+
+
+def iter_weighted_edges(edges: List[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], int, int, float]]:
+#giong iter_weighted_arcs nhung tra ve ca dict edge: (edge, u, v, w)
+# block: bo ca 2 chieu, traffic: x2, flood: x3 (chieu nguoc lai cung bi nhan theo)
     blocked_pairs = set()
     flood_road = set()
     traffic_road = set()
@@ -98,12 +408,56 @@ def build_graph(nodes: Dict[int, Tuple[float, float]],
                 flood_road.add((v,u))
             else:
                 w = base_w
+        yield e, u, v, w
+
 
+def build_graph(nodes: Dict[int, Tuple[float, float]],
+                edges: List[Dict[str, Any]]) -> Dict[int, List[Tuple[int, float]]]:
+#tao ds ke graph: graph[node_id] = [(neighbor_id, length), ...]
+    # nodes: {id: (lat, lon)} -> key la node_id
+    graph: Dict[int, List[Tuple[int, float]]] = {node_id: [] for node_id in nodes}
+
+    for u, v, w in iter_weighted_arcs(edges):
         if u in graph and v in graph:
             graph[u].append((v, w))
     return graph
 
 
+def reverse_graph(graph: Dict[int, List[Tuple[int, float]]]) -> Dict[int, List[Tuple[int, float]]]:
+#dao chieu tat ca canh: rev[v] = [(u, w), ...] voi moi canh u -> v
+    rev: Dict[int, List[Tuple[int, float]]] = {node_id: [] for node_id in graph}
+    for u, lst in graph.items():
+        for v, w in lst:
+            if v in rev:
+                rev[v].append((u, w))
+    return rev
+
+
+# graph -> (version, forward, reverse)
+_VIEW_CACHE = GraphCache()
+
+
+def get_adjacency_views(graph) -> Tuple[Dict[int, List[Tuple[int, float]]], Dict[int, List[Tuple[int, float]]]]:
+#tra ve (graph xuoi, graph nguoc) dang dict, chi tinh lai khi graph doi (theo id + version)
+# LiveGraph tu giu graph nguoc cap nhat tai cho; CSRGraph duoc doi sang dict 1 lan
+    if getattr(graph, "reverse", None) is not None:
+        return graph, graph.reverse
+    version = getattr(graph, "version", 0)
+    cached = _VIEW_CACHE.get(graph)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+    forward = graph.to_adjacency() if isinstance(graph, CSRGraph) else graph
+    reverse = reverse_graph(forward)
+    _VIEW_CACHE.set(graph, (version, forward, reverse))
+    return forward, reverse
+
+
+def build_csr_graph(nodes: Dict[int, Tuple[float, float]],
+                    edges: List[Dict[str, Any]]) -> CSRGraph:
+#giong build_graph nhung tra ve CSRGraph (mang array, node id danh lai 0..N-1)
+    return CSRGraph.from_arcs(nodes, iter_weighted_arcs(edges))
+
+
 def load_graph_from_db(db_path: str = DB_PATH):
 #load nodes, edges tu DB va build graph, tra ve graph: {node_id : [(neighbor, len), ...]} va coords: {node_id: (lat, lon)}
     nodes = get_all_nodes(db_path)
@@ -111,13 +465,31 @@ def load_graph_from_db(db_path: str = DB_PATH):
     graph = build_graph(nodes, edges)
     return graph, nodes
 
-def get_map_center():
-    nodes = get_all_nodes()
-    if not nodes:
-        return  21.0357, 105.8276
 
-    lats = [lat for (lat, lon) in nodes.values()]
-    lons = [lon for (lat, lon) in nodes.values()]
-    return sum(lats)/len(lats), sum(lons)/len(lons)
+def load_csr_graph_from_db(db_path: str = DB_PATH, use_snapshot: bool = True) -> CSRGraph:
+#load graph dang CSR, toa do nam trong graph.lat / graph.lon
+# use_snapshot: doc file .csr canh DB bang mmap neu con khop voi DB, khong thi build tu DB va ghi lai
+    path = snapshot_path(db_path)
+    if use_snapshot:
+        graph = load_snapshot(path, db_path)
+        if graph is not None:
+            graph.db_path = db_path
+            return graph
+    signature = db_signature(db_path)
+    graph = build_csr_graph(get_all_nodes(db_path), get_all_edges(db_path))
+    graph.db_path = db_path
+    if use_snapshot:
+        try:
+            write_snapshot(graph, path, db_path, signature)
+        except OSError:
+            # thu muc chi doc: van dung duoc graph, chi la lan sau phai build lai
+            pass
+    return graph
+
+def get_map_center(db_path: str = DB_PATH):
+    center = get_repository(db_path).map_center()
+    if center is None:
+        return  21.0357, 105.8276
+    return center
 
     
@@ -1,62 +1,194 @@
-import osmnx as ox
-import networkx as nx 
-import sqlite3
+# src/utils/map_loader.py
+# Import file .osm vao DB SQLite dung cho router
+#   python utils/map_loader.py ../map.osm --db utils/map_data.db
+# Mac dinh doc file theo kieu streaming (utils/osm_stream.py, bo nho gioi han);
+# --osmnx: dung osmnx.graph_from_xml nhu truoc (giu ca graph trong RAM)
+# Ghi vao DB tam (<db>.tmp) trong 1 transaction, tao index sau khi load xong roi moi thay DB cu
+# bang os.replace -> neu import loi giua chung, DB dang dung van nguyen ven.
+# Cac vung status (polygon ngap / cam duong) cua DB cu duoc chep sang DB moi (bo vung khong con
+# tac dung, xem MapRepository.redundant_zones) va ap dung lai len toan bo edges truoc khi thay DB.
+# DB moi co san bang log status + trigger (LiveGraph.sync), bang profile toc do va bang vung status.
 import os
+import sys
+import time
+import sqlite3
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))   # src/utils
+SRC_ROOT = os.path.dirname(BASE_DIR)                     # src
+if SRC_ROOT not in sys.path:
+    sys.path.insert(0, SRC_ROOT)
+
+from utils.map_handler import MapRepository, STATUS_LOG_SCHEMA, PROFILE_SCHEMA, STATUS_ZONES_SCHEMA
+
+DEFAULT_DB_PATH = os.path.join(BASE_DIR, "map_data.db")
 
-# load file osm
-osm_file = "../../map.osm" #dinh nghia ten file osm
-graph = ox.graph_from_xml(osm_file) #doc file
-print(f"Graph loaded:  {len(graph.nodes)} nodes, {len(graph.edges)} edges ") # in ra so luong nodes va edges da load
-if not nx.is_connected(graph.to_undirected()): #is_connect hoat dong voi do thi vo huong ->  undirected chuyen thanh vo huong roi kiem tra lien thong
-    largest_cc_nodes = max(nx.connected_components(graph.to_undirected()), key=len) 
-    #nx.connected_components(G) tra ve 1 list tap node, moi tap hop la 1 thanh phan lien thong, max -> chon ra tap lien thong lon nhat
-    graph = graph.subgraph(largest_cc_nodes).copy()
-print(f"Largest component: {len(graph.nodes)} nodes, {len(graph.edges)} edges")
-
-
-#Luu nodes, edges vao DB SQLite3
-db_path = os.path.abspath("map_data.db")
-print(f"Database path: {db_path}")
-conn = sqlite3.connect("map_data.db") #ket noi toi db map_data.db ( neu chua ton tai thi se tao file db )
-c = conn.cursor() #tao cursor c de thuc hien lenh SQL
-
-# #xoa DB truoc
-c.execute("DROP TABLE IF EXISTS edges")
-c.execute("DROP TABLE IF EXISTS nodes")
-#tao DB Nodes
-c.execute('''
-CREATE TABLE IF NOT EXISTS nodes( 
-    id INTEGER PRIMARY KEY,
-    lat REAL,
-    lon REAL
+SCHEMA = (
+    '''
+    CREATE TABLE nodes(
+        id INTEGER PRIMARY KEY,
+        lat REAL,
+        lon REAL
     )
-''')
-
-#tao DB edges
-c.execute('''
-CREATE TABLE IF NOT EXISTS edges(
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    from_node INTEGER,
-    to_node INTEGER,
-    length REAL,
-    oneway INTEGER,
-    status TEXT DEFAULT 'normal',
-    FOREIGN KEY(from_node) REFERENCES nodes(id),
-    FOREIGN KEY(to_node) REFERENCES nodes(id)
+    ''',
+    '''
+    CREATE TABLE edges(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        from_node INTEGER,
+        to_node INTEGER,
+        length REAL,
+        oneway INTEGER,
+        status TEXT DEFAULT 'normal',
+        FOREIGN KEY(from_node) REFERENCES nodes(id),
+        FOREIGN KEY(to_node) REFERENCES nodes(id)
+    )
+    ''',
+)
+
+# tao sau khi insert xong (cap nhat index theo tung dong cham hon nhieu)
+INDEXES = (
+    "CREATE INDEX idx_edges_from_node ON edges(from_node)",
+    "CREATE INDEX idx_edges_to_node ON edges(to_node)",
+    "CREATE INDEX idx_edges_status ON edges(status)",
+)
+
+# chi ap dung cho DB tam trong luc import
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
 )
-''')
-
-#luu nodes
-for node_id, data in graph.nodes(data = True):
-    c.execute( "INSERT OR IGNORE INTO nodes (id, lat, lon) VALUES (?, ?, ?)", (node_id, data['y'], data['x']) )
-#luu edges
-for u, v, data in graph.edges(data = True):
-    length = data.get('length', 0)
-    c.execute( "INSERT INTO edges (from_node, to_node, length, oneway) VALUES (?, ?, ?, ?)", (
-        u, v,
-        data.get("length", 0),
-        int(data.get("oneway", 0)) if data.get("oneway") is not None else 0
-    ))
-conn.commit()
-conn.close()
-print("Database saved: map_data.db")
\ No newline at end of file
+
+
+def load_osm_graph(osm_file):
+    #doc file osm bang osmnx, chi giu thanh phan lien thong lon nhat
+    import osmnx as ox
+    import networkx as nx
+
+    graph = ox.graph_from_xml(osm_file)
+    print(f"Graph loaded:  {len(graph.nodes)} nodes, {len(graph.edges)} edges ")
+    undirected = graph.to_undirected()
+    if not nx.is_connected(undirected):
+        largest_cc_nodes = max(nx.connected_components(undirected), key=len)
+        graph = graph.subgraph(largest_cc_nodes).copy()
+    print(f"Largest component: {len(graph.nodes)} nodes, {len(graph.edges)} edges")
+    return graph
+
+
+def iter_node_rows(graph):
+    for node_id, data in graph.nodes(data=True):
+        yield node_id, data["y"], data["x"]
+
+
+def iter_edge_rows(graph):
+    for u, v, data in graph.edges(data=True):
+        oneway = data.get("oneway")
+        yield u, v, data.get("length", 0), int(oneway) if oneway is not None else 0
+
+
+def read_status_zones(db_path):
+    #[(status, polygon)] cua DB hien tai (rong neu chua co DB), da bo cac vung ma ap dung lai
+    # khong doi ket qua (DB cu co the con tich vung tu truoc khi admin tu cat)
+    if not os.path.exists(db_path):
+        return []
+    repo = MapRepository(db_path)
+    try:
+        zones = repo.status_zones()
+    finally:
+        repo.close()
+    removed = set(MapRepository.redundant_zones(zones))
+    return [(status, polygon) for zid, status, polygon in zones if zid not in removed]
+
+
+def apply_zones(db_path, zones):
+    #chep vung sang DB (tam) va ap dung hang loat; tra ve so edge doi status
+    repo = MapRepository(db_path)
+    try:
+        repo.save_status_zones(zones)
+        return repo.apply_status_zones()
+    finally:
+        repo.close()
+
+
+def _remove_db_files(path):
+    #file DB va cac file phu cua WAL
+    for p in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def write_db(db_path, node_rows, edge_rows, zones=()):
+    #node_rows: (id, lat, lon), edge_rows: (from_node, to_node, length, oneway) - co the la generator
+    # zones: [(status, polygon)] ap dung lai tren DB moi truoc khi thay DB cu
+    tmp_path = db_path + ".tmp"
+    _remove_db_files(tmp_path)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        c = conn.cursor()
+        for pragma in LOAD_PRAGMAS:
+            c.execute(pragma)
+
+        c.execute("BEGIN")
+        for stmt in SCHEMA + STATUS_LOG_SCHEMA + PROFILE_SCHEMA + (STATUS_ZONES_SCHEMA,):
+            c.execute(stmt)
+        c.executemany("INSERT OR IGNORE INTO nodes (id, lat, lon) VALUES (?, ?, ?)", node_rows)
+        c.executemany("INSERT INTO edges (from_node, to_node, length, oneway) VALUES (?, ?, ?, ?)", edge_rows)
+        for stmt in INDEXES:
+            c.execute(stmt)
+        c.execute("COMMIT")
+        c.execute("ANALYZE")
+
+        num_nodes = c.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+        num_edges = c.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+        # ve lai rollback journal: checkpoint WAL vao file chinh de chi con 1 file de swap
+        # doc ket qua de cau lenh chay xong (neu khong, con sot <db>.tmp-journal va DB bi lock)
+        c.execute("PRAGMA journal_mode = DELETE").fetchone()
+    except BaseException:
+        conn.close()
+        _remove_db_files(tmp_path)
+        raise
+    conn.close()
+
+    if zones:
+        try:
+            changed = apply_zones(tmp_path, zones)
+        except BaseException:
+            _remove_db_files(tmp_path)
+            raise
+        print(f"Re-applied {len(zones)} status zones: {changed} edges")
+
+    os.replace(tmp_path, db_path)
+    return num_nodes, num_edges
+
+
+def import_osm(osm_file, db_path=DEFAULT_DB_PATH, use_osmnx=False):
+    t0 = time.perf_counter()
+    if use_osmnx:
+        graph = load_osm_graph(osm_file)
+        node_rows, edge_rows = iter_node_rows(graph), iter_edge_rows(graph)
+    else:
+        from utils.osm_stream import stream_osm
+        node_rows, edge_rows = stream_osm(osm_file)
+    zones = read_status_zones(db_path)
+    num_nodes, num_edges = write_db(db_path, node_rows, edge_rows, zones)
+    print(f"Database saved: {db_path} ({num_nodes} nodes, {num_edges} edges, "
+          f"{time.perf_counter() - t0:.1f}s)")
+    return num_nodes, num_edges
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import an .osm file into the routing database")
+    parser.add_argument("osm_file", help="path to the .osm XML file")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="output database (replaced atomically)")
+    parser.add_argument("--osmnx", action="store_true",
+                        help="load the whole file with osmnx instead of the streaming importer")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.osm_file):
+        parser.error(f"file not found: {args.osm_file}")
+    import_osm(args.osm_file, os.path.abspath(args.db), args.osmnx)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.map_overlay import feature_collection, line_feature, point_feature
+from utils.spatial_index import EdgeIndex
+
+# Ve mang duong theo muc zoom (level of detail) + chi trong viewport:
+#   - chain: chuoi canh noi qua cac node bac 2 (giua 2 nut giao / dau mut), tinh 1 lan tu topo
+#   - luc ve, cac doan normal lien tiep cua 1 chain gop thanh 1 polyline, don gian hoa
+#     Douglas-Peucker voi sai so ~ PIXEL_TOLERANCE pixel o zoom hien tai (cache theo zoom)
+#   - edge khac normal ve rieng (id = edge_id) de admin doi mau theo id
+#   - viewport: EdgeIndex.query_bbox -> chi cac chain / edge cham vao bbox
+
+PIXEL_TOLERANCE = 1.0
+# node chi ve tu zoom nay tro len (o zoom thap chi la cac cham chong nhau)
+NODE_MIN_ZOOM = 17
+# met / pixel o zoom 0 tai xich dao (Web Mercator, tile 256px)
+METERS_PER_PIXEL_Z0 = 156543.03392
+METERS_PER_DEGREE = 111320.0
+MAX_CACHE = 200000
+
+
+def tolerance_for_zoom(zoom: int, lat: float) -> float:
+    #sai so cho phep (don vi: do vi do) tuong ung PIXEL_TOLERANCE pixel
+    return PIXEL_TOLERANCE * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom) / METERS_PER_DEGREE
+
+
+def simplify(coords: List[Tuple[float, float]], tolerance: float) -> List[Tuple[float, float]]:
+    #Douglas-Peucker (khong de quy) tren (lat, lon), lon nhan cos(lat) de sai so dong deu 2 truc
+    n = len(coords)
+    if n < 3:
+        return coords
+    k = math.cos(math.radians(coords[0][0]))
+    tol2 = tolerance * tolerance
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        ay, ax = coords[lo][0], coords[lo][1] * k
+        by, bx = coords[hi][0], coords[hi][1] * k
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        best, best_d2 = -1, tol2
+        for i in range(lo + 1, hi):
+            py, px = coords[i][0], coords[i][1] * k
+            if seg2 == 0:
+                d2 = (px - ax) ** 2 + (py - ay) ** 2
+            else:
+                cross = dx * (py - ay) - dy * (px - ax)
+                d2 = cross * cross / seg2
+            if d2 > best_d2:
+                best, best_d2 = i, d2
+        if best >= 0:
+            keep[best] = True
+            stack.append((lo, best))
+            stack.append((best, hi))
+    return [c for c, kept in zip(coords, keep) if kept]
+
+
+def _pair_key(u, v):
+    return (u, v) if u <= v else (v, u)
+
+
+class LODRenderer:
+    """
+    style_of(edge) -> properties cua 1 edge khac normal (mau, tooltip, ...)
+    chain_style: properties cua polyline gop tu cac edge normal
+    Status doc truc tiep tu dict edge (LiveGraph.edges) moi lan ve -> doi status khong can build lai.
+    """
+
+    def __init__(self,
+                 edges: List[Dict[str, Any]],
+                 nodes: Dict[Any, Tuple[float, float]],
+                 style_of: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 chain_style: Dict[str, Any],
+                 edge_index: Optional[EdgeIndex] = None):
+        self.nodes = nodes
+        self.style_of = style_of
+        self.chain_style = chain_style
+        self.edge_index = edge_index if edge_index is not None else EdgeIndex(edges, nodes)
+
+        # cac dong edge (2 chieu = 2 dong) cua moi cap node
+        self.pair_edges: Dict[Tuple[Any, Any], List[Dict[str, Any]]] = {}
+        for e in self.edge_index.edges:
+            self.pair_edges.setdefault(_pair_key(e["u"], e["v"]), []).append(e)
+
+        # chain: (node list, pair list); pair_chain[pair] = index chain
+        self.chains: List[Tuple[List[Any], List[Tuple[Any, Any]]]] = []
+        self.pair_chain: Dict[Tuple[Any, Any], int] = {}
+        self._build_chains()
+        self._cache: Dict[Tuple[int, int, int, int], List[Tuple[float, float]]] = {}
+
+    # ---------------- Topo ----------------
+    def _build_chains(self) -> None:
+        neighbors: Dict[Any, List[Any]] = {}
+        for u, v in self.pair_edges:
+            neighbors.setdefault(u, []).append(v)
+            if u != v:
+                neighbors.setdefault(v, []).append(u)
+
+        def walk(start, nxt):
+            chain_nodes, pairs = [start], []
+            prev, node = start, nxt
+            while True:
+                pair = _pair_key(prev, node)
+                self.pair_chain[pair] = len(self.chains)
+                pairs.append(pair)
+                chain_nodes.append(node)
+                if node == start or len(neighbors[node]) != 2:
+                    break
+                a, b = neighbors[node]
+                prev, node = node, (b if a == prev else a)
+                if _pair_key(prev, node) in self.pair_chain:
+                    break
+            self.chains.append((chain_nodes, pairs))
+
+        # chain bat dau tu nut giao / dau mut, sau do cac vong kin chi gom node bac 2
+        for start, adj in neighbors.items():
+            if len(adj) != 2:
+                for nxt in adj:
+                    if _pair_key(start, nxt) not in self.pair_chain:
+                        walk(start, nxt)
+        for start, adj in neighbors.items():
+            for nxt in adj:
+                if _pair_key(start, nxt) not in self.pair_chain:
+                    walk(start, nxt)
+
+    # ---------------- Ve ----------------
+    def chain_features(self, idx: int, zoom: int, tolerance: float) -> List[Dict[str, Any]]:
+        chain_nodes, pairs = self.chains[idx]
+        nodes = self.nodes
+        features = []
+        run_start = None
+        for i, pair in enumerate(pairs + [None]):
+            rows = self.pair_edges[pair] if pair is not None else ()
+            normal = pair is not None and all(e.get("status", "normal") == "normal" for e in rows)
+            if normal:
+                if run_start is None:
+                    run_start = i
+                continue
+            if run_start is not None:
+                key = (idx, run_start, i, zoom)
+                coords = self._cache.get(key)
+                if coords is None:
+                    if len(self._cache) > MAX_CACHE:
+                        self._cache.clear()
+                    coords = self._cache[key] = simplify([nodes[n] for n in chain_nodes[run_start:i + 1]], tolerance)
+                if len(coords) > 2 or _extent(coords) >= tolerance:
+                    features.append(line_feature(coords, **self.chain_style))
+                run_start = None
+            for e in rows:
+                if e.get("status", "normal") != "normal":
+                    features.append(line_feature((nodes[e["u"]], nodes[e["v"]]), e["edge_id"], **self.style_of(e)))
+        return features
+
+    def viewport(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                 zoom: int) -> Dict[str, Any]:
+        #FeatureCollection cac chain / edge cham bbox o muc zoom (so nguyen)
+        tolerance = tolerance_for_zoom(zoom, (min_lat + max_lat) / 2)
+        chain_ids = set()
+        for e in self.edge_index.query_bbox(min_lat, min_lon, max_lat, max_lon):
+            chain_ids.add(self.pair_chain[_pair_key(e["u"], e["v"])])
+        features = []
+        for idx in sorted(chain_ids):
+            features.extend(self.chain_features(idx, zoom, tolerance))
+        return feature_collection(features)
+
+    def viewport_nodes(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                       zoom: int, **props) -> Optional[Dict[str, Any]]:
+        #node trong bbox (lay tu dau mut cac edge ung vien); None neu zoom qua thap
+        if zoom < NODE_MIN_ZOOM:
+            return None
+        nodes = self.nodes
+        seen = set()
+        features = []
+        for e in self.edge_index.query_bbox(min_lat, min_lon, max_lat, max_lon):
+            for n in (e["u"], e["v"]):
+                if n in seen:
+                    continue
+                seen.add(n)
+                lat, lon = nodes[n]
+                if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                    features.append(point_feature((lat, lon), n, tooltip=f"Node {n}", **props))
+        return feature_collection(features)
+
+    def full_extent(self, zoom: int) -> Dict[str, Any]:
+        #toan bo mang duong o 1 muc zoom (dung cho file HTML tinh, vd utils/map_display.py)
+        if not self.nodes:
+            return feature_collection([])
+        lats = [lat for lat, _ in self.nodes.values()]
+        lons = [lon for _, lon in self.nodes.values()]
+        return self.viewport(min(lats), min(lons), max(lats), max(lons), zoom)
+
+
+def _extent(coords: List[Tuple[float, float]]) -> float:
+    (lat1, lon1), (lat2, lon2) = coords[0], coords[-1]
+    return max(abs(lat1 - lat2), abs(lon1 - lon2) * math.cos(math.radians(lat1)))
@@ -0,0 +1,146 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Overlay GeoJSON cho ban do Leaflet da load san (user_gui / admin_gui):
+#   - HTML cua folium chi tao 1 lan (tile + qwebchannel.js), khong ghi lai / reload
+#   - moi lop (route, status, edges, ...) la 1 L.geoJSON dat ten, Python gui
+#     {"name": ..., "data": FeatureCollection | null} qua signal overlayChanged cua JsBridge
+#   - style lay tu properties cua feature: color, weight, opacity, dash, radius, tooltip
+#   - JS bao lai pyHandler.overlayDrawn(name) sau khi ve xong (do thoi gian ve)
+#   - feature co id (vd edge_id) duoc danh index {id: layer} khi ve -> doi mau hang loat
+#     bang 1 message {"name": ..., "style": [[id, color], ...]} thay vi duyet moi layer tren map
+#   - watchViewport(): bao bbox / zoom moi cho Python (ve theo viewport, xem utils/map_lod.py)
+
+LatLon = Tuple[float, float]
+
+
+def line_feature(coords: Sequence[LatLon], feature_id: Any = None, **props) -> Dict[str, Any]:
+    #coords theo (lat, lon) nhu nodes; GeoJSON dung [lon, lat]
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in coords]},
+        "properties": props,
+    }
+    if feature_id is not None:
+        feature["id"] = feature_id
+    return feature
+
+
+def point_feature(coord: LatLon, feature_id: Any = None, **props) -> Dict[str, Any]:
+    lat, lon = coord
+    feature = {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+        "properties": props,
+    }
+    if feature_id is not None:
+        feature["id"] = feature_id
+    return feature
+
+
+def feature_collection(features: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"type": "FeatureCollection", "features": list(features)}
+
+
+def edge_features(edges: Iterable[Dict[str, Any]],
+                  nodes: Dict[Any, LatLon],
+                  style_of) -> List[Dict[str, Any]]:
+    #1 feature / edge (id = edge_id); style_of(edge) tra ve dict properties hoac None de bo qua edge
+    features = []
+    for e in edges:
+        u, v = e["u"], e["v"]
+        if u not in nodes or v not in nodes:
+            continue
+        props = style_of(e)
+        if props is not None:
+            features.append(line_feature((nodes[u], nodes[v]), e["edge_id"], **props))
+    return features
+
+
+def overlay_message(name: str, data: Optional[Dict[str, Any]]) -> str:
+    #data = None -> xoa lop
+    return json.dumps({"name": name, "data": data}, separators=(",", ":"))
+
+
+def style_message(name: str, colors: Iterable[Tuple[Any, str]]) -> str:
+    #doi mau cac feature cua lop name theo id: [(feature_id, color), ...] trong 1 lan goi
+    return json.dumps({"name": name, "style": [[fid, color] for fid, color in colors]},
+                      separators=(",", ":"))
+
+
+# pyOverlayInit(map, handler): goi 1 lan sau khi QWebChannel san sang
+OVERLAY_JS = r"""
+window.pyOverlayInit = function(map, handler) {
+    if (window.pyOverlay) return window.pyOverlay;
+    function style(f) {
+        let p = f.properties || {};
+        return {
+            color: p.color || 'blue',
+            weight: p.weight || 3,
+            opacity: p.opacity == null ? 0.8 : p.opacity,
+            dashArray: p.dash || null
+        };
+    }
+    function point(f, latlng) {
+        let p = f.properties || {};
+        return L.circleMarker(latlng, {
+            radius: p.radius || 6,
+            color: p.color || 'blue',
+            fill: true,
+            fillOpacity: p.fillOpacity == null ? 0.9 : p.fillOpacity
+        });
+    }
+    window.pyOverlay = {
+        map: map,
+        layers: {},
+        byId: {},
+        set: function(name, data) {
+            this.clear(name);
+            if (!data) return;
+            let index = this.byId[name] = {};
+            this.layers[name] = L.geoJSON(data, {
+                style: style,
+                pointToLayer: point,
+                onEachFeature: function(f, layer) {
+                    if (f.id != null) index[f.id] = layer;
+                    if (f.properties && f.properties.tooltip) layer.bindTooltip(f.properties.tooltip);
+                }
+            }).addTo(map);
+        },
+        restyle: function(name, pairs) {
+            let index = this.byId[name];
+            if (!index) return;
+            for (let i = 0; i < pairs.length; i++) {
+                let layer = index[pairs[i][0]];
+                if (layer) layer.setStyle({color: pairs[i][1]});
+            }
+        },
+        clear: function(name) {
+            if (this.layers[name]) {
+                map.removeLayer(this.layers[name]);
+                delete this.layers[name];
+                delete this.byId[name];
+            }
+        },
+        // gui bbox + zoom cho Python sau moi lan pan / zoom (handler.onViewportChanged)
+        watchViewport: function() {
+            function report() {
+                let b = map.getBounds();
+                handler.onViewportChanged(b.getSouth(), b.getWest(), b.getNorth(), b.getEast(), map.getZoom());
+            }
+            map.on('moveend', report);
+            report();
+        }
+    };
+    handler.overlayChanged.connect(function(text) {
+        let msg = JSON.parse(text);
+        if (msg.style) {
+            window.pyOverlay.restyle(msg.name, msg.style);
+        } else {
+            window.pyOverlay.set(msg.name, msg.data);
+        }
+        handler.overlayDrawn(msg.name);
+    });
+    return window.pyOverlay;
+};
+"""
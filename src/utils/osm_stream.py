@@ -0,0 +1,226 @@
+import math
+import heapq
+from array import array
+from bisect import bisect_left
+from typing import Iterator, Optional, Tuple
+import xml.etree.ElementTree as ET
+
+from algorithms.heuristic import haversine
+from utils.csr_graph import CoordView
+
+# Doc file .osm theo kieu streaming (iterparse), khong giu ca cay XML hay graph NetworkX:
+#   pass 1 (ways):  giu cac way co tag highway, node ref luu phang trong array('q')
+#   pass 2 (nodes): chi lay toa do cua node duoc way tham chieu
+#   sau do tach way tai cac node giao (node dau/cuoi way hoac thuoc >= 2 way), tinh length
+#   bang heuristic.haversine va loc thanh phan lien thong lon nhat bang union-find.
+# Bo nho ~ so node ref * vai chuc byte, khong phu thuoc so tag / relation trong file.
+
+# highway khong phai duong di duoc
+SKIP_HIGHWAY = {"proposed", "construction", "abandoned", "platform", "raceway", "razed", "disused"}
+ONEWAY_YES = {"yes", "true", "1"}
+ONEWAY_REVERSE = {"-1", "reverse"}
+# so ref sap xep moi lan khi dem node (list tam chi lon toi day)
+SORT_CHUNK = 1 << 16
+
+
+def _iter_elements(osm_file: str, tag: str) -> Iterator[ET.Element]:
+    #tra ve tung phan tu <tag> roi giai phong no (va cac phan tu da duyet) khoi cay
+    context = ET.iterparse(osm_file, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end":
+            continue
+        if elem.tag == tag:
+            yield elem
+        if elem.tag in ("node", "way", "relation"):
+            elem.clear()
+            root.clear()
+
+
+def _way_direction(tags) -> int:
+    #0: 2 chieu, 1: 1 chieu theo thu tu node, -1: 1 chieu nguoc
+    oneway = tags.get("oneway", "").lower()
+    if oneway in ONEWAY_REVERSE:
+        return -1
+    if oneway in ONEWAY_YES or tags.get("junction") == "roundabout" or tags.get("highway") == "motorway":
+        return 1
+    return 0
+
+
+def _sorted_refs(refs: array) -> Iterator[int]:
+    #duyet refs theo thu tu tang dan: sap xep tung khuc SORT_CHUNK ref vao array('q') rieng roi
+    # tron (heapq.merge) -> bo nho them ~ 8 byte / ref, khong tao list cho ca mang
+    runs = [array("q", sorted(refs[i:i + SORT_CHUNK])) for i in range(0, len(refs), SORT_CHUNK)]
+    return heapq.merge(*runs)
+
+
+class OSMStreamImporter:
+    """
+    Doc 1 file .osm thanh bang nodes / edges giong map_loader (osmnx): chi giu node giao / dau mut,
+    canh 2 chieu ghi thanh 2 dong (u, v) va (v, u) voi oneway = 0.
+    """
+
+    def __init__(self, osm_file: str):
+        self.osm_file = osm_file
+        # cac way: ref cua way k nam trong refs[way_offsets[k] : way_offsets[k + 1]]
+        self.refs = array("q")
+        self.way_offsets = array("q", [0])
+        self.way_direction = array("b")
+        # node duoc tham chieu (sap xep, khong trung) va du lieu theo cung index
+        self.ids = array("q")
+        self.lat = array("d")
+        self.lon = array("d")
+        self.relevant = array("b")
+
+    # ---------------- Pass 1: ways ----------------
+    def read_ways(self) -> int:
+        refs, offsets, direction = self.refs, self.way_offsets, self.way_direction
+        for way in _iter_elements(self.osm_file, "way"):
+            tags = {t.get("k"): t.get("v") for t in way.iter("tag")}
+            highway = tags.get("highway")
+            if highway is None or highway in SKIP_HIGHWAY or tags.get("area") == "yes":
+                continue
+            nd = [int(n.get("ref")) for n in way.iter("nd")]
+            if len(nd) < 2:
+                continue
+            refs.extend(nd)
+            offsets.append(len(refs))
+            direction.append(_way_direction(tags))
+
+        # node giao: xuat hien >= 2 lan trong cac way, hoac la dau / cuoi cua 1 way
+        ids = self.ids
+        counts = array("i")
+        for ref in _sorted_refs(refs):
+            if ids and ids[-1] == ref:
+                counts[-1] += 1
+            else:
+                ids.append(ref)
+                counts.append(1)
+        self.relevant = array("b", (c > 1 for c in counts))
+        for k in range(len(direction)):
+            self.relevant[self._index(refs[offsets[k]])] = 1
+            self.relevant[self._index(refs[offsets[k + 1] - 1])] = 1
+        return len(direction)
+
+    def _index(self, node_id: int) -> int:
+        return bisect_left(self.ids, node_id)
+
+    # ---------------- Pass 2: nodes ----------------
+    def read_nodes(self) -> int:
+        ids = self.ids
+        n = len(ids)
+        lat = self.lat = array("d", [math.nan]) * n
+        lon = self.lon = array("d", [math.nan]) * n
+        found = 0
+        for node in _iter_elements(self.osm_file, "node"):
+            node_id = int(node.get("id"))
+            i = bisect_left(ids, node_id)
+            if i < n and ids[i] == node_id:
+                lat[i] = float(node.get("lat"))
+                lon[i] = float(node.get("lon"))
+                found += 1
+        return found
+
+    # ---------------- Tach way thanh canh ----------------
+    def iter_segments(self) -> Iterator[Tuple[int, int, float, int]]:
+        #(index u, index v, length, direction) giua 2 node giao lien tiep tren moi way
+        # doan nao co node khong co toa do (file bi cat bien) thi bo
+        refs, offsets = self.refs, self.way_offsets
+        relevant, lat = self.relevant, self.lat
+        coords = CoordView(self.lat, self.lon)
+        for k, direction in enumerate(self.way_direction):
+            start = None
+            length = 0.0
+            prev = None
+            for p in range(offsets[k], offsets[k + 1]):
+                i = self._index(refs[p])
+                if math.isnan(lat[i]):
+                    start = prev = None
+                    continue
+                if prev is not None and start is not None:
+                    length += haversine(coords, prev, i)
+                prev = i
+                if relevant[i]:
+                    if start is not None and start != i:
+                        yield start, i, length, direction
+                    start = i
+                    length = 0.0
+
+    def largest_component(self, segments) -> array:
+        #union-find tren cac node giao; tra ve array('b') danh dau node thuoc thanh phan lon nhat
+        n = len(self.ids)
+        parent = array("i", range(n))
+
+        def find(x: int) -> int:
+            root = x
+            while parent[root] != root:
+                root = parent[root]
+            while parent[x] != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        for u, v, _, _ in segments:
+            ru, rv = find(u), find(v)
+            if ru != rv:
+                parent[ru] = rv
+
+        size = array("i", [0]) * n
+        relevant = self.relevant
+        for i in range(n):
+            if relevant[i]:
+                size[find(i)] += 1
+        keep = array("b", [0]) * n
+        if n == 0:
+            return keep
+        best = max(range(n), key=size.__getitem__)
+        for i in range(n):
+            if relevant[i] and find(i) == best:
+                keep[i] = 1
+        return keep
+
+    # ---------------- Ket qua ----------------
+    def run(self, largest_only: bool = True) -> Tuple[Iterator, Iterator]:
+        #doc file va tra ve (node_rows, edge_rows) dung cho map_loader.write_db
+        self.read_ways()
+        self.read_nodes()
+        # canh giua cac node giao: u, v, length, direction (nho hon nhieu so voi file goc)
+        seg_u, seg_v = array("i"), array("i")
+        seg_len, seg_dir = array("d"), array("b")
+        for u, v, length, direction in self.iter_segments():
+            seg_u.append(u)
+            seg_v.append(v)
+            seg_len.append(length)
+            seg_dir.append(direction)
+        # het can ref cua way
+        self.refs = array("q")
+        self.way_offsets = array("q", [0])
+
+        if largest_only:
+            keep = self.largest_component(zip(seg_u, seg_v, seg_len, seg_dir))
+        else:
+            keep = self.relevant
+
+        ids, lat, lon = self.ids, self.lat, self.lon
+
+        def node_rows():
+            for i in range(len(ids)):
+                if keep[i] and not math.isnan(lat[i]):
+                    yield ids[i], lat[i], lon[i]
+
+        def edge_rows():
+            for u, v, length, direction in zip(seg_u, seg_v, seg_len, seg_dir):
+                if not keep[u]:
+                    continue
+                if direction == -1:
+                    yield ids[v], ids[u], length, 1
+                elif direction == 1:
+                    yield ids[u], ids[v], length, 1
+                else:
+                    yield ids[u], ids[v], length, 0
+                    yield ids[v], ids[u], length, 0
+
+        return node_rows(), edge_rows()
+
+
+def stream_osm(osm_file: str, largest_only: bool = True) -> Tuple[Iterator, Iterator]:
+    return OSMStreamImporter(osm_file).run(largest_only)
@@ -0,0 +1,233 @@
+import math
+from array import array
+from typing import Dict, Tuple, List, Any, Iterable, Optional
+
+R_EARTH = 6371000.0
+
+
+def _to_xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    #doi (lat, lon) sang diem tren mat cau don vi
+    phi = math.radians(lat)
+    lamb = math.radians(lon)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lamb), cos_phi * math.sin(lamb), math.sin(phi)
+
+
+def _chord2_to_meters(chord2: float) -> float:
+    #khoang cach day cung (binh phuong) tren mat cau don vi -> khoang cach haversine (met)
+    return 2.0 * R_EARTH * math.asin(min(1.0, math.sqrt(chord2) / 2.0))
+
+
+def _spread(coord, part: List[int]) -> float:
+    values = [coord[i] for i in part]
+    return max(values) - min(values)
+
+
+class NodeIndex:
+    """
+    KD-tree 3 chieu tren toa do cau (x, y, z) cua cac node.
+    Khoang cach day cung tang dong bien voi khoang cach haversine,
+    nen node gan nhat theo KD-tree cung la node gan nhat theo haversine (khong phai do^2).
+    """
+
+    def __init__(self, nodes: Dict[Any, Tuple[float, float]]):
+        self.ids: List[Any] = list(nodes)
+        n = len(self.ids)
+        self.x = array("d", [0.0]) * n
+        self.y = array("d", [0.0]) * n
+        self.z = array("d", [0.0]) * n
+        for i, nid in enumerate(self.ids):
+            self.x[i], self.y[i], self.z[i] = _to_xyz(*nodes[nid])
+        self._axes = (self.x, self.y, self.z)
+
+        # perm: thu tu cac diem sao cho phan tu giua moi doan [lo, hi) la node chia cua cay
+        # split[mid]: truc chia (chon truc co do trai rong lon nhat trong doan)
+        self._perm = list(range(n))
+        self._split = array("b", [0]) * n
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 1:
+                continue
+            part = self._perm[lo:hi]
+            axis = max(range(3), key=lambda a: _spread(self._axes[a], part))
+            coord = self._axes[axis]
+            self._perm[lo:hi] = sorted(part, key=coord.__getitem__)
+            mid = (lo + hi) // 2
+            self._split[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Optional[Any], float]:
+        #tra ve (node_id gan nhat, khoang cach met)
+        if not self.ids:
+            return None, math.inf
+        q = _to_xyz(lat, lon)
+        best, best_d2 = self._nearest_xyz(q)
+        return self.ids[best], _chord2_to_meters(best_d2)
+
+    def nearest_many(self, points: Iterable[Tuple[float, float]]) -> List[Tuple[Optional[Any], float]]:
+        #snap nhieu diem (lat, lon) cung luc, moi diem ~ O(log N)
+        return [self.nearest(lat, lon) for lat, lon in points]
+
+    def _nearest_xyz(self, q: Tuple[float, float, float]) -> Tuple[int, float]:
+        perm, axes, split = self._perm, self._axes, self._split
+        xs, ys, zs = self.x, self.y, self.z
+        qx, qy, qz = q
+        best = -1
+        best_d2 = math.inf
+        # (lo, hi, khoang cach^2 toi mat phang chia) - nhanh xa duoc kiem tra khi pop
+        stack = [(0, len(perm), 0.0)]
+        while stack:
+            lo, hi, plane_d2 = stack.pop()
+            if lo >= hi or plane_d2 >= best_d2:
+                continue
+            mid = (lo + hi) // 2
+            i = perm[mid]
+            dx = xs[i] - qx
+            dy = ys[i] - qy
+            dz = zs[i] - qz
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 < best_d2:
+                best_d2 = d2
+                best = i
+            axis = split[mid]
+            diff = q[axis] - axes[axis][i]
+            if diff < 0:
+                stack.append((mid + 1, hi, diff * diff))
+                stack.append((lo, mid, 0.0))
+            else:
+                stack.append((lo, mid, diff * diff))
+                stack.append((mid + 1, hi, 0.0))
+        return best, best_d2
+
+
+def segment_dist2(lat: float, lon: float,
+                  lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    #khoang cach^2 (do) tu diem toi doan thang (lat1, lon1)-(lat2, lon2)
+    dx, dy = lat2 - lat1, lon2 - lon1
+    if dx == dy == 0:
+        return (lat - lat1)**2 + (lon - lon1)**2
+    t = max(0, min(1, ((lat - lat1)*dx + (lon - lon1)*dy)/(dx*dx + dy*dy)))
+    proj_lat = lat1 + t*dx
+    proj_lon = lon1 + t*dy
+    return (lat - proj_lat)**2 + (lon - proj_lon)**2
+
+
+class EdgeIndex:
+    """
+    Luoi deu (uniform grid) tren bounding box cua cac edge (don vi: do lat/lon).
+    Moi edge duoc dang ky vao tat ca o ma bbox cua no cham toi.
+    - nearest(): tim edge gan nhat, mo rong dan theo vong o
+    - query_bbox(): loc ung vien trong 1 hinh chu nhat (vd bbox cua polygon)
+    """
+
+    def __init__(self, edges: List[Dict[str, Any]], nodes: Dict[Any, Tuple[float, float]],
+                 cell_size: Optional[float] = None):
+        self.edges = [e for e in edges if e["u"] in nodes and e["v"] in nodes]
+        self.nodes = nodes
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+
+        if not self.edges:
+            self.cell = 1.0
+            self.min_lat = self.min_lon = 0.0
+            self.max_ix = self.max_iy = 0
+            return
+
+        lats = [lat for lat, lon in nodes.values()]
+        lons = [lon for lat, lon in nodes.values()]
+        self.min_lat, self.min_lon = min(lats), min(lons)
+        if cell_size is None:
+            # mac dinh: kich thuoc o = do dai (trung vi) cua 1 edge
+            extents = sorted(
+                max(abs(nodes[e["u"]][0] - nodes[e["v"]][0]), abs(nodes[e["u"]][1] - nodes[e["v"]][1]))
+                for e in self.edges
+            )
+            cell_size = extents[len(extents) // 2]
+        self.cell = max(cell_size, 1e-6)
+        self.max_ix = self._ix(max(lats))
+        self.max_iy = self._iy(max(lons))
+
+        for pos, e in enumerate(self.edges):
+            lat1, lon1 = nodes[e["u"]]
+            lat2, lon2 = nodes[e["v"]]
+            for key in self._cells_in(min(lat1, lat2), min(lon1, lon2), max(lat1, lat2), max(lon1, lon2)):
+                self.cells.setdefault(key, []).append(pos)
+
+    def _ix(self, lat: float) -> int:
+        return int((lat - self.min_lat) // self.cell)
+
+    def _iy(self, lon: float) -> int:
+        return int((lon - self.min_lon) // self.cell)
+
+    def _cells_in(self, min_lat, min_lon, max_lat, max_lon):
+        for ix in range(self._ix(min_lat), self._ix(max_lat) + 1):
+            for iy in range(self._iy(min_lon), self._iy(max_lon) + 1):
+                yield ix, iy
+
+    def _ring(self, cx: int, cy: int, k: int):
+        #cac o tren vien vong thu k quanh (cx, cy), chi lay o nam trong luoi
+        iy0, iy1 = max(cy - k, 0), min(cy + k, self.max_iy)
+        for ix in (cx - k, cx + k) if k else (cx,):
+            if 0 <= ix <= self.max_ix:
+                for iy in range(iy0, iy1 + 1):
+                    yield ix, iy
+        ix0, ix1 = max(cx - k + 1, 0), min(cx + k - 1, self.max_ix)
+        for iy in (cy - k, cy + k) if k else ():
+            if 0 <= iy <= self.max_iy:
+                for ix in range(ix0, ix1 + 1):
+                    yield ix, iy
+
+    def query_bbox(self, min_lat: float, min_lon: float,
+                   max_lat: float, max_lon: float) -> List[Dict[str, Any]]:
+        #tra ve cac edge co bbox nam trong cac o giao voi hinh chu nhat (ung vien, chua kiem tra chinh xac)
+        edges = self.edges
+        return [edges[pos] for pos in self.positions_in_bbox(min_lat, min_lon, max_lat, max_lon)]
+
+    def positions_in_bbox(self, min_lat: float, min_lon: float,
+                          max_lat: float, max_lon: float) -> List[int]:
+        #giong query_bbox nhung tra ve vi tri trong self.edges
+        ix0, ix1 = max(self._ix(min_lat), 0), min(self._ix(max_lat), self.max_ix)
+        iy0, iy1 = max(self._iy(min_lon), 0), min(self._iy(max_lon), self.max_iy)
+        seen = set()
+        result = []
+        cells = self.cells
+        for ix in range(ix0, ix1 + 1):
+            for iy in range(iy0, iy1 + 1):
+                for pos in cells.get((ix, iy), ()):
+                    if pos not in seen:
+                        seen.add(pos)
+                        result.append(pos)
+        return result
+
+    def nearest(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        #edge gan nhat theo khoang cach hinh chieu (giong AdminGUI.nearest_edge cu)
+        if not self.edges:
+            return None
+        nodes, cells = self.nodes, self.cells
+        cx, cy = self._ix(lat), self._iy(lon)
+        # so vong toi da de phu het luoi tu o chua diem click
+        max_ring = max(abs(cx), abs(cy), abs(self.max_ix - cx), abs(self.max_iy - cy)) + 1
+        best_edge = None
+        best_dist = 1e18
+        seen = set()
+        for k in range(max_ring + 1):
+            for key in self._ring(cx, cy, k):
+                for pos in cells.get(key, ()):
+                    if pos in seen:
+                        continue
+                    seen.add(pos)
+                    e = self.edges[pos]
+                    lat1, lon1 = nodes[e["u"]]
+                    lat2, lon2 = nodes[e["v"]]
+                    dist = segment_dist2(lat, lon, lat1, lon1, lat2, lon2)
+                    if dist < best_dist:
+                        best_dist = dist
+                        best_edge = e
+            # moi diem cach click < k*cell deu nam trong cac vong 0..k da duyet
+            if best_edge is not None and best_dist <= (k * self.cell) ** 2:
+                break
+        return best_edge